@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2014 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+# Micro-benchmark of the GROUP BY reports post-processing in GrimoireUtils:
+# fill_and_order_items and completePeriodIds with many items and weeks.
+#
+# Usage: ./bench_fill_items.py [items] [repeat]
+
+import calendar, random, sys, time
+from datetime import datetime, timedelta
+from dateutil.relativedelta import relativedelta
+
+sys.path.insert(0, '../..')
+
+from vizgrimoire.GrimoireUtils import completePeriodIds, fill_and_order_items
+from vizgrimoire.GrimoireUtils import date2Week
+
+def fill_and_order_items_linear_search(items, data, id_field):
+    """ Reference implementation using list membership and list.index """
+    fields = [field for field in data.keys() if field != id_field]
+    for id in items:
+        if id not in data[id_field]:
+            data[id_field].append(id)
+            for field in fields: data[field].append(0)
+    ordered = dict([(field, []) for field in data])
+    for id in items:
+        pos = data[id_field].index(id)
+        ordered[id_field].append(id)
+        for field in fields: ordered[field].append(data[field][pos])
+    return ordered
+
+def complete_weeks_linear_search(ts_data, startdate, enddate):
+    """ Reference implementation building the dates and using list.index """
+    start = datetime.strptime(startdate, "'%Y-%m-%d'")
+    end = datetime.strptime(enddate, "'%Y-%m-%d'") - timedelta(days=1)
+    new_ts_data = dict([(key, []) for key in ts_data.keys() + ['unixtime','date','id']])
+    new_week = start - relativedelta(days=start.isocalendar()[2]-1)
+    i = 0
+    while (new_week <= end):
+        week = int(date2Week(new_week))
+        if week in ts_data['week']:
+            index = ts_data['week'].index(week)
+            for key in ts_data: new_ts_data[key].append(ts_data[key][index])
+        else:
+            for key in ts_data: new_ts_data[key].append(0)
+            new_ts_data['week'][-1] = week
+        new_ts_data['unixtime'].append(unicode(calendar.timegm(new_week.timetuple())))
+        new_ts_data['id'].append(i)
+        new_ts_data['date'].append(datetime.strftime(new_week, "%b %Y"))
+        new_week = new_week + relativedelta(weeks=1)
+        i += 1
+    return new_ts_data
+
+def build_agg_data(nitems):
+    items = ["item%i" % i for i in range(0, nitems)]
+    # Only half of the items have activity
+    active = random.sample(items, nitems / 2)
+    data = {"name": active,
+            "commits": [random.randint(1, 1000) for item in active]}
+    return (items, data)
+
+def build_ts_data(weeks):
+    # Activity only in some weeks
+    ts = {"week": [], "commits": []}
+    for week in weeks:
+        if random.random() < 0.3:
+            ts["week"].append(week)
+            ts["commits"].append(random.randint(1, 100))
+    return ts
+
+def timeit(function, repeat):
+    start = time.time()
+    for i in range(0, repeat):
+        result = function()
+    return (time.time() - start, result)
+
+def copy_data(data):
+    return dict([(key, list(value)) for (key, value) in data.items()])
+
+if __name__ == '__main__':
+    nitems = 20000
+    repeat = 3
+    if len(sys.argv) > 1: nitems = int(sys.argv[1])
+    if len(sys.argv) > 2: repeat = int(sys.argv[2])
+    random.seed(1)
+
+    items, data = build_agg_data(nitems)
+    old_time, old = timeit(lambda: fill_and_order_items_linear_search(items, copy_data(data), "name"), repeat)
+    new_time, new = timeit(lambda: fill_and_order_items(items, copy_data(data), "name"), repeat)
+    assert old == new
+    print "fill_and_order_items %i items: %.3fs before, %.3fs now (x%.1f)" % \
+        (nitems, old_time, new_time, old_time / max(new_time, 1e-6))
+
+    # Weekly time series for ten years for each item
+    weeks = completePeriodIds({"week": []}, "week", "'2004-01-01'", "'2014-01-01'")["week"]
+    series = [build_ts_data(weeks) for i in range(0, nitems / 100)]
+    old_time, old = timeit(lambda: [complete_weeks_linear_search(copy_data(ts), "'2004-01-01'", "'2014-01-01'")
+                                    for ts in series], repeat)
+    new_time, new = timeit(lambda: [completePeriodIds(copy_data(ts), "week", "'2004-01-01'", "'2014-01-01'")
+                                    for ts in series], repeat)
+    assert old == new
+    print "completePeriodIds %i weekly time series: %.3fs before, %.3fs now (x%.1f)" % \
+        (len(series), old_time, new_time, old_time / max(new_time, 1e-6))
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2014 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+# Micro-benchmark of the median and average review time of each repository
+# and month: scanning the reviews for each repository and grouping them by
+# month like TimeToReview did, against get_grouped_stats.
+#
+# Usage: ./bench_grouped_stats.py [items] [reviews]
+
+import random, sys, time
+from datetime import datetime, timedelta
+
+import numpy
+
+sys.path.insert(0, '../..')
+
+from vizgrimoire.GrimoireUtils import medianAndAvgByPeriod
+from vizgrimoire.metrics.grouped_stats import get_grouped_stats, get_month_ids
+from vizgrimoire.metrics.result_set import ResultSet
+
+def stats_by_item_scan(data):
+    """ Reference implementation scanning all the reviews for each item """
+    result = {}
+    for item in set(data["name"]):
+        dates, values = [], []
+        for i in range(0, len(data["name"])):
+            if data["name"][i] == item:
+                dates.append(data["changed_on"][i])
+                values.append(data["revtime"][i])
+        stats = medianAndAvgByPeriod("month", dates, values)
+        for (month, median, avg) in zip(stats["month"], stats["median"], stats["avg"]):
+            result[(item, month)] = (median, avg)
+    return result
+
+def stats_by_item_grouped(data):
+    codes, items = data.codes("name")
+    months = get_month_ids(data["changed_on"])
+    stats = get_grouped_stats([codes, months], data["revtime"])
+    result = {}
+    for i in range(0, len(stats["count"])):
+        key = (items[stats["keys"][0][i]], int(stats["keys"][1][i]))
+        result[key] = (stats["median"][i], stats["mean"][i])
+    return result
+
+if __name__ == '__main__':
+    nitems = 500
+    nreviews = 100000
+    if len(sys.argv) > 1: nitems = int(sys.argv[1])
+    if len(sys.argv) > 2: nreviews = int(sys.argv[2])
+    random.seed(1)
+
+    # Reviews sorted by date, as returned by the review time query
+    start = datetime(2010, 1, 1)
+    dates = sorted([start + timedelta(minutes=random.randint(0, 5*365*24*60))
+                    for i in range(0, nreviews)])
+    rows = [("repo%i" % random.randint(0, nitems - 1), random.random() * 30, date)
+            for date in dates]
+    data = dict([(column, [row[i] for row in rows])
+                 for (i, column) in enumerate(["name", "revtime", "changed_on"])])
+
+    begin = time.time()
+    old = stats_by_item_scan(data)
+    old_time = time.time() - begin
+
+    begin = time.time()
+    result_set = ResultSet(["name", "revtime", "changed_on"])
+    result_set.append_rows(rows)
+    new = stats_by_item_grouped(result_set)
+    new_time = time.time() - begin
+
+    assert sorted(old.keys()) == sorted(new.keys())
+    for key in old:
+        assert abs(old[key][0] - new[key][0]) < 1e-9
+        assert abs(old[key][1] - new[key][1]) < 1e-9
+    print "median and avg for %i items and %i reviews: %.3fs before, %.3fs now (x%.1f)" % \
+        (nitems, nreviews, old_time, new_time, old_time / max(new_time, 1e-6))
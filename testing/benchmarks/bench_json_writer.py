@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2014 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+# Micro-benchmark of the JSON files of filter items: converting the data
+# and encoding it with sort_keys and replacing NaN like createJSON did,
+# against json_writer. Both must write the same files.
+#
+# Usage: ./bench_json_writer.py [files] [months]
+
+import copy, json, os, random, shutil, sys, tempfile, time
+from decimal import Decimal
+
+sys.path.insert(0, '../..')
+
+from vizgrimoire.GrimoireUtils import convertDatetime, roundDecimals, removeDecimals, \
+    convertCombinedFiltersName
+from vizgrimoire import json_writer
+
+def create_json_replace(data, filepath):
+    """ Reference implementation encoding with sort_keys """
+    checked_data = convertDatetime(roundDecimals(removeDecimals(data)))
+    checked_data = convertCombinedFiltersName(checked_data)
+    json_data = json.dumps(checked_data, sort_keys=True)
+    json_data = json_data.replace('NaN','"NA"')
+    jsonfile = open(filepath, 'w')
+    jsonfile.write(json_data)
+    jsonfile.close()
+
+def get_item_evol(months):
+    data = {"id": range(0, months), "month": [24157 + i for i in range(0, months)],
+            "unixtime": [unicode(1388534400 + i * 2592000) for i in range(0, months)],
+            "date": ["Jan %i" % (2014 + i / 12) for i in range(0, months)]}
+    for metric in range(0, 30):
+        if metric % 3 == 0:
+            data["metric%i" % metric] = [random.random() * 10 for i in range(0, months)]
+        elif metric % 10 == 1:
+            data["metric%i" % metric] = [Decimal(random.randint(0, 500)) for i in range(0, months)]
+        else:
+            data["metric%i" % metric] = [random.randint(0, 500) for i in range(0, months)]
+    return data
+
+if __name__ == '__main__':
+    nfiles = 500
+    months = 60
+    if len(sys.argv) > 1: nfiles = int(sys.argv[1])
+    if len(sys.argv) > 2: months = int(sys.argv[2])
+    random.seed(1)
+    items = [get_item_evol(months) for i in range(0, nfiles)]
+    old_dir = tempfile.mkdtemp()
+    new_dir = tempfile.mkdtemp()
+
+    try:
+        old_items = copy.deepcopy(items)
+        begin = time.time()
+        for (i, data) in enumerate(old_items):
+            create_json_replace(data, os.path.join(old_dir, "%i.json" % i))
+        old_time = time.time() - begin
+
+        begin = time.time()
+        for (i, data) in enumerate(items):
+            json_writer.write_json(data, os.path.join(new_dir, "%i.json" % i))
+        new_time = time.time() - begin
+
+        for i in range(0, nfiles):
+            old = open(os.path.join(old_dir, "%i.json" % i)).read()
+            assert old == open(os.path.join(new_dir, "%i.json" % i)).read()
+    finally:
+        shutil.rmtree(old_dir)
+        shutil.rmtree(new_dir)
+
+    print "%i files with %i months: %.3fs before, %.3fs now (x%.1f)" % \
+        (nfiles, months, old_time, new_time, old_time / max(new_time, 1e-6))
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2014 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+# Startup time of the vizgrimoire package. Importing the query builders and
+# registering all the metrics with Report.init must not load R nor scipy,
+# and must not connect to the databases: no database server is needed.
+#
+# Usage: ./bench_startup.py [automator_file] [max_seconds]
+
+import json, os, subprocess, sys
+
+# Executed in a new python process to measure cold imports
+startup_code = """
+import json, sys, time
+sys.path.insert(0, %(path)r)
+start = time.time()
+import vizgrimoire.metrics.query_builder
+import_time = time.time() - start
+from vizgrimoire.report import Report
+from vizgrimoire.metrics import connection_pool
+Report.init(%(automator)r, %(metrics)r)
+init_time = time.time() - start
+metrics = sum([len(ds.get_metrics_set(ds)) for ds in Report.get_data_sources()])
+heavy = [mod for mod in ['rpy2', 'scipy'] if mod in sys.modules]
+open_conns = sum([stats['open'] for stats in connection_pool.get_stats().values()])
+print json.dumps({'import': import_time, 'init': init_time, 'metrics': metrics,
+                  'heavy': heavy, 'connections': open_conns})
+"""
+
+if __name__ == '__main__':
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+    automator = os.path.join(root, 'testing', 'automator.conf')
+    max_seconds = 2.0
+    if len(sys.argv) > 1: automator = os.path.abspath(sys.argv[1])
+    if len(sys.argv) > 2: max_seconds = float(sys.argv[2])
+    metrics_path = os.path.join(root, 'vizgrimoire', 'metrics')
+
+    code = startup_code % {'path': root, 'automator': automator, 'metrics': metrics_path}
+    output = subprocess.check_output([sys.executable, '-c', code])
+    result = json.loads(output.strip().split("\n")[-1])
+
+    print "import query_builder: %.3fs" % (result['import'])
+    print "Report.init with %i metrics: %.3fs" % (result['metrics'], result['init'])
+    assert result['heavy'] == [], "Modules loaded at startup: " + ",".join(result['heavy'])
+    assert result['connections'] == 0, "Connections opened at startup"
+    assert result['init'] < max_seconds, "Startup slower than %.1fs" % (max_seconds)
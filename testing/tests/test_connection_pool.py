@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+"""Tests for the pools of database connections"""
+
+import sys
+import threading
+import time
+import unittest
+
+if not '..' in sys.path:
+    sys.path.insert(0, '../..')
+
+import MySQLdb
+
+from vizgrimoire.metrics.connection_pool import ConnectionPool
+
+
+class FakeCursor(object):
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.description = None
+        self.rows = []
+
+    def execute(self, sql):
+        if self.conn.lost:
+            raise MySQLdb.OperationalError(2006, "MySQL server has gone away")
+        self.conn.queries.append(sql)
+        if self.conn.result is not None:
+            self.description = [(column,) for column in self.conn.result[0]]
+            self.rows = list(self.conn.result[1])
+
+    def fetchmany(self, size):
+        rows = self.rows[0:size]
+        self.rows = self.rows[size:]
+        return tuple(rows)
+
+    def close(self):
+        self.rows = []
+
+
+class FakeConnection(object):
+
+    def __init__(self):
+        self.queries = []
+        self.lost = False
+        self.closed = False
+        self.result = None # (columns, rows)
+
+    def cursor(self, cursorclass=None):
+        return FakeCursor(self)
+
+    def ping(self):
+        if self.lost:
+            raise MySQLdb.OperationalError(2006, "MySQL server has gone away")
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnectionPool(ConnectionPool):
+
+    def _open(self):
+        conn = FakeConnection()
+        for sql in self.init_statements:
+            conn.cursor().execute(sql)
+        return conn
+
+
+class TestConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = FakeConnectionPool(database='scm', max_size=2)
+
+    def test_thread_connection(self):
+        conn = self.pool.get_connection()
+        self.assertIs(conn, self.pool.get_connection())
+        self.pool.execute("SELECT 1")
+        self.pool.execute("SELECT 2")
+        # Session initialized only once
+        self.assertEqual(["SET NAMES 'utf8'", "SELECT 1", "SELECT 2"], conn.queries)
+        self.pool.release()
+        self.assertIs(conn, self.pool.get_connection())
+        self.assertEqual(1, self.pool.get_stats()['open'])
+
+    def test_bounded_size(self):
+        self.pool.wait_timeout = 5
+        conns = []
+        released = threading.Event()
+        def use_connection():
+            conns.append(self.pool.get_connection())
+            released.wait()
+            self.pool.release()
+        threads = [threading.Thread(target=use_connection) for i in range(0, 3)]
+        for thread in threads: thread.start()
+        time.sleep(0.5)
+        self.assertEqual(2, len(conns))
+        self.assertEqual(2, self.pool.get_stats()['in_use'])
+        released.set()
+        for thread in threads: thread.join()
+        self.assertEqual(3, len(conns))
+        self.assertEqual(2, self.pool.get_stats()['open'])
+        self.assertEqual(0, self.pool.get_stats()['in_use'])
+        self.assertEqual(1, self.pool.get_stats()['waits'])
+
+    def test_finished_threads(self):
+        thread = threading.Thread(target=self.pool.get_connection)
+        thread.start()
+        thread.join()
+        # Connection not released by the thread is reused
+        self.pool.get_connection()
+        self.assertEqual(1, self.pool.get_stats()['open'])
+        self.assertEqual(1, self.pool.get_stats()['in_use'])
+
+    def test_reconnect(self):
+        conn = self.pool.get_connection()
+        conn.lost = True
+        cursor = self.pool.execute("SELECT 1")
+        self.assertTrue(conn.closed)
+        self.assertIsNot(conn, cursor.conn)
+        self.assertEqual(["SET NAMES 'utf8'", "SELECT 1"], cursor.conn.queries)
+        self.assertEqual(1, self.pool.get_stats()['reconnects'])
+        self.assertEqual(1, self.pool.get_stats()['open'])
+
+    def test_ping_idle(self):
+        conn = self.pool.get_connection()
+        self.pool.release()
+        conn.lost = True
+        self.pool.ping_interval = 0
+        self.assertIsNot(conn, self.pool.get_connection())
+        self.assertEqual(1, self.pool.get_stats()['reconnects'])
+
+    def test_execute_iter(self):
+        conn = self.pool.get_connection()
+        rows = [(i, i * 2) for i in range(0, 5)]
+        conn.result = (["id", "value"], rows)
+        self.pool.fetch_size = 2
+        self.assertEqual(rows, list(self.pool.execute_iter("SELECT id, value")))
+        batches = list(self.pool.execute_iter("SELECT id, value", 3))
+        self.assertEqual([{"id": [0, 1, 2], "value": [0, 2, 4]},
+                          {"id": [3, 4], "value": [6, 8]}], batches)
+
+    def test_fork(self):
+        conn = self.pool.get_connection()
+        self.pool._pid = -1
+        # Connections of the parent process are not used nor closed
+        self.assertIsNot(conn, self.pool.get_connection())
+        self.assertFalse(conn.closed)
+        self.assertEqual(1, self.pool.get_stats()['open'])
+
+
+if __name__ == '__main__':
+    unittest.main()
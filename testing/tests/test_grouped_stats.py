@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+"""Tests for the statistics of values by group"""
+
+import random
+import sys
+import unittest
+
+if not '..' in sys.path:
+    sys.path.insert(0, '../..')
+
+from datetime import datetime
+
+import numpy
+
+from vizgrimoire.metrics.grouped_stats import get_grouped_stats, get_month_ids
+
+
+class TestGroupedStats(unittest.TestCase):
+
+    def test_groups(self):
+        random.seed(1)
+        items = numpy.array([random.randint(0, 20) for i in range(0, 2000)])
+        months = numpy.array([random.randint(24157, 24169) for i in range(0, 2000)])
+        values = numpy.array([random.random() * 100 for i in range(0, 2000)])
+        stats = get_grouped_stats([items, months], values, [25, 75])
+
+        for i in range(0, len(stats["count"])):
+            group = (items == stats["keys"][0][i]) & (months == stats["keys"][1][i])
+            self.assertEqual(group.sum(), stats["count"][i])
+            self.assertAlmostEqual(numpy.median(values[group]), stats["median"][i])
+            self.assertAlmostEqual(numpy.mean(values[group]), stats["mean"][i])
+            self.assertAlmostEqual(numpy.percentile(values[group], 25), stats["percentile25"][i])
+            self.assertAlmostEqual(numpy.percentile(values[group], 75), stats["percentile75"][i])
+        self.assertEqual(2000, stats["count"].sum())
+
+    def test_ignored_rows(self):
+        # NaN values and NULL codes are not in any group
+        stats = get_grouped_stats([numpy.array([0, 0, -1, 1])],
+                                  numpy.array([1.0, numpy.nan, 5.0, 2.0]))
+        self.assertEqual([0, 1], stats["keys"][0].tolist())
+        self.assertEqual([1, 1], stats["count"].tolist())
+        self.assertEqual([1.0, 2.0], stats["median"].tolist())
+
+    def test_no_groups(self):
+        stats = get_grouped_stats([], [4, 1, 3, 2])
+        self.assertEqual([2.5], stats["median"].tolist())
+        stats = get_grouped_stats([numpy.array([], dtype=int)], [])
+        self.assertEqual(0, len(stats["median"]))
+
+    def test_month_ids(self):
+        dates = numpy.array([datetime(2014, 1, 31), None, datetime(2013, 12, 1)],
+                            dtype="datetime64[s]")
+        self.assertEqual([2014*12+1, -1, 2013*12+12], get_month_ids(dates).tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
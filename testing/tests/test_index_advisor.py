@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+"""Tests for the indexes of the metrics queries"""
+
+import sys
+import unittest
+
+if not '..' in sys.path:
+    sys.path.insert(0, '../..')
+
+from vizgrimoire.metrics import index_advisor
+from vizgrimoire.metrics.query_builder import SCMQuery
+
+
+class FakeCursor(object):
+
+    def __init__(self, columns, rows):
+        self.description = [(column,) for column in columns]
+        self.rows = rows
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeIndexesPool(object):
+    """ Tables with indexes: {table: {index name: [columns]}} """
+
+    def __init__(self, tables):
+        self.tables = tables
+
+    def execute(self, sql):
+        if sql.startswith("SHOW INDEX FROM "):
+            table = sql.split(" ")[-1]
+            rows = []
+            for (name, columns) in self.tables[table].items():
+                rows += [(name, i + 1, column) for (i, column) in enumerate(columns)]
+            return FakeCursor(["Key_name", "Seq_in_index", "Column_name"], rows)
+        if sql.startswith("CREATE INDEX "):
+            (name, table) = sql.split(" ")[2:5:2]
+            columns = sql.split("(")[1].rstrip(")").split(", ")
+            self.tables[table][name] = columns
+            return FakeCursor([], [])
+        raise Exception("Not expected: " + sql)
+
+
+class TestIndexAdvisor(unittest.TestCase):
+
+    def setUp(self):
+        self.db = SCMQuery("user", "password", "scm", "identities")
+        self.pool = FakeIndexesPool({"scmlog": {"PRIMARY": ["id"],
+                                                "author_id": ["author_id", "date"]},
+                                     "identities.enrollments": {}})
+        self.db._get_pool = lambda: self.pool
+
+    def test_create_indexes(self):
+        indexes = [("scmlog", ["author_id"]), ("scmlog", ["author_date", "author_id"]),
+                   ("identities.enrollments", ["uuid", "organization_id"])]
+        created = index_advisor.create_indexes(self.db, indexes)
+        # author_id is the first column of an index already
+        self.assertEqual(["grimoire_scmlog_author_date_author_id",
+                          "grimoire_enrollments_uuid_organization_id"], created)
+        self.assertEqual(["author_date", "author_id"],
+                         self.pool.tables["scmlog"]["grimoire_scmlog_author_date_author_id"])
+        # Only once
+        self.assertEqual([], index_advisor.create_indexes(self.db, indexes))
+
+    def test_data_source_indexes(self):
+        indexes = self.db.get_indexes()
+        self.assertTrue(("scmlog", ["author_date", "author_id"]) in indexes)
+        self.assertTrue(("identities.enrollments", ["uuid", "organization_id"]) in indexes)
+
+    def test_full_scans(self):
+        plan = [{"table": "s", "type": "ALL", "rows": 1000},
+                {"table": "pup", "type": "eq_ref", "rows": 1},
+                {"table": "<derived2>", "type": "ALL", "rows": 10}]
+        self.assertEqual([("s", 1000)], index_advisor.get_full_scans(plan))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+"""Tests for the writer of the JSON files"""
+
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from decimal import Decimal
+
+if not '..' in sys.path:
+    sys.path.insert(0, '../..')
+
+from vizgrimoire import json_writer
+from vizgrimoire.json_bundle import BundleReader
+
+
+class TestJSONWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        json_writer.set_gzip(False)
+        json_writer.set_shared_axis(False)
+        json_writer.set_manifest(False)
+        json_writer.set_bundles(False)
+        shutil.rmtree(self.dir)
+
+    def read(self, name):
+        return open(os.path.join(self.dir, name)).read()
+
+    def test_write(self):
+        data = {"month": [24157, 24158], "commits": [Decimal(3), float('nan')],
+                "name": "NaN", "authors": {"b": 1.23456, "a": None}}
+        json_writer.write_json(data, os.path.join(self.dir, "data.json"))
+        # Sorted keys and NaN as "NA", only for numbers
+        self.assertEqual('{"authors": {"a": null, "b": 1.23}, "commits": [3.0, "NA"], '
+                         '"month": [24157, 24158], "name": "NaN"}', self.read("data.json"))
+        # The data is converted, like createJSON did
+        self.assertEqual(1.23, data["authors"]["b"])
+        self.assertEqual([], [name for name in os.listdir(self.dir) if name != "data.json"])
+
+    def test_gzip(self):
+        filepath = os.path.join(self.dir, "data.json")
+        json_writer.set_gzip(True)
+        json_writer.write_json({"commits": 10}, filepath)
+        self.assertEqual(self.read("data.json"), gzip.open(filepath + ".gz").read())
+        # Stale compressed copy
+        json_writer.set_gzip(False)
+        json_writer.write_json({"commits": 20}, filepath)
+        self.assertFalse(os.path.exists(filepath + ".gz"))
+
+    def test_shared_axis(self):
+        json_writer.set_shared_axis(True)
+        axis_filepath = os.path.join(self.dir, "axis.json")
+        for item in ["a", "b"]:
+            json_writer.write_json({"month": [24157, 24158], "id": [0, 1], "commits": [1, 2]},
+                                   os.path.join(self.dir, item + ".json"), axis_filepath)
+        self.assertEqual({"id": [0, 1], "month": [24157, 24158]},
+                         json.loads(self.read("axis.json")))
+        self.assertEqual({"axis": "axis.json", "commits": [1, 2]},
+                         json.loads(self.read("b.json")))
+        # Other time axis: written in the item file
+        json_writer.write_json({"month": [24158], "id": [0], "commits": [2]},
+                               os.path.join(self.dir, "c.json"), axis_filepath)
+        self.assertEqual({"month": [24158], "id": [0], "commits": [2]},
+                         json.loads(self.read("c.json")))
+
+    def test_manifest(self):
+        json_writer.set_manifest(True)
+        filepath = os.path.join(self.dir, "data.json")
+        json_writer.write_json({"commits": 10}, filepath)
+        json_writer.save()
+        # Written files are renamed temporary files: a new inode
+        inode = os.stat(filepath).st_ino
+        json_writer.set_manifest(True)
+        json_writer.write_json({"commits": 10}, filepath)
+        self.assertEqual(inode, os.stat(filepath).st_ino)
+        json_writer.write_json({"commits": 20}, filepath)
+        self.assertNotEqual(inode, os.stat(filepath).st_ino)
+        json_writer.save()
+        manifest = json.loads(self.read(json_writer.manifest_name))
+        self.assertEqual(["data.json"], manifest.keys())
+        self.assertEqual([json_writer.manifest_name, "data.json"], sorted(os.listdir(self.dir)))
+        # Changed by others
+        open(filepath, "w").write('{"commits": 30}')
+        os.utime(filepath, (0, 0))
+        json_writer.set_manifest(True)
+        json_writer.write_json({"commits": 20}, filepath)
+        self.assertEqual('{"commits": 20}', self.read("data.json"))
+
+    def test_bundles(self):
+        json_writer.set_bundles(True)
+        bundle = os.path.join(self.dir, "scm-com-static.bundle")
+        for (item, commits) in [("a", 1), ("b", 2)]:
+            json_writer.write_json({"commits": commits},
+                                   os.path.join(self.dir, item + "-scm-com-static.json"), None, bundle)
+        json_writer.save([self.dir])
+        self.assertEqual(["scm-com-static.bundle"], os.listdir(self.dir))
+        # Only the written items change
+        json_writer.write_json({"commits": 3}, os.path.join(self.dir, "b-scm-com-static.json"),
+                               None, bundle)
+        json_writer.save([self.dir])
+        reader = BundleReader(bundle)
+        self.assertEqual(["a-scm-com-static.json", "b-scm-com-static.json"], reader.get_names())
+        self.assertEqual('{"commits": 1}', reader.get_raw("a-scm-com-static.json"))
+        self.assertEqual({"commits": 3}, reader.get("b-scm-com-static.json"))
+        self.assertEqual(None, reader.get("c-scm-com-static.json"))
+        reader.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+"""Tests for the split of the grouped quarters queries"""
+
+import sys
+import unittest
+
+if not '..' in sys.path:
+    sys.path.insert(0, '../..')
+
+from vizgrimoire.analysis.quarters_data import QuartersData
+
+
+class TestQuartersData(unittest.TestCase):
+
+    def test_split_quarters(self):
+        # Rows ordered by year, quarter and total
+        data = {"total": [5, 3, 1, 7], "name": ["a", "b", "c", "d"],
+                "year": [2014, 2014, 2014, 2015], "quarter": [1, 1, 1, 2]}
+        quarters = QuartersData._split_quarters(data, 2)
+        self.assertEqual({"total": [5, 3], "name": ["a", "b"], "year": [2014, 2014],
+                          "quarter": [1, 1]}, quarters[(2014, 1)])
+        # A single row is returned as values, like ExecuteQuery does
+        self.assertEqual({"total": 7, "name": "d", "year": 2015, "quarter": 2},
+                         quarters[(2015, 2)])
+        self.assertEqual({"total": [], "name": [], "year": [], "quarter": []}, quarters[None])
+
+        # One row in the result
+        quarters = QuartersData._split_quarters({"total": 7, "name": "d", "year": 2015,
+                                                 "quarter": 2}, 25)
+        self.assertEqual({"total": 7, "name": "d", "year": 2015, "quarter": 2},
+                         quarters[(2015, 2)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details. 
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+"""Tests for the query results cache"""
+
+import cPickle
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+if not '..' in sys.path:
+    sys.path.insert(0, '../..')
+
+from datetime import datetime
+from decimal import Decimal
+
+from vizgrimoire.metrics.query_builder import DSQuery, SCMQuery
+from vizgrimoire.metrics.query_cache import QueryCache
+
+
+class FakeCursor(object):
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeChecksPool(object):
+    """ Results of the fingerprint checks: {sql: rows} """
+
+    def __init__(self, results):
+        self.results = results
+
+    def execute(self, sql):
+        return FakeCursor(self.results[sql])
+
+
+class TestQueryCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='query_cache_')
+        self.cache = QueryCache(os.path.join(self.tmpdir, 'cache.db'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_normalized_sql(self):
+        sql = "SELECT COUNT(*) AS commits\n    FROM scmlog ;"
+        result = {'commits': Decimal(10)}
+        self.cache.put('scm', sql, 'f1', result)
+        self.assertEqual(result, self.cache.get('scm', "SELECT COUNT(*) AS commits FROM scmlog", 'f1'))
+        self.assertEqual(None, self.cache.get('its', sql, 'f1'))
+
+    def test_invalidation(self):
+        sql = "SELECT COUNT(*) AS commits FROM scmlog"
+        self.cache.put('scm', sql, 'f1', {'commits': 10})
+        self.assertEqual(None, self.cache.get('scm', sql, 'f2'))
+        self.assertEqual(None, self.cache.get('scm', sql, 'f1'))
+
+    def test_lru_eviction(self):
+        # Room for two results
+        result = {'commits': range(100)}
+        self.cache.max_size = 2 * len(cPickle.dumps(result, cPickle.HIGHEST_PROTOCOL))
+        self.cache.put('scm', "SELECT 1", 'f', result)
+        time.sleep(0.01)
+        self.cache.put('scm', "SELECT 2", 'f', result)
+        time.sleep(0.01)
+        self.cache.get('scm', "SELECT 1", 'f')
+        time.sleep(0.01)
+        self.cache.put('scm', "SELECT 3", 'f', result)
+        self.assertEqual(result, self.cache.get('scm', "SELECT 1", 'f'))
+        self.assertEqual(None, self.cache.get('scm', "SELECT 2", 'f'))
+        self.assertEqual(result, self.cache.get('scm', "SELECT 3", 'f'))
+
+    def test_cacheable(self):
+        self.assertTrue(QueryCache.is_cacheable(" select count(*) from scmlog"))
+        self.assertFalse(QueryCache.is_cacheable("DELETE FROM scmlog"))
+        self.assertFalse(QueryCache.is_cacheable("SELECT @maxdate:=max(date) from scmlog"))
+        self.assertFalse(QueryCache.is_cacheable("SELECT NOW()"))
+
+
+class TestCacheFingerprint(unittest.TestCase):
+
+    def setUp(self):
+        self.db = SCMQuery("user", "password", "scm", "identities")
+        self.results = {
+            "SELECT MAX(date), COUNT(*) FROM scmlog": ((datetime(2014, 1, 1), 10),),
+            "SELECT MAX(id), COUNT(*) FROM actions": ((30, 30),),
+            "SELECT MAX(id), COUNT(*) FROM commits_lines": ((10, 10),),
+            "CHECKSUM TABLE people_uidentities": (("scm.people_uidentities", 1),),
+            "CHECKSUM TABLE identities.enrollments": (("identities.enrollments", 2),),
+            "CHECKSUM TABLE identities.uidentities": (("identities.uidentities", 3),)}
+        self.db._get_pool = lambda: FakeChecksPool(self.results)
+
+    def tearDown(self):
+        DSQuery._cache_fingerprints.pop("scm", None)
+
+    def get_fingerprint(self):
+        DSQuery._cache_fingerprints.pop("scm", None)
+        return self.db._get_cache_fingerprint()
+
+    def test_changes(self):
+        fingerprint = self.get_fingerprint()
+        self.assertNotEqual(None, fingerprint)
+        self.assertEqual(fingerprint, self.get_fingerprint())
+        # New actions of old commits
+        self.results["SELECT MAX(id), COUNT(*) FROM actions"] = ((31, 31),)
+        fingerprint_actions = self.get_fingerprint()
+        self.assertNotEqual(fingerprint, fingerprint_actions)
+        # Affiliations updated with the same number of rows
+        self.results["CHECKSUM TABLE identities.enrollments"] = (("identities.enrollments", 4),)
+        self.assertNotEqual(fingerprint_actions, self.get_fingerprint())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+"""Tests for the profile of the queries"""
+
+import csv
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+if not '..' in sys.path:
+    sys.path.insert(0, '../..')
+
+from vizgrimoire.metrics import query_profile
+from vizgrimoire.metrics.metrics_filter import MetricFilters
+from vizgrimoire.metrics.query_builder import SCMQuery
+from vizgrimoire.metrics.scm_metrics import Commits
+
+
+class TestQueryProfile(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "profile")
+        query_profile.enable(self.path)
+        self.db = SCMQuery("user", "password", "scm", "identities")
+        self.db._fetch_result = lambda sql: {"commits": [10, 20]}
+
+    def tearDown(self):
+        query_profile._path = None
+        shutil.rmtree(self.dir)
+
+    def test_fingerprint(self):
+        (fingerprint, sql) = query_profile.get_fingerprint(
+            "SELECT  count(*) FROM scmlog WHERE name = 'nova' AND id > 10")
+        self.assertEqual("SELECT count(*) FROM scmlog WHERE name = ? AND id > ?", sql)
+        self.assertEqual(fingerprint, query_profile.get_fingerprint(
+            "SELECT count(*) FROM scmlog WHERE name = 'swift' AND id > 2")[0])
+
+    def test_metric_records(self):
+        filters = MetricFilters("month", "'2013-01-01'", "'2014-01-01'", ["repository", "'nova'"])
+        Commits(self.db, filters).get_agg()
+        self.db.ExecuteQuery("SELECT 1")
+        records = query_profile.read_records()
+        self.assertEqual(2, len(records))
+        commits = [item for item in records if item["metric_id"] == "commits"][0]
+        self.assertEqual(("Commits", "scm", "repository", "'nova'", 2),
+                         (commits["metric_class"], commits["data_source"], commits["filter"],
+                          commits["item"], commits["rows"]))
+        other = [item for item in records if item["metric_id"] is None][0]
+        self.assertEqual("SCMQuery", other["data_source"])
+        self.assertTrue(other["caller"].startswith("test_query_profile.py"))
+
+    def test_report(self):
+        for i in range(0, 3):
+            self.db.ExecuteQuery("SELECT %i" % (i))
+        query_profile.write_report(2)
+        self.assertEqual([], [f for f in os.listdir(self.dir) if ".part." in f])
+        records = json.load(open(self.path + ".json"))
+        self.assertEqual(3, len(records))
+        times = [item["time"] for item in records]
+        self.assertEqual(sorted(times, reverse=True), times)
+        rows = list(csv.DictReader(open(self.path + ".csv")))
+        self.assertEqual(3, len(rows))
+        summary = query_profile.get_summary(records, 2)
+        self.assertEqual(2, len(summary["slowest"]))
+        self.assertEqual(1, len(summary["fingerprints"]))
+        self.assertEqual(3, summary["fingerprints"][0]["count"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+"""Tests for the columnar results of queries"""
+
+import sys
+import unittest
+
+if not '..' in sys.path:
+    sys.path.insert(0, '../..')
+
+from datetime import datetime
+from decimal import Decimal
+
+import numpy
+
+from vizgrimoire.metrics.result_set import ResultSet
+
+
+class FakeCursor(object):
+
+    def __init__(self, columns, rows):
+        self.description = [(column,) for column in columns]
+        self.rows = rows
+        self.closed = False
+
+    def fetchmany(self, size):
+        rows = self.rows[0:size]
+        self.rows = self.rows[size:]
+        return tuple(rows)
+
+    def close(self):
+        self.closed = True
+
+
+class TestResultSet(unittest.TestCase):
+
+    def setUp(self):
+        self.rows = [("nova", Decimal("1.5"), datetime(2014, 1, 2), None),
+                     ("swift", None, datetime(2014, 2, 3), None),
+                     ("nova", 3, None, None)]
+        self.cursor = FakeCursor(["name", "revtime", "changed_on", "empty"], self.rows)
+
+    def test_from_cursor(self):
+        result = ResultSet.from_cursor(self.cursor, 2)
+        self.assertTrue(self.cursor.closed)
+        self.assertEqual(3, len(result))
+        self.assertEqual(numpy.float64, result["revtime"].dtype)
+        self.assertEqual([1.5, 3.0], result.dropna("revtime").tolist())
+        self.assertEqual("datetime64[s]", str(result["changed_on"].dtype))
+        self.assertEqual(2, len(result.dropna("changed_on")))
+        self.assertEqual(["nova", "swift", "nova"], result["name"].tolist())
+        self.assertEqual(0, len(result.dropna("empty")))
+
+    def test_codes(self):
+        result = ResultSet.from_cursor(self.cursor, 2)
+        codes, categories = result.codes("name")
+        self.assertEqual([0, 1, 0], codes.tolist())
+        self.assertEqual(["nova", "swift"], categories)
+        codes, categories = result.codes("revtime")
+        self.assertEqual([0, -1, 1], codes.tolist())
+        self.assertEqual([1.5, 3.0], categories)
+
+    def test_to_dict(self):
+        data = ResultSet.from_cursor(self.cursor, 2).to_dict()
+        self.assertEqual([1.5, None, 3.0], data["revtime"])
+        self.assertEqual([datetime(2014, 1, 2), datetime(2014, 2, 3), None],
+                         data["changed_on"])
+        self.assertEqual([None, None, None], data["empty"])
+
+    def test_one_row(self):
+        # One row returns arrays, not scalars
+        result = ResultSet.from_dict({"name": "nova", "commits": 10})
+        self.assertEqual(["nova"], result["name"].tolist())
+        self.assertEqual(numpy.int64, result["commits"].dtype)
+        self.assertEqual([10], result.to_dict()["commits"])
+
+    def test_no_rows(self):
+        result = ResultSet.from_cursor(FakeCursor(["name"], []))
+        self.assertEqual(0, len(result))
+        self.assertEqual(0, len(result["name"]))
+
+
+if __name__ == '__main__':
+    unittest.main()
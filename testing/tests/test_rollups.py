@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+"""Tests for the daily activity rollups"""
+
+import sys
+import unittest
+
+if not '..' in sys.path:
+    sys.path.insert(0, '../..')
+
+from sets import Set
+
+from vizgrimoire.metrics.rollups import SCMRollup, IssuesRollup
+
+
+class FakeRollupDB(object):
+    """ Runs queries on rows of events: (id, day) """
+
+    def __init__(self, events):
+        self.events = events
+        self.queries = []
+
+    def execute(self, sql):
+        self.queries.append(sql)
+        if sql.startswith("SELECT COUNT(*), DATE(MIN("):
+            last_id = int(sql.split(">")[-1])
+            days = [day for (id_, day) in self.events if id_ > last_id]
+            return [(len(days), min(days) if days else None)]
+        raise Exception("Not expected: " + sql)
+
+
+class TestRollups(unittest.TestCase):
+
+    def test_query(self):
+        rollup = SCMRollup()
+        query = rollup.get_query(" s.author_date ", Set(["count(distinct(pup.uuid)) as authors"]),
+                                 Set(["scmlog s", "people_uidentities pup"]),
+                                 Set(["s.author_id = pup.people_id"]))
+        self.assertEqual(("r.day", Set(["COUNT(DISTINCT(r.uuid)) AS authors"]),
+                          Set(["scm_rollup_daily r"]), Set([])), query)
+
+        query = rollup.get_query(" s.author_date ", Set(["sum(cl.added) as added_lines",
+                                                          "sum(cl.removed) as removed_lines"]),
+                                 Set(["commits_lines cl", "scmlog s"]),
+                                 Set(["s.message not like '%cvs2svn%'", "cl.commit_id = s.id"]))
+        self.assertEqual(Set(["SUM(r.added_lines_no_cvs2svn) AS added_lines",
+                              "SUM(r.removed_lines_no_cvs2svn) AS removed_lines"]), query[1])
+        self.assertEqual(Set(["r.added_lines_no_cvs2svn IS NOT NULL",
+                              "r.removed_lines_no_cvs2svn IS NOT NULL"]), query[3])
+
+    def test_no_query(self):
+        rollup = SCMRollup()
+        # Filtered by repository
+        self.assertEqual(None, rollup.get_query(" s.author_date ",
+                                                Set(["count(distinct(s.rev)) as commits"]),
+                                                Set(["scmlog s", "repositories r"]),
+                                                Set(["r.id = s.repository_id",
+                                                     "s.id IN (select distinct(a.commit_id) from actions a)"])))
+        # Distinct files are not additive
+        self.assertEqual(None, rollup.get_query(" s.author_date ",
+                                                Set(["count(distinct(a.file_id)) as files"]),
+                                                Set(["actions a", "scmlog s"]),
+                                                Set(["a.commit_id = s.id"])))
+        # All the fields must be in the rollup
+        self.assertEqual(None, rollup.get_query(" s.author_date ",
+                                                Set(["sum(cl.added) as added_lines",
+                                                     "count(distinct(s.rev)) as commits"]),
+                                                Set(["commits_lines cl", "scmlog s"]),
+                                                Set(["cl.commit_id = s.id"])))
+
+    def test_since(self):
+        rollup = IssuesRollup()
+        db = FakeRollupDB([(1, "2014-01-05"), (2, "2014-01-02"), (3, "2013-12-30")])
+        rollup._execute = lambda db_, sql: db.execute(sql)
+        identities = "1234"
+        self.assertEqual(None, rollup._get_since(None, ["2:2", "0:None", identities],
+                                                 ["2:2", "0:None", identities]))
+        # The oldest day of the new issues
+        self.assertEqual("'2013-12-30'", rollup._get_since(None, ["2:2", "0:None", identities],
+                                                           ["3:3", "0:None", identities]))
+        # All again: first update, identities changed, rows removed
+        self.assertEqual("", rollup._get_since(None, None, ["3:3", "0:None", identities]))
+        self.assertEqual("", rollup._get_since(None, ["3:3", "0:None", identities],
+                                               ["3:3", "0:None", "4321"]))
+        self.assertEqual("", rollup._get_since(None, ["2:2", "0:None", identities],
+                                               ["2:3", "0:None", identities]))
+
+        # Lines added to existing commits: the oldest day of their commits
+        rollup = SCMRollup()
+        db = FakeRollupDB([(3, "2014-01-05"), (4, "2013-11-20"), (5, "2014-01-02"),
+                           (6, "2013-12-01")])
+        rollup._execute = lambda db_, sql: db.execute(sql)
+        self.assertEqual("'2013-11-20'", rollup._get_since(None, ["3:3", "5:5", "2:2", identities],
+                                                           ["3:3", "5:5", "6:6", identities]))
+        self.assertTrue("FROM commits_lines t LEFT JOIN scmlog s ON s.id = t.commit_id" in
+                        db.queries[-1])
+        self.assertEqual("'2013-12-01'", rollup._get_since(None, ["3:3", "5:5", "2:2", identities],
+                                                           ["3:3", "6:6", "2:2", identities]))
+        self.assertTrue("FROM actions t LEFT JOIN" in db.queries[-1])
+        self.assertEqual(None, rollup._get_since(None, ["3:3", "5:5", "2:2", identities],
+                                                 ["3:3", "5:5", "2:2", identities]))
+        # Rows removed
+        self.assertEqual("", rollup._get_since(None, ["3:3", "5:5", "2:2", identities],
+                                               ["3:3", "5:5", "5:6", identities]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+"""Tests for the summaries of the top organizations"""
+
+import sys
+import unittest
+
+if not '..' in sys.path:
+    sys.path.insert(0, '../..')
+
+from vizgrimoire.analysis.summaries import get_top_series, _get_summary_companies
+
+
+class FakeDB(object):
+    """ Result of the GROUP BY organization query of a metric """
+
+    def __init__(self, data):
+        self.data = data
+
+    def ExecuteQuery(self, sql):
+        return dict(self.data)
+
+    def get_group_field(self, filter_type):
+        return "org.name"
+
+
+class FakeMetric(object):
+
+    id = "commits"
+
+    def __init__(self, data):
+        self.db = FakeDB(data)
+        self.filters = None
+
+    def _get_sql(self, evolutionary):
+        return ""
+
+
+class TestSummaries(unittest.TestCase):
+
+    def test_top_series(self):
+        # (organization, month, commits) rows of a GROUP BY query
+        rows = [("Intel", 24157, 5), ("Red Hat", 24157, 2), ("Intel", 24159, 1),
+                ("Bitergia", 24158, 3), ("SUSE", 24158, 1), ("SUSE", 24159, 2),
+                ("Others Inc", 24150, 100)]
+        items = [row[0] for row in rows]
+        periods = [row[1] for row in rows]
+        values = [row[2] for row in rows]
+        top = get_top_series(items, periods, values, [24157, 24158, 24159], 2)
+        self.assertEqual({"Intel": [5, 0, 1], "Bitergia": [0, 3, 0],
+                          "Others": [2, 1, 2]}, top)
+
+        top = get_top_series(items, periods, values, [24157, 24158, 24159], 10)
+        self.assertEqual(["Bitergia", "Intel", "Others Inc", "Red Hat", "SUSE"], sorted(top.keys()))
+        self.assertEqual([0, 0, 0], top["Others Inc"])
+
+    def test_excluded(self):
+        metric = FakeMetric({"name": ["Unknown", "Intel", "Red Hat", "SUSE", "Unknown"],
+                             "year": [2013 * 12, 2013 * 12, 2013 * 12, 2014 * 12, 2014 * 12],
+                             "commits": [50, 5, 2, 1, 40]})
+        summary = _get_summary_companies(metric, "year", "'2013-01-01'", "'2015-01-01'", 1,
+                                         ["Unknown"])
+        self.assertEqual([5, 0], summary["Intel"])
+        self.assertEqual([2, 1], summary["Others"])
+        self.assertFalse("Unknown" in summary)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+
+"""Tests for the trends of several windows of days"""
+
+import sys
+import unittest
+
+if not '..' in sys.path:
+    sys.path.insert(0, '../..')
+
+from vizgrimoire.metrics.metrics import Metrics
+from vizgrimoire.metrics.metrics_filter import MetricFilters
+from vizgrimoire.metrics.query_fusion import get_trends_single_pass
+
+
+class FakeDB(object):
+
+    def get_group_field(self, filter_type):
+        return "org.name"
+
+
+class WindowsTrends(Metrics):
+    """ Trends of GROUP BY queries with a different order of items in
+        each window """
+
+    id = "commits"
+
+    windows = {7: {"name": ["b", "a"], "commits_7": [2, 1]},
+               30: {"name": ["a", "c", "b"], "commits_30": [10, 30, 20]}}
+
+    def get_trends(self, date, days):
+        return self.windows[days]
+
+
+class TestTrends(unittest.TestCase):
+
+    def setUp(self):
+        filters = MetricFilters("month", "'2014-01-01'", "'2015-01-01'", ["company", None])
+        self.metric = WindowsTrends(FakeDB(), filters)
+
+    def test_windows_order(self):
+        data = self.metric.get_trends_windows("'2015-01-01'", [7, 30], ["a", "b", "c"])
+        self.assertEqual({"name": ["a", "b", "c"], "commits_7": [1, 2, 0],
+                          "commits_30": [10, 20, 30]}, data)
+
+    def test_windows_items(self):
+        # Items of all the windows
+        data = self.metric.get_trends_windows("'2015-01-01'", [7, 30])
+        self.assertEqual({"name": ["b", "a", "c"], "commits_7": [2, 1, 0],
+                          "commits_30": [20, 10, 30]}, data)
+
+    def test_not_supported(self):
+        filters = MetricFilters("month", "'2014-01-01'", "'2015-01-01'", ["company", None])
+        metric = Metrics(FakeDB(), filters)
+        metric.id = "bmitickets"
+        # Like _get_trends_all_items
+        self.assertEqual(None, get_trends_single_pass(metric, "'2015-01-01'", [7, 30]))
+
+
+if __name__ == '__main__':
+    unittest.main()
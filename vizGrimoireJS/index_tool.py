@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+
+# Copyright (C) 2014 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+# This file is a part of the vizGrimoire.R package
+#
+
+""" Tool for the indexes used by the metrics queries """
+
+import logging, os, sys
+from optparse import OptionParser
+
+def get_options():
+    parser = OptionParser(usage='Usage: %prog [options]',
+                          description='Report full table scans of the metrics queries and create indexes',
+                          version='0.1')
+    parser.add_option("-a", "--automator",
+                  action="store",
+                  dest="automator_file",
+                  default = "../../../conf/main.conf",
+                  help="Automator config file")
+    parser.add_option("-m", "--metrics",
+                  action="store",
+                  dest="metrics_path",
+                  default = "../vizgrimoire/metrics",
+                  help="Path to the metrics modules to be loaded")
+    parser.add_option("--data-source",
+                      action="store",
+                      dest="data_source",
+                      help="data source to be analyzed")
+    parser.add_option("--create",
+                      action="store_true",
+                      dest="create",
+                      help="Create the missing indexes and show the queries time before and after")
+
+    (opts, args) = parser.parse_args()
+
+    if len(args) != 0:
+        parser.error("Wrong number of arguments")
+
+    return opts
+
+def init_env():
+    grimoirelib = os.path.join("..","vizgrimoire")
+    metricslib = os.path.join("..","vizgrimoire","metrics")
+    studieslib = os.path.join("..","vizgrimoire","analysis")
+    alchemy = os.path.join("..","grimoirelib_alch")
+    for dir in [grimoirelib,metricslib,studieslib,alchemy]:
+        sys.path.append(dir)
+
+if __name__ == '__main__':
+    init_env()
+    from vizgrimoire.report import Report
+    from vizgrimoire.metrics import index_advisor
+    from vizgrimoire.metrics.query_builder import DSQuery
+
+    logging.basicConfig(level=logging.INFO,format='%(asctime)s %(message)s')
+    logging.info("Grimoire Index Tool")
+    opts = get_options()
+
+    Report.init(opts.automator_file, opts.metrics_path)
+    # Time the queries, not the cache
+    DSQuery.set_query_cache(None)
+
+    dss = Report.get_data_sources()
+    if (opts.data_source):
+        ds = Report.get_data_source(opts.data_source)
+        dss = [ds]
+        if ds is None:
+            logging.error("Data source not found " + opts.data_source)
+            dss = []
+
+    for ds in dss:
+        print("\nFull table scans in " + ds.get_name())
+        advisor = index_advisor.IndexAdvisor()
+        advisor.add_metrics(ds.get_metrics_set(ds))
+        for (metric_id, scans) in advisor.get_full_scans():
+            print("  %s: %s" % (metric_id, ", ".join(["%s (%s rows)" % scan for scan in scans])))
+
+        if not opts.create: continue
+
+        before = advisor.get_times()
+        builders = []
+        for (metric_id, sql, db) in advisor.queries:
+            if db not in builders: builders.append(db)
+        created = []
+        for db in builders:
+            created += index_advisor.create_indexes(db, db.get_indexes())
+        print("Indexes created in %s: %s" % (ds.get_name(), ", ".join(created)))
+        after = advisor.get_times()
+
+        print("Queries time in %s (before -> after):" % ds.get_name())
+        for metric_id in sorted(before.keys()):
+            if metric_id not in after: continue
+            print("  %s: %.3fs -> %.3fs" % (metric_id, before[metric_id], after[metric_id]))
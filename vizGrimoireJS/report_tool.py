@@ -37,7 +37,11 @@ def get_evol_report(startdate, enddate, identities_db):
 def create_evol_report(startdate, enddate, destdir, identities_db):
     for ds in Report.get_data_sources():
         Report.connect_ds(ds)
-        ds.create_evolutionary_report (period, startdate, enddate, destdir, identities_db)
+        if opts.incremental:
+            # The aggregated report is also created from the evolutionary data
+            create_incremental_reports(ds, period, startdate, enddate, destdir, identities_db)
+        else:
+            ds.create_evolutionary_report (period, startdate, enddate, destdir, identities_db)
 
 def get_agg_report(startdate, enddate, identities_db):
     all_ds = {}
@@ -324,6 +328,80 @@ def set_study(study_id):
         logging.error(study_id + " study not available ")
         sys.exit(1)
 
+# Report sections generated independently for each data source. The longest
+# ones go first so they start as soon as possible when run in parallel.
+report_sections = ["filters", "studies", "evol", "agg", "top"]
+
+def create_report_section(section):
+    if section == "evol":
+        create_evol_report(startdate, enddate, opts.destdir, identities_db)
+    elif section == "agg":
+        create_agg_report(startdate, enddate, opts.destdir, identities_db)
+    elif section == "top":
+        create_top_report(startdate, enddate, opts.destdir, opts.npeople, identities_db)
+    elif section == "filters":
+        create_reports_filters(period, startdate, enddate, opts.destdir, opts.npeople, identities_db)
+    elif section == "studies":
+        create_reports_studies(period, startdate, enddate, opts.destdir)
+    else:
+        raise Exception("Report section not supported " + section)
+
+def init_report_worker():
+    global worker_data_sources
+    worker_data_sources = Report.get_data_sources()
+    # Connections inherited from the parent process can not be shared
+    Report.reconnect()
+
+def run_report_task(task):
+    """ Create a report section for a data source in a worker process """
+    import traceback
+    ds_name, section = task
+    error = None
+    start = time.time()
+
+    ds = [ds for ds in worker_data_sources if ds.get_name() == ds_name][0]
+    Report.set_data_sources([ds])
+    try:
+        create_report_section(section)
+    except Exception:
+        error = traceback.format_exc()
+        logging.error(ds_name + " " + section + " failed\n" + error)
+    query_profile.flush()
+    json_writer.flush()
+
+    return (ds_name, section, time.time() - start, error)
+
+def show_tasks_time(results, total_time):
+    logging.info("Report tasks wall time (%.2fs total)" % (total_time))
+    for (ds_name, section, task_time, error) in sorted(results, key=lambda r: r[2], reverse=True):
+        status = "OK"
+        if error is not None: status = "FAILED"
+        logging.info("%10.2fs %-10s %-8s %s" % (task_time, ds_name, section, status))
+
+def create_reports_parallel(sections, jobs):
+    """ Create the report sections of all data sources using a pool of processes """
+    from multiprocessing import Pool
+
+    tasks = [(ds.get_name(), section) for section in sections
+             for ds in Report.get_data_sources()]
+    logging.info("Running %i report tasks with %i processes" % (len(tasks), jobs))
+
+    results = []
+    start = time.time()
+    pool = Pool(processes = jobs, initializer = init_report_worker)
+    try:
+        for result in pool.imap_unordered(run_report_task, tasks):
+            results.append(result)
+            logging.info("Report task %i/%i done: %s %s" % (len(results), len(tasks),
+                                                            result[0], result[1]))
+    finally:
+        pool.close()
+        pool.join()
+    show_tasks_time(results, time.time() - start)
+
+    failed = [result for result in results if result[3] is not None]
+    return len(failed) == 0
+
 def init_env():
     # env vars for R
     os.environ["LANG"] = ""
@@ -334,12 +412,19 @@ if __name__ == '__main__':
     init_env()
     from vizgrimoire.GrimoireUtils import getPeriod, read_main_conf, createJSON
     from vizgrimoire.report import Report
+    from vizgrimoire.metrics.query_builder import DSQuery
+    from vizgrimoire.metrics import connection_pool
+    from vizgrimoire.metrics import query_profile
+    from vizgrimoire import json_writer
+    from vizgrimoire.incremental import create_reports as create_incremental_reports
 
     logging.basicConfig(level=logging.INFO,format='%(asctime)s %(message)s')
     logging.info("Starting Report analysis")
     opts = read_options()
 
     Report.init(opts.config_file, opts.metrics_path)
+    Report.set_filter_jobs(opts.filter_jobs)
+    if opts.profile: query_profile.enable(opts.profile)
 
     automator = read_main_conf(opts.config_file)
     if 'start_date' not in automator['r']:
@@ -378,27 +463,65 @@ if __name__ == '__main__':
         set_study(opts.study)
     if (opts.events):
         create_events(startdate, enddate, opts.destdir)
+        json_writer.save([opts.destdir])
         logging.info("Events generated OK")
         sys.exit(0)
 
-    if not opts.filter and not opts.study:
-        logging.info("Creating global evolution metrics...")
-        evol = create_evol_report(startdate, enddate, opts.destdir, identities_db)
-        logging.info("Creating global aggregated metrics...")
-        agg = create_agg_report(startdate, enddate, opts.destdir, identities_db)
-        if not opts.metric:
+    if opts.jobs > 1:
+        sections = []
+        if not opts.filter and not opts.study:
+            sections += ["evol"]
+            if not opts.incremental: sections += ["agg"]
+            if not opts.metric: sections += ["top"]
+        filters_on = not opts.study and not opts.no_filters and not opts.metric
+        # Filter items reports use their own pool of processes
+        if filters_on and opts.filter_jobs == 1:
+            sections += ["filters"]
+        if not opts.filter and not opts.metric and not opts.item:
+            sections += ["studies"]
+        sections = [section for section in report_sections if section in sections]
+        tasks_ok = create_reports_parallel(sections, opts.jobs)
+        if filters_on and opts.filter_jobs > 1:
+            create_reports_filters(period, startdate, enddate, opts.destdir, opts.npeople, identities_db)
+
+        # People reports use data from all data sources
+        if not opts.filter and not opts.study and not opts.metric:
             people_ids = create_people_identifiers(startdate, enddate, opts.destdir, opts.npeople, identities_db)
-
-            logging.info("Creating global top metrics...")
-            top = create_top_report(startdate, enddate, opts.destdir, opts.npeople, identities_db)
             if (automator['r']['reports'].find('people')>-1):
                 create_report_people(startdate, enddate, opts.destdir, opts.npeople, identities_db, people_ids)
-            # create_reports_r(end_date, opts.destdir)
             create_top_people_report(startdate, enddate, opts.destdir, identities_db)
-
-    if not opts.study and not opts.no_filters and not opts.metric:
-        create_reports_filters(period, startdate, enddate, opts.destdir, opts.npeople, identities_db)
-    if not opts.filter and not opts.metric and not opts.item:
-        create_reports_studies(period, startdate, enddate, opts.destdir)
+        if not tasks_ok:
+            json_writer.save([opts.destdir])
+            logging.error("Some report tasks failed")
+            sys.exit(1)
+    else:
+        if not opts.filter and not opts.study:
+            logging.info("Creating global evolution metrics...")
+            evol = create_evol_report(startdate, enddate, opts.destdir, identities_db)
+            if not opts.incremental:
+                logging.info("Creating global aggregated metrics...")
+                agg = create_agg_report(startdate, enddate, opts.destdir, identities_db)
+            if not opts.metric:
+                people_ids = create_people_identifiers(startdate, enddate, opts.destdir, opts.npeople, identities_db)
+
+                logging.info("Creating global top metrics...")
+                top = create_top_report(startdate, enddate, opts.destdir, opts.npeople, identities_db)
+                if (automator['r']['reports'].find('people')>-1):
+                    create_report_people(startdate, enddate, opts.destdir, opts.npeople, identities_db, people_ids)
+                # create_reports_r(end_date, opts.destdir)
+                create_top_people_report(startdate, enddate, opts.destdir, identities_db)
+
+        if not opts.study and not opts.no_filters and not opts.metric:
+            create_reports_filters(period, startdate, enddate, opts.destdir, opts.npeople, identities_db)
+        if not opts.filter and not opts.metric and not opts.item:
+            create_reports_studies(period, startdate, enddate, opts.destdir)
+
+    query_cache = DSQuery.get_query_cache()
+    if query_cache is not None:
+        logging.info("Query cache (main process) hits: %(hits)i misses: %(misses)i" %
+                     query_cache.get_stats())
+    connection_pool.log_stats("Main process")
+    query_profile.write_report(opts.profile_top)
+    json_writer.save([opts.destdir])
 
     logging.info("Report data source analysis OK")
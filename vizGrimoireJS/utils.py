@@ -117,6 +117,32 @@ def read_options():
                       action="store_true",
                       dest="events",
                       help="Generate events.")
+    parser.add_option("-j", "--jobs",
+                      action="store",
+                      type="int",
+                      dest="jobs",
+                      default=1,
+                      help="Number of worker processes used to generate data sources reports")
+    parser.add_option("--filter-jobs",
+                      action="store",
+                      type="int",
+                      dest="filter_jobs",
+                      default=1,
+                      help="Number of worker processes used to generate filter items reports")
+    parser.add_option("--incremental",
+                      action="store_true",
+                      dest="incremental",
+                      help="Query only the periods since the last run in global evolutionary metrics")
+    parser.add_option("--profile",
+                      action="store",
+                      dest="profile",
+                      help="Profile the queries, writing PROFILE.json and PROFILE.csv")
+    parser.add_option("--profile-top",
+                      action="store",
+                      type="int",
+                      dest="profile_top",
+                      default=20,
+                      help="Number of slowest queries shown with --profile")
 
     (opts, args) = parser.parse_args()
 
@@ -132,4 +158,8 @@ def read_options():
         parser.error("--metric need also --data-source.")
     if opts.item and opts.filter is None:
         parser.error("--item need also --filter.")
+    if opts.jobs < 1:
+        parser.error("--jobs must be 1 or greater.")
+    if opts.filter_jobs < 1:
+        parser.error("--filter-jobs must be 1 or greater.")
     return opts
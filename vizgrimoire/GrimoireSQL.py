@@ -21,16 +21,16 @@
 
 # SQL utilities
 
-import MySQLdb
 import logging
-import re, sys
+import re, sys, time
+from vizgrimoire.metrics import connection_pool
+from vizgrimoire.metrics import query_profile
 from vizgrimoire.metrics.query_builder import DSQuery
 
 
 # global vars to be moved to specific classes
-cursor = None
-# one connection per database
-dbpool = {}
+# pool of connections to the database of the current channel
+pool = None
 
 ##
 ## METAQUERIES
@@ -50,6 +50,18 @@ def GetSQLPeriod(period, date, fields, tables, filters, start, end,
     all_items = DSQuery.get_all_items(type_analysis)
     return DSQuery.GetSQLPeriod(period, date, fields, tables, filters, start, end, all_items)
 
+def GetSQLPeople(developer_ids, period, date, fields, tables, filters,
+                 start, end, evol):
+    """ Query for the activity of several people, grouped by uuid """
+    uuids = ",".join(["'" + str(uuid) + "'" for uuid in developer_ids])
+    filters += " AND pup.uuid IN (" + uuids + ")"
+    if (evol):
+        return GetSQLPeriod(period, date, fields, tables, filters, start, end,
+                            ["uuid", None])
+    fields = "pup.uuid AS uuid, " + fields
+    filters += " GROUP BY pup.uuid"
+    return GetSQLGlobal(date, fields, tables, filters, start, end)
+
 ############
 #Generic functions to check evolutionary or static info and for the execution of the final query
 ###########
@@ -69,27 +81,29 @@ def BuildQuery (period, startdate, enddate, date_field, fields, tables, filters,
 
 def SetDBChannel (user=None, password=None, database=None,
                   host="127.0.0.1", port=3306, group=None):
-    global cursor
-    global dbpool
-
-    db = None
+    global pool
 
-    if database in dbpool:
-        db = dbpool[database]
-    else:
-        if (group == None):
-            db = MySQLdb.connect(user=user, passwd=password,
-                                 db=database, host=host, port=port)
-        else:
-            db = MySQLdb.connect(read_default_group=group, db=database)
-        dbpool[database] = db
+    # Connections are shared with the DSQuery using the same database
+    pool = connection_pool.get_pool(user, password, database, host, port, group)
+    pool.get_connection()
 
-    cursor = db.cursor()
-    cursor.execute("SET NAMES 'utf8'")
+def ResetDBChannel ():
+    """ Forget all connections, i.e. those inherited after a fork,
+        and open the current channel again with a new connection """
+    connection_pool.reset_pools()
+    if pool is not None:
+        pool.get_connection()
 
 def ExecuteQuery (sql):
+    if not query_profile.is_enabled(): return _fetch_result(sql)
+    start = time.time()
+    result = _fetch_result(sql)
+    query_profile.record(sql, time.time() - start, result, pool.params['database'])
+    return result
+
+def _fetch_result (sql):
     result = {}
-    cursor.execute(sql)
+    cursor = pool.execute(sql)
     rows = cursor.rowcount
     columns = cursor.description
 
@@ -106,3 +120,8 @@ def ExecuteQuery (sql):
         for i in range (0, len(columns)):
             result[columns[i][0]] = value[i]
     return result 
+
+def ExecuteQueryIter (sql, batch_size = None):
+    """ Execute sql reading its rows from the server while iterating,
+        as tuples or, with batch_size, as dicts of columns """
+    return pool.execute_iter(sql, batch_size)
@@ -34,12 +34,16 @@ from dateutil import parser
 import logging
 import json
 import math
-import rpy2.rinterface as rinterface
-from rpy2.robjects.vectors import StrVector
 import os,sys
-from numpy import average, median
+
+from vizgrimoire import json_writer
+
+# rpy2 and numpy are imported when used: loading them is slow and
+# most of the reports do not need them
 
 def valRtoPython(val):
+    import rpy2.rinterface as rinterface
+    from rpy2.robjects.vectors import StrVector
     if val is rinterface.NA_Character: val = None
     # Check for .0 and convert to int
     elif isinstance(val, float):
@@ -80,71 +84,77 @@ def cleanNaN(ts_data):
     return ts_data
 
 
-def completePeriodIdsYears(ts_data, start, end):
+def _get_positions(values):
+    """ Dict with the position of the first appearance of each value """
+    positions = {}
+    for i in range(len(values) - 1, -1, -1):
+        positions[values[i]] = i
+    return positions
+
+# Periods ids, unixtimes and labels already built for (period, start, end)
+_periods_axis = {}
+
+def _getPeriodsAxis(period, start, end, period_ids, dates):
+    """ Time series fields for the period_ids starting in dates """
+    unixtimes = [unicode(calendar.timegm(date.timetuple())) for date in dates]
+    labels = [datetime.strftime(date, "%b %Y") for date in dates]
+    _periods_axis[(period, start, end)] = (period_ids, unixtimes, labels)
+    return _periods_axis[(period, start, end)]
+
+def _completePeriodIdsAxis(ts_data, period, axis):
+    """ Complete ts_data with zeros for the periods of axis not found in it """
     data_vars = ts_data.keys()
     new_ts_data =  createTimeSeries(ts_data)
     checkListArray(ts_data)
+    positions = _get_positions(ts_data[period])
+    period_ids, unixtimes, labels = axis
 
-    start_year = start.year * 12
-    years = end.year - start.year
-
-
-    for i in range(0, years+1):
-        if (start_year+(i*12) in ts_data['year']) is False:
+    for i in range(0, len(period_ids)):
+        index = positions.get(period_ids[i])
+        if index is None:
             # Add new time point with all vars to zero
             for key in (data_vars):
                 new_ts_data[key].append(0)
-            new_ts_data['year'].pop()
-            new_ts_data['year'].append(start_year+(i*12))
+            new_ts_data[period][-1] = period_ids[i]
         else:
             # Add already existing data for the time point
-            index = ts_data['year'].index(start_year+(i*12))
             for key in (data_vars):
                 new_ts_data[key].append(ts_data[key][index])
 
-        current =  start + relativedelta(years=i)
-        timestamp = calendar.timegm(current.timetuple())
-        new_ts_data['unixtime'].append(unicode(timestamp))
-        new_ts_data['id'].append(i)
-        new_ts_data['date'].append(datetime.strftime(current, "%b %Y"))
+    new_ts_data['unixtime'] += unixtimes
+    new_ts_data['id'] += range(0, len(period_ids))
+    new_ts_data['date'] += labels
 
     return new_ts_data
 
+def completePeriodIdsYears(ts_data, start, end):
+    axis = _periods_axis.get(('year', start, end))
+    if axis is None:
+        start_year = start.year * 12
+        years = end.year - start.year
+        period_ids = [start_year+(i*12) for i in range(0, years+1)]
+        dates = [start + relativedelta(years=i) for i in range(0, years+1)]
+        axis = _getPeriodsAxis('year', start, end, period_ids, dates)
 
-def completePeriodIdsMonths(ts_data, start, end):
-    data_vars = ts_data.keys()
-    new_ts_data =  createTimeSeries(ts_data)
-    checkListArray(ts_data)
+    return _completePeriodIdsAxis(ts_data, 'year', axis)
 
-    start_month = start.year*12 + start.month
-    end_month = end.year*12 + end.month
-    months = end_month - start_month
+def completePeriodIdsMonths(ts_data, start, end):
+    axis = _periods_axis.get(('month', start, end))
+    if axis is None:
+        start_month = start.year*12 + start.month
+        end_month = end.year*12 + end.month
+        months = end_month - start_month
 
-    # All data is from the complete month
-    start = start - timedelta(days=(start.day-1))
+        # All data is from the complete month
+        first = start - timedelta(days=(start.day-1))
 
-    for i in range(0, months+1):
-        if (start_month+i in ts_data['month']) is False:
-            # Add new time point with all vars to zero
-            for key in (data_vars):
-                new_ts_data[key].append(0)
-            new_ts_data['month'].pop()
-            new_ts_data['month'].append(start_month+i)
-        else:
-            # Add already existing data for the time point
-            index = ts_data['month'].index(start_month+i)
-            for key in (data_vars):
-                new_ts_data[key].append(ts_data[key][index])
-
-        current =  start + relativedelta(months=i)
-        timestamp = calendar.timegm(current.timetuple())
-        new_ts_data['unixtime'].append(unicode(timestamp))
-        new_ts_data['id'].append(i)
+        period_ids = [start_month+i for i in range(0, months+1)]
+        dates = [first + relativedelta(months=i) for i in range(0, months+1)]
         import locale
         locale.setlocale(locale.LC_ALL, "en_US.UTF-8")
-        new_ts_data['date'].append(datetime.strftime(current, "%b %Y"))
+        axis = _getPeriodsAxis('month', start, end, period_ids, dates)
 
-    return new_ts_data
+    return _completePeriodIdsAxis(ts_data, 'month', axis)
 
 def date2Week(date):
     # isocalendar: year weeknumber weekday
@@ -153,39 +163,21 @@ def date2Week(date):
     return week
 
 def completePeriodIdsWeeks(ts_data, start, end):
-    data_vars = ts_data.keys()
-    new_ts_data =  createTimeSeries(ts_data)
-    checkListArray(ts_data)
-
-    # Start of the week
-    dayweek = start.isocalendar()[2]
-    new_week = start - relativedelta(days=dayweek-1)
-    i = 0 # for ids in time series
-
-    while (new_week <= end):
-        new_week_txt = date2Week(new_week)
-        if (int(new_week_txt) in ts_data['week']) is False:
-            # Add new time point with all vars to zero
-            for key in (data_vars):
-                new_ts_data[key].append(0)
-            new_ts_data['week'].pop()
-            new_ts_data['week'].append(int(new_week_txt))
-        else:
-            # Add already existing data for the time point
-            index = ts_data['week'].index(int(new_week_txt))
-            for key in (data_vars):
-                new_ts_data[key].append(ts_data[key][index])
-            new_ts_data['week'].pop()
-            new_ts_data['week'].append(ts_data['week'][index])
-
-        timestamp = calendar.timegm(new_week.timetuple())
-        new_ts_data['unixtime'].append(unicode(timestamp))
-        new_ts_data['id'].append(i)
-        i += 1
-        new_ts_data['date'].append(datetime.strftime(new_week, "%b %Y"))
-        new_week = new_week + relativedelta(weeks=1)
-
-    return new_ts_data
+    axis = _periods_axis.get(('week', start, end))
+    if axis is None:
+        # Start of the week
+        dayweek = start.isocalendar()[2]
+        new_week = start - relativedelta(days=dayweek-1)
+
+        period_ids = []
+        dates = []
+        while (new_week <= end):
+            period_ids.append(int(date2Week(new_week)))
+            dates.append(new_week)
+            new_week = new_week + relativedelta(weeks=1)
+        axis = _getPeriodsAxis('week', start, end, period_ids, dates)
+
+    return _completePeriodIdsAxis(ts_data, 'week', axis)
 
 def completePeriodIds(ts_data, period, startdate, enddate):
     # If already complete, return
@@ -341,38 +333,12 @@ def convertCombinedFiltersName(data):
             break
     return data
 
-# Until we use VizPy we will create JSON python files with _py
-def createJSON(data, filepath, check=False, skip_fields = []):
-    check = False # for production mode
-    filepath_tokens = filepath.split(".json")
-    filepath_py = filepath_tokens[0]+"_py.json"
-    filepath_r = filepath_tokens[0]+"_r.json"
-
-    checked_data = convertDatetime(roundDecimals(removeDecimals(data)))
-    checked_data = convertCombinedFiltersName(checked_data)
-    json_data = json.dumps(checked_data, sort_keys=True)
-    json_data = json_data.replace('NaN','"NA"')
-    if check == False: #forget about R JSON checking
-        jsonfile = open(filepath, 'w')
-        jsonfile.write(json_data)
-        jsonfile.close()
-        return
-
-    # NA as value is not decoded with Python JSON
-    # JSON R has "NA" and not NaN
-    # JSON R has "NA" and not null
-    json_data = json_data.replace('NA','"NA"').replace('NaN','"NA"').replace('null',' "NA" ')
-    jsonfile = open(filepath_py, 'w')
-    jsonfile.write(json_data)
-    jsonfile.close()
-
-    if (check == True and compareJSON(filepath, filepath_py, skip_fields) is False):
-        logging.error("Wrong data generated from Python "+ filepath_py)
-        sys.exit(1)
-    else:
-        # Rename the files so Python JSON is used
-        os.rename(filepath, filepath_r)
-        os.rename(filepath_py, filepath)
+def createJSON(data, filepath, check=False, skip_fields = [], axis_filepath = None,
+               bundle_filepath = None):
+    """ Write data to filepath. The time axis of filter items is written
+        to axis_filepath if the shared axis is enabled in json_writer, and
+        filter items are added to bundle_filepath if bundles are enabled. """
+    json_writer.write_json(data, filepath, axis_filepath, bundle_filepath)
 
 def compareJSON(orig_file, new_file, skip_fields = []):
     try:
@@ -564,6 +530,7 @@ def get_median(period_values):
         return float('nan')
     if not isinstance(period_values, list):
         return period_values
+    from numpy import median
     return median(removeDecimals(period_values))
 
 
@@ -573,6 +540,7 @@ def get_avg(period_values):
         return float('nan')
     if not isinstance(period_values, list):
         return period_values
+    from numpy import average
     return average(removeDecimals(period_values))
 
 def medianAndAvgByPeriod(period, dates, values):
@@ -647,8 +615,10 @@ def fill_items(items, data, id_field, evol = False,
         logging.info("[fill_items] " + id_field + " not found in " + ",".join(data))
         return data
     fields.remove(id_field)
+    data_items = set(data[id_field])
     for id in items:
-        if id not in data[id_field]:
+        if id not in data_items:
+            data_items.add(id)
             data[id_field].append(id)
             for field in fields:
                 if field in ts_fields: continue
@@ -678,10 +648,11 @@ def order_items(items, data, id_field, evol = False, period = None):
                 fields.remove(evol_field)
                 data_ordered[evol_field] = data[evol_field]
 
+    positions = _get_positions(data[id_field])
     for id in items:
         data_ordered[id_field].append(id)
         try:
-            pos = data[id_field].index(id)
+            pos = positions[id]
         except:
             print items
             print data[id_field]
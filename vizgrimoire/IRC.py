@@ -23,7 +23,7 @@
 
 import logging, os
 
-from vizgrimoire.GrimoireSQL import GetSQLGlobal, GetSQLPeriod, ExecuteQuery, BuildQuery
+from vizgrimoire.GrimoireSQL import GetSQLGlobal, GetSQLPeriod, GetSQLPeople, ExecuteQuery, BuildQuery
 from vizgrimoire.GrimoireUtils import GetPercentageDiff, GetDates, getPeriod, createJSON, completePeriodIds
 from vizgrimoire.data_source import DataSource
 from vizgrimoire.filter import Filter
@@ -146,11 +146,14 @@ class IRC(DataSource):
 
             evol_data = IRC.get_evolutionary_data(period, startdate, enddate, identities_db, filter_item)
             fn = os.path.join(destdir, filter_item.get_evolutionary_filename(IRC()))
-            createJSON(completePeriodIds(evol_data, period, startdate, enddate), fn)
+            bundle_fn = os.path.join(destdir, filter_item.get_evolutionary_bundle_filename(IRC()))
+            createJSON(completePeriodIds(evol_data, period, startdate, enddate), fn,
+                       bundle_filepath = bundle_fn)
 
             agg = IRC.get_agg_data(period, startdate, enddate, identities_db, filter_item)
             fn = os.path.join(destdir, filter_item.get_static_filename(IRC()))
-            createJSON(agg, fn)
+            bundle_fn = os.path.join(destdir, filter_item.get_static_bundle_filename(IRC()))
+            createJSON(agg, fn, bundle_filepath = bundle_fn)
 
     @staticmethod
     def create_filter_report_all(filter_, period, startdate, enddate, destdir, npeople, identities_db):
@@ -191,6 +194,16 @@ class IRC(DataSource):
     def get_person_agg(uuid, startdate, enddate, identities_db, type_analysis):
         return GetStaticPeopleIRC(uuid, startdate, enddate)
 
+    @staticmethod
+    def get_people_evol(uuids, period, startdate, enddate, identities_db):
+        evol = GetEvolPeopleIRC(uuids, period, startdate, enddate)
+        return DataSource.split_people_evol(evol, uuids, period, startdate, enddate)
+
+    @staticmethod
+    def get_people_agg(uuids, startdate, enddate, identities_db):
+        agg = GetStaticPeopleIRC(uuids, startdate, enddate)
+        return DataSource.split_people_agg(agg, uuids)
+
     @staticmethod
     def create_r_reports(vizr, enddate, destdir):
         pass
@@ -368,16 +381,21 @@ def GetListPeopleIRC (startdate, enddate) :
 def GetQueryPeopleIRC (developer_id, period, startdate, enddate, evol):
     fields = "COUNT(irclog.id) AS sent"
     tables = GetTablesOwnUniqueIdsIRC()
-    filters = GetFiltersOwnUniqueIdsIRC() + " AND pup.uuid = '" + str(developer_id) + "'"
-    filters += " AND irclog.type='COMMENT'"
+    filters = GetFiltersOwnUniqueIdsIRC() + " AND irclog.type='COMMENT'"
+    if not evol:
+        fields = fields + \
+                ",DATE_FORMAT (min(date),'%Y-%m-%d') as first_date,"+\
+                " DATE_FORMAT (max(date),'%Y-%m-%d') as last_date"
+    if isinstance(developer_id, list):
+        # All people in one query grouped by uuid
+        return GetSQLPeople(developer_id, period, 'date', fields, tables,
+                            filters, startdate, enddate, evol)
+    filters += " AND pup.uuid = '" + str(developer_id) + "'"
 
     if (evol) :
         q = GetSQLPeriod(period,'date', fields, tables, filters,
                 startdate, enddate)
     else:
-        fields = fields + \
-                ",DATE_FORMAT (min(date),'%Y-%m-%d') as first_date,"+\
-                " DATE_FORMAT (max(date),'%Y-%m-%d') as last_date"
         q = GetSQLGlobal('date', fields, tables, filters,
                 startdate, enddate)
     return (q)
@@ -26,7 +26,7 @@
 
 import logging, os, re
 
-from vizgrimoire.GrimoireSQL import GetSQLGlobal, GetSQLPeriod
+from vizgrimoire.GrimoireSQL import GetSQLGlobal, GetSQLPeriod, GetSQLPeople
 from vizgrimoire.GrimoireSQL import ExecuteQuery, BuildQuery
 from vizgrimoire.GrimoireUtils import GetPercentageDiff, GetDates, completePeriodIds, getPeriod, check_array_value
 from vizgrimoire.GrimoireUtils import createJSON
@@ -235,6 +235,17 @@ class ITS(DataSource):
             summary =  GetClosedSummaryCompanies(period, startdate, enddate, identities_db, closed_condition, limit)
         return summary
 
+    @classmethod
+    def create_filter_item_report(cls, filter_item, period, startdate, enddate,
+                                  destdir, npeople, identities_db):
+        agg = super(ITS, cls).create_filter_item_report(filter_item, period, startdate, enddate,
+                                                        destdir, npeople, identities_db)
+        if filter_item.get_name() in ["company","domain","repository"]:
+            top = cls.get_top_data(startdate, enddate, identities_db, filter_item, npeople)
+            fn = os.path.join(destdir, filter_item.get_top_filename(cls()))
+            createJSON(top, fn)
+        return agg
+
     @classmethod
     def create_filter_report(cls, filter_, period, startdate, enddate, destdir, npeople, identities_db):
         from vizgrimoire.report import Report
@@ -257,29 +268,15 @@ class ITS(DataSource):
         else:
             items_list = items
 
-        for item in items :
-            item_name = "'"+ item+ "'"
-            logging.info (item_name)
-            filter_item = Filter(filter_name, item)
-
-            evol_data = cls.get_evolutionary_data(period, startdate, enddate, identities_db, filter_item)
-            fn = os.path.join(destdir, filter_item.get_evolutionary_filename(cls()))
-            createJSON(evol_data, fn)
-
-            agg = cls.get_agg_data(period, startdate, enddate, identities_db, filter_item)
-            fn = os.path.join(destdir, filter_item.get_static_filename(cls()))
-            createJSON(agg, fn)
+        aggs = cls.create_filter_items_report(filter_, items, period, startdate, enddate,
+                                              destdir, npeople, identities_db)
 
+        for item, agg in zip(items, aggs):
             if filter_name in ["domain", "company", "repository"]:
                 items_list['name'].append(item.replace('/', '_'))
                 items_list['closed_365'].append(agg['closed_365'])
                 items_list['closers_365'].append(agg['closers_365'])
 
-            if filter_name in ["company","domain","repository"]:
-                top = cls.get_top_data(startdate, enddate, identities_db, filter_item, npeople)
-                fn = os.path.join(destdir, filter_item.get_top_filename(cls()))
-                createJSON(top, fn)
-
         fn = os.path.join(destdir, filter_.get_filename(cls()))
         createJSON(items_list, fn)
 
@@ -366,6 +363,18 @@ class ITS(DataSource):
         closed_condition =  cls._get_closed_condition()
         return GetPeopleStaticITS(uuid, startdate, enddate, closed_condition)
 
+    @classmethod
+    def get_people_evol(cls, uuids, period, startdate, enddate, identities_db):
+        closed_condition =  cls._get_closed_condition()
+        evol = GetPeopleEvolITS(uuids, period, startdate, enddate, closed_condition)
+        return DataSource.split_people_evol(evol, uuids, period, startdate, enddate)
+
+    @classmethod
+    def get_people_agg(cls, uuids, startdate, enddate, identities_db):
+        closed_condition =  cls._get_closed_condition()
+        agg = GetPeopleStaticITS(uuids, startdate, enddate, closed_condition)
+        return DataSource.split_people_agg(agg, uuids)
+
     @classmethod
     def create_r_reports(cls, vizr, enddate, destdir):
         backend = cls._get_backend().its_type
@@ -577,15 +586,20 @@ def GetPeopleListITS (startdate, enddate) :
 def GetPeopleQueryITS (developer_id, period, startdate, enddate, evol,  closed_condition) :
     fields = " COUNT(distinct(c.issue_id)) AS closed"
     tables = GetTablesOwnUniqueIdsITS()
-    filters = GetFiltersOwnUniqueIdsITS() + " AND pup.uuid = '"+ str(developer_id)+"'"
-    filters += " AND "+ closed_condition
+    filters = GetFiltersOwnUniqueIdsITS() + " AND "+ closed_condition
+    if not evol:
+        fields += ",DATE_FORMAT (min(changed_on),'%Y-%m-%d') as first_date, "+\
+                  "DATE_FORMAT (max(changed_on),'%Y-%m-%d') as last_date"
+    if isinstance(developer_id, list):
+        # All people in one query grouped by uuid
+        return GetSQLPeople(developer_id, period, 'changed_on', fields, tables,
+                            filters, startdate, enddate, evol)
+    filters += " AND pup.uuid = '"+ str(developer_id)+"'"
 
     if (evol) :
         q = GetSQLPeriod(period,'changed_on', fields, tables, filters,
                             startdate, enddate)
     else :
-        fields += ",DATE_FORMAT (min(changed_on),'%Y-%m-%d') as first_date, "+\
-                  "DATE_FORMAT (max(changed_on),'%Y-%m-%d') as last_date"
         q = GetSQLGlobal('changed_on', fields, tables, filters,
                             startdate, enddate)
 
@@ -29,7 +29,7 @@ import re
 import sys
 import datetime
 
-from vizgrimoire.GrimoireSQL import GetSQLGlobal, GetSQLPeriod
+from vizgrimoire.GrimoireSQL import GetSQLGlobal, GetSQLPeriod, GetSQLPeople
 from vizgrimoire.GrimoireSQL import ExecuteQuery, BuildQuery
 from vizgrimoire.GrimoireUtils import GetPercentageDiff, GetDates, completePeriodIds, getPeriod, createJSON, get_subprojects
 from vizgrimoire.metrics.metrics_filter import MetricFilters
@@ -209,6 +209,15 @@ class MLS(DataSource):
             summary =  GetSentSummaryCompanies(period, startdate, enddate, identities_db, limit, projects_db)
         return summary
 
+    @classmethod
+    def create_filter_item_report(cls, filter_item, period, startdate, enddate,
+                                  destdir, npeople, identities_db):
+        agg = super(MLS, cls).create_filter_item_report(filter_item, period, startdate, enddate,
+                                                        destdir, npeople, identities_db)
+        top_senders = MLS.get_top_data(startdate, enddate, identities_db, filter_item, npeople, False)
+        createJSON(top_senders, destdir+"/"+filter_item.get_top_filename(MLS()))
+        return agg
+
     @staticmethod
     def create_filter_report(filter_, period, startdate, enddate, destdir, npeople, identities_db):
         from vizgrimoire.report import Report
@@ -234,28 +243,15 @@ class MLS(DataSource):
         else:
             items_list = items
 
-        for item in items :
-            item_name = "'"+ item+ "'"
-            logging.info (item_name)
-            filter_item = Filter(filter_.get_name(), item)
-
-            evol_data = MLS.get_evolutionary_data(period, startdate, enddate, 
-                                                  identities_db, filter_item)
-            fn = os.path.join(destdir, filter_item.get_evolutionary_filename(MLS()))
-            createJSON(evol_data, fn)
-
-            agg = MLS.get_agg_data(period, startdate, enddate, identities_db, filter_item)
-            fn = os.path.join(destdir, filter_item.get_static_filename(MLS()))
-            createJSON(agg, fn)
+        aggs = MLS.create_filter_items_report(filter_, items, period, startdate, enddate,
+                                              destdir, npeople, identities_db)
 
+        for item, agg in zip(items, aggs):
             if filter_name in ("domain", "company", "repository"):
                 items_list['name'].append(item.replace('/', '_').replace("<","__").replace(">","___"))
                 items_list['sent_365'].append(agg['sent_365'])
                 items_list['senders_365'].append(agg['senders_365'])
 
-            top_senders = MLS.get_top_data(startdate, enddate, identities_db, filter_item, npeople, False)
-            createJSON(top_senders, destdir+"/"+filter_item.get_top_filename(MLS()))
-
         fn = os.path.join(destdir, filter_.get_filename(MLS()))
         createJSON(items_list, fn)
 
@@ -323,6 +319,16 @@ class MLS(DataSource):
     def get_person_agg(uuid, startdate, enddate, identities_db, type_analysis):
         return GetStaticPeopleMLS(uuid, startdate, enddate)
 
+    @staticmethod
+    def get_people_evol(uuids, period, startdate, enddate, identities_db):
+        evol = GetEvolPeopleMLS(uuids, period, startdate, enddate)
+        return DataSource.split_people_evol(evol, uuids, period, startdate, enddate)
+
+    @staticmethod
+    def get_people_agg(uuids, startdate, enddate, identities_db):
+        agg = GetStaticPeopleMLS(uuids, startdate, enddate)
+        return DataSource.split_people_agg(agg, uuids)
+
     @staticmethod
     def create_r_reports(vizr, enddate, destdir):
         unique_ids = True
@@ -587,15 +593,21 @@ def GetListPeopleMLS (startdate, enddate) :
 def GetQueryPeopleMLS (developer_id, period, startdate, enddate, evol) :
     fields = "COUNT(m.message_ID) AS sent"
     tables = GetTablesOwnUniqueIdsMLS()
-    filters = GetFiltersOwnUniqueIdsMLS() + "AND pup.uuid = '" + str(developer_id) + "'"
+    filters = GetFiltersOwnUniqueIdsMLS()
+    if not evol:
+        fields = fields +\
+                ",DATE_FORMAT (min(first_date),'%Y-%m-%d') as first_date, "+\
+                "DATE_FORMAT (max(first_date),'%Y-%m-%d') as last_date"
+    if isinstance(developer_id, list):
+        # All people in one query grouped by uuid
+        return GetSQLPeople(developer_id, period, 'first_date', fields, tables,
+                            filters, startdate, enddate, evol)
+    filters += "AND pup.uuid = '" + str(developer_id) + "'"
 
     if (evol) :
         q = GetSQLPeriod(period,'first_date', fields, tables, filters,
                 startdate, enddate)
     else:
-        fields = fields +\
-                ",DATE_FORMAT (min(first_date),'%Y-%m-%d') as first_date, "+\
-                "DATE_FORMAT (max(first_date),'%Y-%m-%d') as last_date"
         q = GetSQLGlobal('first_date', fields, tables, filters,
                 startdate, enddate)
     return (q)
@@ -22,7 +22,7 @@
 import logging, os
 
 from filter import Filter
-from vizgrimoire.GrimoireSQL import GetSQLGlobal, GetSQLPeriod 
+from vizgrimoire.GrimoireSQL import GetSQLGlobal, GetSQLPeriod, GetSQLPeople
 from vizgrimoire.GrimoireSQL import ExecuteQuery, BuildQuery
 from vizgrimoire.GrimoireUtils import GetPercentageDiff, GetDates, completePeriodIds, createJSON
 from vizgrimoire.metrics.metrics_filter import MetricFilters
@@ -186,6 +186,16 @@ class Mediawiki(DataSource):
     def get_person_agg(uuid, startdate, enddate, identities_db, type_analysis):
         return GetStaticPeopleMediaWiki(uuid, startdate, enddate)
 
+    @staticmethod
+    def get_people_evol(uuids, period, startdate, enddate, identities_db):
+        evol = GetEvolPeopleMediaWiki(uuids, period, startdate, enddate)
+        return DataSource.split_people_evol(evol, uuids, period, startdate, enddate)
+
+    @staticmethod
+    def get_people_agg(uuids, startdate, enddate, identities_db):
+        agg = GetStaticPeopleMediaWiki(uuids, startdate, enddate)
+        return DataSource.split_people_agg(agg, uuids)
+
     @staticmethod
     def create_r_reports(vizr, enddate, destdir):
         pass
@@ -235,14 +245,20 @@ def GetListPeopleMediaWiki (startdate, enddate) :
 def GetQueryPeopleMediaWiki (developer_id, period, startdate, enddate, evol) :
     fields = "COUNT(wiki_pages_revs.id) AS revisions"
     tables = GetTablesOwnUniqueIdsMediaWiki()
-    filters = GetFiltersOwnUniqueIdsMediaWiki() + " AND pup.uuid = '" + str(developer_id) + "'"
+    filters = GetFiltersOwnUniqueIdsMediaWiki()
+    if not evol:
+        fields += ",DATE_FORMAT (min(date),'%Y-%m-%d') as first_date, "+\
+                  "DATE_FORMAT (max(date),'%Y-%m-%d') as last_date"
+    if isinstance(developer_id, list):
+        # All people in one query grouped by uuid
+        return GetSQLPeople(developer_id, period, 'date', fields, tables,
+                            filters, startdate, enddate, evol)
+    filters += " AND pup.uuid = '" + str(developer_id) + "'"
 
     if (evol) :
         q = GetSQLPeriod(period,'date', fields, tables, filters,
                 startdate, enddate)
     else :
-        fields += ",DATE_FORMAT (min(date),'%Y-%m-%d') as first_date, "+\
-                  "DATE_FORMAT (max(date),'%Y-%m-%d') as last_date"
         q = GetSQLGlobal('date', fields, tables, filters,
                 startdate, enddate)
     return (q)
@@ -207,22 +207,13 @@ class Pullpo(DataSource):
 
         items_list = {"name":[],"review_time_days_median":[],"submitted":[]}
 
-        for item in items :
+        aggs = Pullpo.create_filter_items_report(filter_, items, period, startdate, enddate,
+                                                 destdir, npeople, identities_db)
+
+        for item, agg in zip(items, aggs):
             item_file = item.replace("/","_")
             items_list["name"].append(item_file)
 
-            logging.info (item)
-            filter_item = Filter(filter_name, item)
-
-            evol = Pullpo.get_evolutionary_data(period, startdate, enddate, 
-                                               identities_db, filter_item)
-            fn = os.path.join(destdir, filter_item.get_evolutionary_filename(Pullpo()))
-            createJSON(evol, fn)
-
-            # Static
-            agg = Pullpo.get_agg_data(period, startdate, enddate, identities_db, filter_item)
-            fn = os.path.join(destdir, filter_item.get_static_filename(Pullpo()))
-            createJSON(agg, fn)
             if 'submitted' in agg:
                 items_list["submitted"].append(agg["submitted"])
             else: items_list["submitted"].append("NA")
@@ -192,11 +192,14 @@ class QAForums(DataSource):
 
             evol_data = QAForums.get_evolutionary_data(period, startdate, enddate, identities_db, filter_item)
             fn = os.path.join(destdir, filter_item.get_evolutionary_filename(QAForums()))
-            createJSON(completePeriodIds(evol_data, period, startdate, enddate), fn)
+            bundle_fn = os.path.join(destdir, filter_item.get_evolutionary_bundle_filename(QAForums()))
+            createJSON(completePeriodIds(evol_data, period, startdate, enddate), fn,
+                       bundle_filepath = bundle_fn)
 
             agg = QAForums.get_agg_data(period, startdate, enddate, identities_db, filter_item)
             fn = os.path.join(destdir, filter_item.get_static_filename(QAForums()))
-            createJSON(agg, fn)
+            bundle_fn = os.path.join(destdir, filter_item.get_static_bundle_filename(QAForums()))
+            createJSON(agg, fn, bundle_filepath = bundle_fn)
 
     @staticmethod
     def create_filter_report_all(filter_, period, startdate, enddate, destdir, npeople, identities_db):
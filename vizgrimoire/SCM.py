@@ -25,7 +25,7 @@
 
 import os, logging
 
-from vizgrimoire.GrimoireSQL import GetSQLGlobal, GetSQLPeriod
+from vizgrimoire.GrimoireSQL import GetSQLGlobal, GetSQLPeriod, GetSQLPeople
 # TODO integrate: from GrimoireSQL import  GetSQLReportFrom 
 from vizgrimoire.GrimoireSQL import ExecuteQuery, BuildQuery
 from vizgrimoire.GrimoireUtils import GetPercentageDiff, GetDates, completePeriodIds
@@ -270,19 +270,10 @@ class SCM(DataSource):
         else:
             items_list = items
 
-        for item in items :
-            item_name = "'"+ item+ "'"
-            logging.info (item_name)
-            filter_item = Filter(filter_name, item)
-
-            evol_data = SCM.get_evolutionary_data(period, startdate, enddate, identities_db, filter_item)
-            fn = os.path.join(destdir, filter_item.get_evolutionary_filename(SCM()))
-            createJSON(evol_data, fn)
-
-            agg = SCM.get_agg_data(period, startdate, enddate, identities_db, filter_item)
-            fn = os.path.join(destdir, filter_item.get_static_filename(SCM()))
-            createJSON(agg, fn)
+        aggs = SCM.create_filter_items_report(filter_, items, period, startdate, enddate,
+                                              destdir, npeople, identities_db)
 
+        for item, agg in zip(items, aggs):
             if filter_name in ("domain", "company", "repository"):
                 items_list['name'].append(item.replace('/', '_'))
                 items_list['commits_365'].append(agg['commits_365'])
@@ -406,6 +397,16 @@ class SCM(DataSource):
         agg = GetStaticPeopleSCM(uuid,  startdate, enddate)
         return agg
 
+    @staticmethod
+    def get_people_evol(uuids, period, startdate, enddate, identities_db):
+        evol_data = GetEvolPeopleSCM(uuids, period, startdate, enddate)
+        return DataSource.split_people_evol(evol_data, uuids, period, startdate, enddate)
+
+    @staticmethod
+    def get_people_agg(uuids, startdate, enddate, identities_db):
+        agg = GetStaticPeopleSCM(uuids, startdate, enddate)
+        return DataSource.split_people_agg(agg, uuids)
+
     # Studies implemented in R
     @staticmethod
     def create_r_reports(vizr, enddate, destdir):
@@ -550,13 +551,18 @@ def GetPeopleQuerySCM (developer_id, period, startdate, enddate, evol) :
     fields ='COUNT(distinct(s.id)) AS commits'
     tables = GetTablesOwnUniqueIdsSCM()
     filters = GetFiltersOwnUniqueIdsSCM()
+    if not evol:
+        fields += ",DATE_FORMAT (min(s.author_date),'%Y-%m-%d') as first_date, "+\
+                  "DATE_FORMAT (max(s.author_date),'%Y-%m-%d') as last_date"
+    if isinstance(developer_id, list):
+        # All people in one query grouped by uuid
+        return GetSQLPeople(developer_id, period, 's.author_date', fields, tables,
+                            filters, startdate, enddate, evol)
     filters +=" AND pup.uuid='"+str(developer_id)+"'"
     if (evol) :
         q = GetSQLPeriod(period,'s.author_date', fields, tables, filters,
                 startdate, enddate)
     else :
-        fields += ",DATE_FORMAT (min(s.author_date),'%Y-%m-%d') as first_date, "+\
-                  "DATE_FORMAT (max(s.author_date),'%Y-%m-%d') as last_date"
         q = GetSQLGlobal('s.author_date', fields, tables, filters, 
                 startdate, enddate)
 
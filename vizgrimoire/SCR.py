@@ -30,7 +30,7 @@ from numpy import median, average
 import time
 from datetime import datetime, timedelta
 
-from vizgrimoire.GrimoireSQL import GetSQLGlobal, GetSQLPeriod
+from vizgrimoire.GrimoireSQL import GetSQLGlobal, GetSQLPeriod, GetSQLPeople
 from vizgrimoire.GrimoireSQL import ExecuteQuery
 from vizgrimoire.GrimoireUtils import GetPercentageDiff, GetDates, completePeriodIds
 from vizgrimoire.GrimoireUtils import checkListArray, removeDecimals
@@ -110,6 +110,7 @@ class SCR(DataSource):
             for r in metrics_reports:
                 if r in reports_on: metrics_on += [r]
 
+        items = None
         if type_analysis and type_analysis[1] is None:
             items = DS.get_filter_items(filter_, startdate, enddate, identities_db)
             items = items.pop('name')
@@ -183,22 +184,15 @@ class SCR(DataSource):
             if automator_metrics in automator['r']:
                 metrics_trends = automator['r'][automator_metrics].split(",")
 
-            for i in [7,30,365]:
-                for item in all_metrics:
-                    if item.id not in metrics_trends: continue
-                    mfilter_orig = item.filters
-                    item.filters = mfilter
-                    period_data = item.get_trends(enddate, i)
-                    item.filters = mfilter_orig
-
-                    data = dict(data.items() +  period_data.items())
+            for item in all_metrics:
+                if item.id not in metrics_trends: continue
+                mfilter_orig = item.filters
+                item.filters = mfilter
+                # Ordered like items in GROUP BY queries
+                period_data = item.get_trends_windows(enddate, [7,30,365], items)
+                item.filters = mfilter_orig
 
-                    if type_analysis and type_analysis[1] is None:
-                        id_field = SCRQuery.get_group_field(type_analysis[0])
-                        id_field = id_field.split('.')[1] # remove table name
-                        period_data = fill_and_order_items(items, period_data, id_field)
-
-                    data = dict(data.items() +  period_data.items())
+                data = dict(data.items() +  period_data.items())
 
 
         if filter_ is not None: studies_data = {}
@@ -310,23 +304,13 @@ class SCR(DataSource):
         # Include metrics to sort in javascript.
         items_list = {"name":[],"review_time_days_median":[],"submitted":[]}
 
-        for item in items :
+        aggs = SCR.create_filter_items_report(filter_, items, period, startdate, enddate,
+                                              destdir, npeople, identities_db)
+
+        for item, agg in zip(items, aggs):
             item_file = item.replace("/","_")
             items_list["name"].append(item_file)
 
-            logging.info (item)
-            filter_item = Filter(filter_name, item)
-
-            evol = SCR.get_evolutionary_data(period, startdate, enddate, 
-                                               identities_db, filter_item)
-            fn = os.path.join(destdir, filter_item.get_evolutionary_filename(SCR()))
-            createJSON(evol, fn)
-
-            # Static
-            agg = SCR.get_agg_data(period, startdate, enddate, identities_db, filter_item)
-            fn = os.path.join(destdir, filter_item.get_static_filename(SCR()))
-            createJSON(agg, fn)
-
             if 'submitted' in agg:
                 items_list["submitted"].append(agg["submitted"])
             else: items_list["submitted"].append("NA")
@@ -415,6 +399,16 @@ class SCR(DataSource):
     def get_person_agg(uuid, startdate, enddate, identities_db, type_analysis):
         return GetPeopleStaticSCR(uuid, startdate, enddate)
 
+    @staticmethod
+    def get_people_evol(uuids, period, startdate, enddate, identities_db):
+        evol = GetPeopleEvolSCR(uuids, period, startdate, enddate)
+        return DataSource.split_people_evol(evol, uuids, period, startdate, enddate)
+
+    @staticmethod
+    def get_people_agg(uuids, startdate, enddate, identities_db):
+        agg = GetPeopleStaticSCR(uuids, startdate, enddate)
+        return DataSource.split_people_agg(agg, uuids)
+
     @staticmethod
     def create_r_reports(vizr, enddate, destdir):
         pass
@@ -497,15 +491,21 @@ def GetPeopleQuerySCRChanges (developer_id, period, startdate, enddate, evol):
 def GetPeopleQuerySCR (developer_id, period, startdate, enddate, evol):
     fields = "COUNT(c.id) AS closed"
     tables = GetTablesOwnUniqueIdsSCR()
-    filters = GetFiltersOwnUniqueIdsSCR()+ " AND pup.uuid = '"+ str(developer_id) + "'"
+    filters = GetFiltersOwnUniqueIdsSCR()
+    if not evol:
+        fields = fields + \
+                ",DATE_FORMAT (min(changed_on),'%Y-%m-%d') as first_date, "+\
+                "  DATE_FORMAT (max(changed_on),'%Y-%m-%d') as last_date"
+    if isinstance(developer_id, list):
+        # All people in one query grouped by uuid
+        return GetSQLPeople(developer_id, period, 'changed_on', fields, tables,
+                            filters, startdate, enddate, evol)
+    filters += " AND pup.uuid = '"+ str(developer_id) + "'"
 
     if (evol):
         q = GetSQLPeriod(period,'changed_on', fields, tables, filters,
                 startdate, enddate)
     else:
-        fields = fields + \
-                ",DATE_FORMAT (min(changed_on),'%Y-%m-%d') as first_date, "+\
-                "  DATE_FORMAT (max(changed_on),'%Y-%m-%d') as last_date"
         q = GetSQLGlobal('changed_on', fields, tables, filters,
                 startdate, enddate)
     return (q)
@@ -30,7 +30,9 @@
 
 from vizgrimoire.analysis.analyses import Analyses
 
-from vizgrimoire.GrimoireUtils import completePeriodIds
+from vizgrimoire.GrimoireUtils import completePeriodIds, createJSON
+from vizgrimoire.filter import Filter
+from vizgrimoire.metrics.metrics_filter import MetricFilters
 
 
 class TicketsStates(Analyses):
@@ -40,23 +42,49 @@ class TicketsStates(Analyses):
     name = "Tickets states"
     desc = "Analysis of issues states"
 
-    def __get_sql_issues_states__(self, backend_type):
-        """Returns the log of states"""
+    # Backlogs for all their items are a by-product of the global one
+    backlog_analyses = ["repository"]
+
+    def __get_sql_issues_states__(self, backend_type, analyses = []):
+        """Returns the log of states of the issues in the filters with
+        the item of each issue for each analysis (i.e. its tracker)"""
 
         if backend_type == "lp": backend_type = "launchpad" # openstack
 
-        q = """SELECT issue_id, status, UNIX_TIMESTAMP(date) udate
-               FROM issues_log_%s
-               WHERE date >= %s AND date < %s
-               ORDER BY udate""" % (backend_type, self.filters.startdate, self.filters.enddate)
+        mfilters = self.filters.copy()
+        if len(analyses) > 0:
+            mfilters.type_analysis = [MetricFilters.DELIMITER.join(analyses), None]
+        tables = self.db.GetSQLReportFrom(mfilters)
+        filters = self.db.GetSQLReportWhere(mfilters, "issues")
+
+        fields = "l.issue_id, l.status, UNIX_TIMESTAMP(l.date) udate"
+        for analysis in analyses:
+            fields += ", " + self.db.get_group_field(analysis)
+        if len(tables) > 0 or len(filters) > 0:
+            tables.add("issues i")
+            filters.add("i.id = l.issue_id")
+        tables.add("issues_log_%s l" % backend_type)
+        filters.add("l.date >= %s" % self.filters.startdate)
+        filters.add("l.date < %s" % self.filters.enddate)
+
+        q = "SELECT " + fields + \
+            " FROM " + self.db._get_tables_query(tables) + \
+            " WHERE " + self.db._get_filters_query(filters) + \
+            " ORDER BY udate"
         return q
 
-    def __get_sql_current__(self, state, evolutionary):
-        """This function returns the evolution or agg number of issues state"""
+    def __get_sql_current__(self, states, evolutionary):
+        """This function returns the evolution or agg number of issues
+        in each state"""
 
-        fields = " count(distinct(id)) as `current_" + state + "` "
+        fields = []
+        for state in states:
+            fields.append(" count(distinct(CASE WHEN status = '" + state.replace("'", "''") +
+                          "' THEN id END)) as `current_" + state + "` ")
+        fields = ",".join(fields)
         tables = " issues i "
-        filters = " status = '" + state.replace("'", "''") + "' "
+        filters = " status IN (" + \
+            ",".join(["'" + state.replace("'", "''") + "'" for state in states]) + ") "
 
         q = self.db.BuildQuery(self.filters.period, self.filters.startdate,
                                self.filters.enddate, " i.submitted_on ",
@@ -73,93 +101,102 @@ class TicketsStates(Analyses):
         return q
 
     def get_backlog(self, states, backend_type):
+        return self.get_backlogs(states, backend_type)[0]
+
+    def get_backlogs(self, states, backend_type, analyses = []):
+        """Backlog of each state for all the issues and a dict with the
+        backlogs of the items of each analysis (i.e. repository, company)
+        in the GROUP BY format. The issues log is replayed once, with
+        states coded as their position in states."""
         import datetime
         import time
 
-        def update_backlog_count(current_count, backlog_count):
-            for state, count in current_count.items():
-                backlog_count[state].append(count)
-
         # Dict to store the results
         data = {self.filters.period : [self.filters.startdate, self.filters.enddate]}
         data = completePeriodIds(data, self.filters.period,
                                  self.filters.startdate, self.filters.enddate)
 
-        tickets_states = {}
-        current_status = {}
-
-        # Initialize structures
-        for state in states:
-            current_status[state] = 0
-            data[state] = []
-
-        # Request issues log
-        query = self.__get_sql_issues_states__(backend_type)
-        issues_log = self.db.ExecuteQuery(query)
-
-        periods = list(data['unixtime'][1:])
-
         # Add a one period more to avoid problems with
         # data from this period
         last_date = int(time.mktime(datetime.datetime.strptime(
                         self.filters.enddate, "'%Y-%m-%d'").timetuple()))
-        periods.append(last_date)
-
-        end_period = int(periods.pop(0))
-
-        for i in range(len(issues_log['issue_id'])):
-            issue_id = issues_log['issue_id'][i]
-            issue_state = issues_log['status'][i]
-            issue_date = int(issues_log['udate'][i])
+        period_ends = [int(unixtime) for unixtime in data['unixtime'][1:]]
+        period_ends.append(last_date)
+
+        # Other states are coded as -1 and not counted
+        codes = dict([(state, code) for (code, state) in enumerate(states)])
+
+        # Tickets in each state now and at the end of each period, for all
+        # the tickets (key None) and for the tickets of each (analysis, item)
+        counters = {}
+        def add_counter(key, nperiods):
+            counters[key] = ([0] * len(states),
+                             [[0] * nperiods for state in states])
+
+        def close_period():
+            for (current, backlog) in counters.values():
+                for code in range(0, len(states)):
+                    backlog[code].append(current[code])
+
+        add_counter(None, 0)
+        tickets_states = {} # (key, issue_id): state code
+        period = 0
+
+        # Issues log read from the server while counting
+        query = self.__get_sql_issues_states__(backend_type, analyses)
+        for row in self.db.ExecuteQueryIter(query):
+            issue_id = row[0]
+            code = codes.get(row[1], -1)
+            issue_date = int(row[2])
 
             # Fill periods without changes on issues states
-            while issue_date >= end_period:
-                end_period = int(periods.pop(0))
-                update_backlog_count(current_status, data)
-
-            if issue_id not in tickets_states:
-                # Add ticket to the status dict
-                tickets_states[issue_id] = issue_state
-            elif tickets_states[issue_id] != issue_state:
-                # Decrease the count of tickets with the old state
-                # only for predefined states
-                old_state = tickets_states[issue_id]
-                if old_state in states:
-                    current_status[old_state] -= 1
-
-                # Set new status
-                tickets_states[issue_id] = issue_state
-            else:
-                continue # Ignore equal states
-
-            # Increase the count of tickets with issue_state
-            # only for predefined states
-            if issue_state in states:
-                current_status[issue_state] += 1
-
-        # End of the loop. Add the last period values to the backlog count
-        update_backlog_count(current_status, data)
-
-        # Fill remaining periods without changes on issues states
-        while periods:
-            periods.pop(0)
-            for state in states:
-                data[state].append(data[state][-1])
-
-        return data
+            while period < len(period_ends) - 1 and issue_date >= period_ends[period]:
+                close_period()
+                period += 1
+
+            # Issues with several items, i.e. organizations, are repeated
+            keys = [None]
+            for (i, analysis) in enumerate(analyses):
+                if row[3+i] is not None: keys.append((analysis, row[3+i]))
+            for key in keys:
+                if key not in counters: add_counter(key, period)
+                old_code = tickets_states.get((key, issue_id))
+                if old_code == code: continue # Ignore equal states
+                tickets_states[(key, issue_id)] = code
+                current = counters[key][0]
+                if old_code is not None and old_code >= 0:
+                    current[old_code] -= 1
+                if code >= 0:
+                    current[code] += 1
+
+        # Add the last period values and fill the remaining periods
+        # without changes on issues states
+        while period < len(period_ends):
+            close_period()
+            period += 1
 
+        for state in states:
+            data[state] = counters[None][1][codes[state]]
+
+        analyses_data = {}
+        for analysis in analyses:
+            id_field = self.db.get_group_field(analysis).split('.')[1]
+            keys = [key for key in counters if key is not None and key[0] == analysis]
+            items_data = {id_field : [key[1] for key in keys]}
+            for field in data:
+                if field not in codes: items_data[field] = data[field]
+            for state in states:
+                items_data[state] = [counters[key][1][codes[state]] for key in keys]
+            analyses_data[analysis] = items_data
+        return (data, analyses_data)
 
     def get_current_states(self, states):
-        current_states = {}
-
-        for state in states:
-            query = self.__get_sql_current__(state, True)
-            data = self.db.ExecuteQuery(query)
-            data = completePeriodIds(data, self.filters.period,
-                                     self.filters.startdate, self.filters.enddate)
-            current_states = dict(current_states.items() + data.items())
+        if len(states) == 0: return {}
 
-        return current_states
+        query = self.__get_sql_current__(states, True)
+        data = self.db.ExecuteQuery(query)
+        return completePeriodIds(data, self.filters.period,
+                                 self.filters.startdate, self.filters.enddate)
 
     def get_state_types(self, backend_type):
         query = self.__get_sql_state_types__(backend_type)
@@ -172,21 +209,50 @@ class TicketsStates(Analyses):
         if data_source is not None and data_source != ITS: return {}
         return self.result()
 
-    def result(self, data_source = None):
+    def __get_backend_type__(self):
         # FIXME: this import is needed to get the list of
         # states available on the tracker. This should be moved
         # to configuration file to let the user choose among states.
         from vizgrimoire.ITS import ITS
-        if data_source is not None and data_source != ITS: return None
         backend = ITS._get_backend()
 
         if backend.its_type == 'bg':
             backend_type = 'bugzilla'
         else:
             backend_type = backend.its_type
+        return backend_type
+
+    def result(self, data_source = None):
+        from vizgrimoire.ITS import ITS
+        if data_source is not None and data_source != ITS: return None
 
+        backend_type = self.__get_backend_type__()
         states = self.get_state_types(backend_type)
 
         backlog = self.get_backlog(states, backend_type)
         current_states = self.get_current_states(states)
         return dict(backlog.items() + current_states.items())
+
+    def create_report(self, data_source, destdir):
+        """ Backlogs of all the items of backlog_analyses """
+        from vizgrimoire.ITS import ITS
+        if data_source != ITS: return None
+
+        backend_type = self.__get_backend_type__()
+        states = self.get_state_types(backend_type)
+
+        backlog, analyses_data = self.get_backlogs(states, backend_type,
+                                                   self.backlog_analyses)
+        for analysis in self.backlog_analyses:
+            createJSON(analyses_data[analysis],
+                       destdir + "/" + self.__get_report_file__(ITS, analysis))
+
+    def __get_report_file__(self, data_source, analysis):
+        return data_source.get_name() + "-" + Filter(analysis).get_name_short() + \
+            "-all-tickets_states.json"
+
+    def get_report_files(self, data_source = None):
+        from vizgrimoire.ITS import ITS
+        if data_source is not ITS: return []
+        return [self.__get_report_file__(ITS, analysis)
+                for analysis in self.backlog_analyses]
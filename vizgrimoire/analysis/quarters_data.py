@@ -30,13 +30,36 @@ from dateutil.relativedelta import relativedelta
 from vizgrimoire.analysis.analyses import Analyses
 from vizgrimoire.metrics.query_builder import DSQuery
 from vizgrimoire.metrics.metrics_filter import MetricFilters
-from vizgrimoire.GrimoireUtils import createJSON
+from vizgrimoire.GrimoireUtils import createJSON, check_array_values
 from vizgrimoire.SCR import SCR
 
 class QuartersData(Analyses):
     id = "quarters_data"
     name = "Quarters Data"
     desc = "Metrics by Quarter"
+    # Get all the quarters with one query instead of a query per quarter
+    grouped_queries = True
+
+    @staticmethod
+    def _split_quarters(data, limit):
+        """ Rows of the first limit items of each (year, quarter) in data,
+            with the format of ExecuteQuery. None has the empty result. """
+        columns = data.keys()
+        quarters = {None: dict([(column, []) for column in columns])}
+        if len(columns) == 0: return quarters
+        data = check_array_values(data)
+        for i in range(0, len(data['total'])):
+            key = (int(data['year'][i]), int(data['quarter'][i]))
+            rows = quarters.setdefault(key, dict([(column, []) for column in columns]))
+            if len(rows['total']) >= limit: continue
+            for column in columns:
+                rows[column].append(data[column][i])
+        for key in quarters:
+            if key is not None and len(quarters[key]['total']) == 1:
+                # A single row is returned as values
+                quarters[key] = dict([(column, values[0])
+                                      for (column, values) in quarters[key].items()])
+        return quarters
 
     def create_report(self, data_source, destdir):
         if data_source != SCR: return None
@@ -62,20 +85,36 @@ class QuartersData(Analyses):
         end = datetime.strptime(enddate.replace("'",""), "%Y-%m-%d")
         end_quarter = (end.month-1)%3 + 1
 
+        quarters = (end.year - start.year) * 4 + (end_quarter - start_quarter)
+
+        # Quarters analyzed: (year, quarter)
+        analyzed = []
+        for i in range(0, quarters+1):
+            analyzed.append((start.year, (i%4)+1))
+            start = start + relativedelta(months=3)
+
         organizations_quarters = {}
         people_quarters = {}
 
-        quarters = (end.year - start.year) * 4 + (end_quarter - start_quarter)
+        if QuartersData.grouped_queries and len(analyzed) > 0:
+            # All the quarters with one query per entity
+            first_year = min([year for (year, quarter) in analyzed])
+            last_year = max([year for (year, quarter) in analyzed])
+            organizations = QuartersData._split_quarters(
+                self.db.GetCompaniesQuartersAll(first_year, last_year), 25)
+            people = QuartersData._split_quarters(
+                self.db.GetPeopleQuartersAll(first_year, last_year, bots), 25)
 
-        for i in range(0, quarters+1):
-            year = start.year
-            quarter = (i%4)+1
+        for (year, quarter) in analyzed:
             # logging.info("Analyzing organizations and people quarter " + str(year) + " " +  str(quarter))
-            data = self.db.GetCompaniesQuarters(year, quarter)
+            if QuartersData.grouped_queries:
+                data = organizations.get((year, quarter), organizations[None])
+                data_people = people.get((year, quarter), people[None])
+            else:
+                data = self.db.GetCompaniesQuarters(year, quarter)
+                data_people = self.db.GetPeopleQuarters(year, quarter, 25, bots)
             organizations_quarters[str(year)+" "+str(quarter)] = data
-            data_people = self.db.GetPeopleQuarters(year, quarter, 25, bots)
             people_quarters[str(year)+" "+str(quarter)] = data_people
-            start = start + relativedelta(months=3)
         createJSON(organizations_quarters, destdir+"/scr-organizations-quarters.json")
         createJSON(people_quarters, destdir+"/scr-people-quarters.json")
 
@@ -20,9 +20,62 @@
 ## Authors:
 ##   Daniel Izquierdo <dizquierdo@bitergia.com>
 
+import numpy
+
 from vizgrimoire.data_source import DataSource
 from vizgrimoire.metrics.metrics_filter import MetricFilters
-from vizgrimoire.GrimoireUtils import completePeriodIds
+from vizgrimoire.GrimoireUtils import completePeriodIds, check_array_values
+
+def get_top_series(items, periods, values, period_ids, num_items):
+    """ Time series of the num_items items with the highest total and of
+        the rest of them aggregated in Others, from the rows (item, period,
+        value) of a GROUP BY query. Items with the same total are ordered
+        by name. """
+    codes = {}
+    rows_items = [codes.setdefault(item, len(codes)) for item in items]
+    positions = dict([(period_ids[i], i) for i in range(0, len(period_ids))])
+    rows_periods = numpy.array([positions.get(period, -1) for period in periods], dtype=numpy.int64)
+    rows_values = numpy.array([value or 0 for value in values])
+    valid = rows_periods >= 0
+
+    series = numpy.zeros((len(codes), len(period_ids)), dtype=rows_values.dtype)
+    numpy.add.at(series, (numpy.array(rows_items, dtype=numpy.int64)[valid],
+                          rows_periods[valid]), rows_values[valid])
+
+    names = sorted(codes.keys(), key=lambda name: codes[name])
+    totals = series.sum(axis=1)
+    order = sorted(range(0, len(names)), key=lambda i: (-totals[i], names[i]))
+    top = {}
+    for i in order[0:num_items]:
+        top[names[i]] = series[i].tolist()
+    if len(order) > num_items:
+        top['Others'] = series[order[num_items:]].sum(axis=0).tolist()
+    return top
+
+def _get_summary_companies(metric, period, startdate, enddate, num_organizations, excluded):
+    """ Time series of metric for the top organizations and Others, with
+        the time series of all the organizations got in one query.
+        Organizations in excluded (bots, Unknown ...) are not included. """
+    mfilter_orig = metric.filters
+    metric.filters = MetricFilters(period, startdate, enddate, ["company", None])
+    try:
+        data = metric.db.ExecuteQuery(metric._get_sql(True))
+    finally:
+        metric.filters = mfilter_orig
+    id_field = metric.db.get_group_field("company").split('.')[1]
+    if id_field not in data: return {}
+    data = check_array_values(data)
+    if excluded:
+        rows = [i for i in range(0, len(data[id_field])) if data[id_field][i] not in excluded]
+        for field in [id_field, period, metric.id]:
+            data[field] = [data[field][i] for i in rows]
+    if len(data[id_field]) == 0: return {}
+
+    summary = completePeriodIds({period: [], metric.id: []}, period, startdate, enddate)
+    del summary[metric.id]
+    top = get_top_series(data[id_field], data[period], data[metric.id],
+                         summary[period], num_organizations)
+    return dict(summary.items() + top.items())
 
 def GetCommitsSummaryCompanies (period, startdate, enddate, identities_db, num_organizations):
     # This function returns the following dataframe structrure
@@ -30,80 +83,22 @@ def GetCommitsSummaryCompanies (period, startdate, enddate, identities_db, num_o
     # The 3 first fields are used for data and ordering purposes
     # The "companyX" fields are those that provide info about that company
     # The "Others" field is the aggregated value of the rest of the organizations
-    # Companies above num_organizations will be aggregated in Others
+    # Companies above num_organizations (by commits in the period) will be aggregated in Others
+    # Companies out (Report default filter) are not included
 
     from vizgrimoire.SCM import SCM
 
-    metric = DataSource.get_metrics("organizations", SCM)
-    organizations = metric.get_list()
-    organizations = organizations['name']
-
-    first_organizations = {}
-    count = 1
-    for company in organizations:
-        company_name = "'"+company+"'"
-        type_analysis = ['company', company_name]
-        mcommits = DataSource.get_metrics("commits", SCM)
-        mfilter = MetricFilters(period, startdate, enddate, type_analysis)
-        mfilter_orig = mcommits.filters
-        mcommits.filters = mfilter
-        commits = mcommits.get_ts()
-        mcommits.filters = mfilter_orig
-        # commits = EvolCommits(period, startdate, enddate, identities_db, ["company", company_name])
-        # commits = completePeriodIds(commits, period, startdate, enddate)
-        # Rename field commits to company name
-        commits[company] = commits["commits"]
-        del commits['commits']
-
-        if (count <= num_organizations):
-            #Case of organizations with entity in the dataset
-            first_organizations = dict(first_organizations.items() + commits.items())
-        else :
-            #Case of organizations that are aggregated in the field Others
-            if 'Others' not in first_organizations:
-                first_organizations['Others'] = commits[company]
-            else:
-                first_organizations['Others'] = [a+b for a, b in zip(first_organizations['Others'],commits[company])]
-        count = count + 1
-
-    #TODO: remove global variables...
-    first_organizations = completePeriodIds(first_organizations, period, startdate, enddate)
-    return(first_organizations)
+    mcommits = DataSource.get_metrics("commits", SCM)
+    return _get_summary_companies(mcommits, period, startdate, enddate, num_organizations,
+                                  mcommits.filters.companies_out)
 
 
 def GetClosedSummaryCompanies (period, startdate, enddate, identities_db, closed_condition, num_organizations):
 
     from vizgrimoire.ITS import ITS
+    from vizgrimoire.filter import Filter
 
-    count = 1
-    first_organizations = {}
-
-    metric = DataSource.get_metrics("organizations", ITS)
-    organizations = metric.get_list()
-    organizations = organizations['name']
-
-    for company in organizations:
-        type_analysis = ["company", "'"+company+"'"]
-        filter_com = MetricFilters(period, startdate, enddate, type_analysis)
-        mclosed = ITS.get_metrics("closed", ITS)
-        mclosed.filters = filter_com
-        closed = mclosed.get_ts()
-        # Rename field closed to company name
-        closed[company] = closed["closed"]
-        del closed['closed']
-
-        if (count <= num_organizations):
-            #Case of organizations with entity in the dataset
-            first_organizations = dict(first_organizations.items() + closed.items())
-        else :
-            #Case of organizations that are aggregated in the field Others
-            if 'Others' not in first_organizations:
-                first_organizations['Others'] = closed[company]
-            else:
-                first_organizations['Others'] = [a+b for a, b in zip(first_organizations['Others'],closed[company])]
-        count = count + 1
-    first_organizations = completePeriodIds(first_organizations, period, startdate, enddate)
-
-    return(first_organizations)
-
-
+    mclosed = DataSource.get_metrics("closed", ITS)
+    # Companies bots, like in the ITS companies list
+    bots = DataSource.get_filter_bots(Filter("company"))
+    return _get_summary_companies(mclosed, period, startdate, enddate, num_organizations, bots)
@@ -24,28 +24,37 @@
 
 import vizgrimoire.GrimoireUtils
 import vizgrimoire.GrimoireSQL
-from vizgrimoire.GrimoireSQL import ExecuteQuery
+from vizgrimoire.GrimoireSQL import ExecuteQuery, ExecuteQueryIter
+
+def _as_list(value):
+    # ExecuteQuery returns single values when only one row is found
+    if not isinstance(value, list): return [value]
+    return value
+
+def _quote(message_id):
+    return "'" + message_id.replace("\\", "\\\\").replace("'", "\\'") + "'"
 
 class Email(object):
     """This class contains the main attributes of an email
     """
 
-    def __init__(self, message_id, i_db):
+    def __init__(self, message_id, i_db, details = None):
         self.message_id = message_id
         self.i_db = i_db # Identities database
         self.subject = None # Email subject
         self.body = None # Email body
         self.date = None # Email sending date
         self.url = None # Domain of the archive
-        self._buildEmail() # Constructor
-               
-    def _buildEmail(self):
-        # This method retrieves items of information of a given
-        # email, specified by its email id.
+        if details is None:
+            self._buildEmail() # Constructor
+        else:
+            self._setDetails(details)
 
+    @staticmethod
+    def _getQuery(message_ids, i_db):
         query = """
-                select distinct m.message_ID, 
-                       m.subject, 
+                select distinct m.message_ID,
+                       m.subject,
                        m.message_body,
                        m.first_date,
                        u.identifier as initiator_name,
@@ -55,25 +64,55 @@ class Email(object):
                      messages_people mp,
                      people_uidentities pup,
                      %s.uidentities u
-                where m.message_ID = '%s' and
+                where m.message_ID in (%s) and
                       m.message_ID = mp.message_id and
                       mp.type_of_recipient = 'From' and
                       mp.email_address = pup.people_id and
                       pup.uuid = u.uuid
-                limit 1
-                """  % (self.i_db, self.message_id)
+                """  % (i_db, ",".join([_quote(message_id) for message_id in message_ids]))
+        return query
+
+    def _setDetails(self, details):
+        self.subject = details["subject"]
+        self.body = details["message_body"]
+        self.date = details["first_date"]
+        self.initiator_name = details["initiator_name"]
+        self.initiator_id = details["initiator_id"]
+        self.url = details["url"]
+
+    def _buildEmail(self):
+        # This method retrieves items of information of a given
+        # email, specified by its email id.
+
+        query = Email._getQuery([self.message_id], self.i_db) + " limit 1"
         # WARNING: There may appear in some cases repeated emails.
         # This may be because the same email was sent to different
         # mailing lists. Forcing the query to 1 row, allows to 
         # avoid this issue till we understand why this behaviour
         results = ExecuteQuery(query)
-
-        self.subject = results["subject"]
-        self.body = results["message_body"]
-        self.date = results["first_date"]
-        self.initiator_name = results["initiator_name"]
-        self.initiator_id = results["initiator_id"]
-        self.url = results["url"]
+        self._setDetails(results)
+
+    @staticmethod
+    def buildEmails(message_ids, i_db):
+        # Returns a list of emails retrieving all of them in one query
+
+        if len(message_ids) == 0: return []
+        results = ExecuteQuery(Email._getQuery(message_ids, i_db))
+        details = {}
+        if len(results) > 0:
+            for i in range(0, len(_as_list(results["message_ID"]))):
+                message_id = _as_list(results["message_ID"])[i]
+                # Only the first row of repeated emails, as in _buildEmail
+                if message_id in details: continue
+                details[message_id] = dict([(field, _as_list(results[field])[i])
+                                            for field in results])
+        emails = []
+        for message_id in message_ids:
+            if message_id in details:
+                emails.append(Email(message_id, i_db, details[message_id]))
+            else:
+                emails.append(Email(message_id, i_db))
+        return emails
 
 
 class Threads(object):
@@ -86,8 +125,7 @@ class Threads(object):
         self.initdate = initdate # initial date of analysis
         self.enddate = enddate  # final date of analysis
         self.i_db = i_db # identities database
-        self.list_message_id = [] # list of messages id
-        self.list_is_response_of = [] #list of 'father' messages
+        self.children = {} # keys = message_id, values = list of replies
         self.threads = {} # General structure, keys = root message_id,
                           # values = list of messages in that thread
         self.crowded = None # the thread with most people participating
@@ -97,28 +135,21 @@ class Threads(object):
         self._init_threads()    
 
     def _build_threads (self, message_id):
-        # Constructor of threads.
+        # Constructor of threads. Returns the messages of the thread
+        # in depth first order.
 
-        sons = []
         messages = []
-        if message_id not in self.list_is_response_of:
-            # this a leaf of the tree!
-            return []
-
-        else:
-            cont = 0
-            for msg in self.list_is_response_of:
-                #Retrieving all of the sons of a given msg
-                if msg == message_id:
-                    sons.append(self.list_message_id[cont])
-                cont = cont + 1
-            for msg in sons:
-                messages.extend([msg])
-                messages.extend(self._build_threads(msg))            
-               
-
-        return messages          
-            
+        visited = set([message_id])
+        pending = list(reversed(self.children.get(message_id, [])))
+        while pending:
+            msg = pending.pop()
+            # Replies loops in broken archives are ignored
+            if msg in visited: continue
+            visited.add(msg)
+            messages.append(msg)
+            pending.extend(reversed(self.children.get(msg, [])))
+
+        return messages
 
     def _init_threads(self):
         # Returns dictionary of message_id threads. Each key contains a list
@@ -130,24 +161,34 @@ class Threads(object):
                 from messages 
                 where first_date >= %s and first_date < %s
                 """ % (self.initdate, self.enddate)
-        list_messages = ExecuteQuery(query)
-        self.list_message_id = list_messages["message_ID"]
-        self.list_is_response_of = list_messages["is_response_of"]
-        
+
+        # Index of the replies to each message. Messages are read from
+        # the server while indexing them, not kept in memory twice.
+        self.children = {}
+        parents = {}
+        for (message_id, parent) in ExecuteQueryIter(query):
+            if parent is not None:
+                self.children.setdefault(parent, []).append(message_id)
+            if message_id not in parents:
+                parents[message_id] = parent
+
         messages = {}
-        for message_id in self.list_message_id:
-            # Looking for messages in the thread
-            index = self.list_message_id.index(message_id)
-            
+        for message_id in parents:
             # Only analyzing those whose is_response_of is None, 
             # those are the message 'root' of each thread.
-            if self.list_is_response_of[index] is None:
+            if parents[message_id] is None:
                 messages[message_id] = self._build_threads(message_id)
                 # Adding the root message to the list in first place
                 messages[message_id].insert(0, message_id)
 
         self.threads = messages
 
+    def _get_messages_field(self, query):
+        # Returns a dict with the value of a field for each message
+        result = ExecuteQuery(query % (self.initdate, self.enddate))
+        if len(result) == 0: return {}
+        return dict(zip(_as_list(result["message_ID"]), _as_list(result["value"])))
+
     def crowdedThread (self):
         # Returns the most crowded thread.
         # This is defined as the thread with the highest number of different
@@ -161,41 +202,39 @@ class Threads(object):
 
         top_threads = [] # [(message_id, number of different upeople_id), (...,...), ...]
 
+        # Senders of all the messages in the analysis dates
+        senders = {}
+        query = """
+                select distinct m.message_ID, pup.uuid as value
+                from messages m,
+                     messages_people mp,
+                     people_uidentities pup
+                where m.first_date >= %s and m.first_date < %s and
+                      m.message_ID = mp.message_id and
+                      mp.type_of_recipient = 'From' and
+                      mp.email_address = pup.people_id
+                """
+        result = ExecuteQuery(query % (self.initdate, self.enddate))
+        if len(result) > 0:
+            for (message_id, upeople_id) in zip(_as_list(result["message_ID"]),
+                                                _as_list(result["value"])):
+                senders.setdefault(message_id, set([])).add(upeople_id)
+
         for thread in self.threads.values():
             # this loop counts number of different people
-            # in each of the threads and provides a 
-            # dictionary with root message_id as each of the keys
-            # and a list of upeople_id as the value.
-            # Sets were considered as an option, but it implies that
-            # we may find with a higher probability equal sets, what
-            # would provide incorrect sets to their correspondant message_id
-            # when ordering them (at least using this algorithm).
-            # So, not using sets, and manual order of the lists is done 
+            # in each of the threads
             people = set([])
             for message in thread:
-                query = """
-                        select distinct pup.uuid as upeople_id
-                        from messages m,
-                             messages_people mp,
-                             people_uidentities pup
-                        where m.message_ID = '%s' and
-                              m.message_ID = mp.message_id and 
-                              mp.type_of_recipient = 'From' and
-                              mp.email_address = pup.people_id
-                        """ % (message)
-                result = ExecuteQuery(query)
-                upeople_id = int(result["upeople_id"])
-                people.add(upeople_id)
-            top_threads.append((message, len(people)))
+                people.update(senders.get(message, []))
+            top_threads.append((thread[0], len(people)))
 
         sorted_threads = sorted(top_threads, key=lambda thread: thread[1], reverse = True)
         
         top_threads_emails = []
-        for top in sorted_threads[:numTop]:
-            # Create a list of emails
-            message_id = top[0]
-            email = Email(message_id, self.i_db)
-            top_threads_emails.append((email, top[1]))
+        top = sorted_threads[:numTop]
+        emails = Email.buildEmails([thread[0] for thread in top], self.i_db)
+        for i in range(0, len(top)):
+            top_threads_emails.append((emails[i], top[i][1]))
         return top_threads_emails
 
 
@@ -235,10 +274,8 @@ class Threads(object):
             # (the rest of them are not ordered)
             top_root_msgs.append(thread[0])
 
-        for message_id in top_root_msgs:
-            # Create a list of emails
-            email = Email(message_id, self.i_db)
-            top_threads_emails.append(email)
+        # Create a list of emails
+        top_threads_emails = Email.buildEmails(top_root_msgs, self.i_db)
 
         return top_threads_emails
         
@@ -251,23 +288,24 @@ class Threads(object):
             # variable was not initialize
             self.verbose = "" 
             current_len = 0
+            query = """
+                    select message_ID, length(message_body) as value
+                    from messages
+                    where first_date >= %s and first_date < %s
+                    """
+            lengths = self._get_messages_field(query)
             # iterating through the root messages
             for message_id in self.threads.keys():
                 total_len_bodies = 0 # len of all of the body messages
                 # iterating through each of the messages of the thread
                 for msg in self.threads[message_id]:
-                    query = """
-                            select length(message_body) as length
-                            from messages
-                            where message_ID = '%s'
-                            """ % (msg)
-                    result = ExecuteQuery(query)
-                    length = int(result["length"])
-                    total_len_bodies = total_len_bodies + length
-                    if total_len_bodies > current_len:
-                        # New bigger thread found
-                        self.verbose = message_id
-                        current_len = total_len_bodies
+                    length = lengths.get(msg)
+                    if length is not None:
+                        total_len_bodies = total_len_bodies + int(length)
+                if total_len_bodies > current_len:
+                    # New bigger thread found
+                    self.verbose = message_id
+                    current_len = total_len_bodies
         return Email(self.verbose, self.i_db) 
 
 
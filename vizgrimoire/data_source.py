@@ -26,14 +26,53 @@
 
 import logging, os
 from vizgrimoire.metrics.query_builder import DSQuery, ITSQuery, MLSQuery
-from vizgrimoire.GrimoireUtils import createJSON
+from vizgrimoire.GrimoireUtils import check_array_values, completePeriodIds, createJSON
 from vizgrimoire.metrics.metrics_filter import MetricFilters
+from vizgrimoire.metrics.query_fusion import capture_query, get_fused_values
+from vizgrimoire.metrics import query_profile
+from vizgrimoire import json_writer
 from vizgrimoire.filter import Filter
 
+# Function run for each item in map_filter_items. It is set before the
+# worker processes are forked so it does not need to be pickled.
+_filter_item_task = None
+
+def _run_filter_item_task(item):
+    result = _filter_item_task(item)
+    query_profile.flush()
+    json_writer.flush()
+    return result
+
+def map_filter_items(function, items, jobs = 1):
+    """ Apply function to all filter items, using jobs worker processes.
+
+        Each worker opens its own database connections. Results are
+        returned in the same order than items.
+    """
+    global _filter_item_task
+    import multiprocessing
+
+    # Daemon processes (i.e. report_tool.py workers) can not have children
+    if jobs <= 1 or len(items) <= 1 or multiprocessing.current_process().daemon:
+        return [function(item) for item in items]
+
+    from vizgrimoire.report import Report
+    _filter_item_task = function
+    pool = multiprocessing.Pool(processes = jobs, initializer = Report.reconnect)
+    try:
+        results = list(pool.imap(_run_filter_item_task, items))
+    finally:
+        pool.close()
+        pool.join()
+        _filter_item_task = None
+    return results
+
 class DataSource(object):
     _bots = []
     _metrics_set = []
     _global_filter = None
+    _metrics_skip = []
+    _metrics_agg = {}
 
     @staticmethod
     def get_name():
@@ -71,6 +110,26 @@ class DataSource(object):
 
         ds._global_filter = type_analysis
 
+    @staticmethod
+    def get_metrics_skip(ds):
+        """Get the metrics ids not computed in the global metrics data"""
+        return ds._metrics_skip
+
+    @staticmethod
+    def set_metrics_skip(ds, metrics_ids):
+        """Set the metrics ids not computed in the global metrics data"""
+        ds._metrics_skip = metrics_ids
+
+    @staticmethod
+    def get_metrics_agg(ds):
+        """Get the already known aggregated values of global metrics"""
+        return ds._metrics_agg
+
+    @staticmethod
+    def set_metrics_agg(ds, values):
+        """Set the already known aggregated values of global metrics"""
+        ds._metrics_agg = values
+
     @staticmethod
     def get_db_name():
         """Get the name of the database with the data"""
@@ -208,6 +267,40 @@ class DataSource(object):
         """Create all files related to all filters in all data sources using GROUP BY queries"""
         raise NotImplementedError
 
+    @classmethod
+    def create_filter_item_report(cls, filter_item, period, startdate, enddate,
+                                  destdir, npeople, identities_db):
+        """Create the evolutionary and aggregated files for a filter item.
+           Returns the aggregated data."""
+        evol_data = cls.get_evolutionary_data(period, startdate, enddate,
+                                              identities_db, filter_item)
+        fn = os.path.join(destdir, filter_item.get_evolutionary_filename(cls()))
+        axis_fn = os.path.join(destdir, filter_item.get_evolutionary_axis_filename(cls()))
+        bundle_fn = os.path.join(destdir, filter_item.get_evolutionary_bundle_filename(cls()))
+        createJSON(evol_data, fn, axis_filepath = axis_fn, bundle_filepath = bundle_fn)
+
+        agg = cls.get_agg_data(period, startdate, enddate, identities_db, filter_item)
+        fn = os.path.join(destdir, filter_item.get_static_filename(cls()))
+        bundle_fn = os.path.join(destdir, filter_item.get_static_bundle_filename(cls()))
+        createJSON(agg, fn, bundle_filepath = bundle_fn)
+
+        return agg
+
+    @classmethod
+    def create_filter_items_report(cls, filter_, items, period, startdate, enddate,
+                                   destdir, npeople, identities_db):
+        """Create the files for all filter items, split across the
+           Report filter jobs. Returns the aggregated data for each item."""
+        from vizgrimoire.report import Report
+
+        def item_report(item):
+            logging.info("'" + item + "'")
+            filter_item = Filter(filter_.get_name(), item)
+            return cls.create_filter_item_report(filter_item, period, startdate, enddate,
+                                                 destdir, npeople, identities_db)
+
+        return map_filter_items(item_report, items, Report.get_filter_jobs())
+
     @staticmethod
     def get_top_people_file(ds):
         """Get the filename used to store top people data"""
@@ -240,6 +333,51 @@ class DataSource(object):
         """Get aggregated data for a person activity"""
         raise NotImplementedError
 
+    @staticmethod
+    def get_people_evol(uuids, period, startdate, enddate, identities_db):
+        """Get the evolutionary data for the activity of several people
+           in one query. Dict by uuid or None if not supported."""
+        return None
+
+    @staticmethod
+    def get_people_agg(uuids, startdate, enddate, identities_db):
+        """Get aggregated data for the activity of several people
+           in one query. Dict by uuid or None if not supported."""
+        return None
+
+    @staticmethod
+    def _split_people_data(data, uuids):
+        """ Split the rows of a query grouped by uuid in a dict by uuid """
+        data = check_array_values(data)
+        fields = [field for field in data if field != "uuid"]
+        people = dict([(str(uuid), dict([(field, []) for field in fields]))
+                       for uuid in uuids])
+        if "uuid" not in data: return people
+        for i in range(0, len(data["uuid"])):
+            person = people.get(str(data["uuid"][i]))
+            if person is None: continue
+            for field in fields:
+                person[field].append(data[field][i])
+        return people
+
+    @staticmethod
+    def split_people_evol(data, uuids, period, startdate, enddate):
+        """ Time series by uuid from a query grouped by uuid and period """
+        people = DataSource._split_people_data(data, uuids)
+        for uuid in people:
+            people[uuid] = completePeriodIds(people[uuid], period, startdate, enddate)
+        return people
+
+    @staticmethod
+    def split_people_agg(data, uuids):
+        """ Aggregated values by uuid from a query grouped by uuid.
+            People without activity are not included. """
+        people = {}
+        for (uuid, values) in DataSource._split_people_data(data, uuids).items():
+            if len(values.values()[0]) == 0: continue
+            people[uuid] = dict([(field, values[field][0]) for field in values])
+        return people
+
     def create_people_report(self, period, startdate, enddate, destdir, npeople, identities_db, people_ids=None):
         """Create all files related to people activity (aggregated, evolutionary)"""
         fpeople = os.path.join(destdir,self.get_top_people_file(self.get_name()))
@@ -251,14 +389,28 @@ class DataSource(object):
 
         createJSON(people, fpeople)
 
+        people_evol = people_agg = None
+        if len(people) > 0:
+            # All people data in one query if the data source supports it
+            people_evol = self.get_people_evol(people, period, startdate, enddate,
+                                               identities_db)
+            people_agg = self.get_people_agg(people, startdate, enddate,
+                                             identities_db)
+
         for uuid in people :
-            evol_data = self.get_person_evol(uuid, period, startdate, enddate,
-                                            identities_db, type_analysis = None)
+            if people_evol is not None:
+                evol_data = people_evol[str(uuid)]
+            else:
+                evol_data = self.get_person_evol(uuid, period, startdate, enddate,
+                                                 identities_db, type_analysis = None)
             fperson = os.path.join(destdir,self.get_person_evol_file(uuid))
             createJSON (evol_data, fperson)
 
-            agg = self.get_person_agg(uuid, startdate, enddate,
-                                     identities_db, type_analysis = None)
+            if people_agg is not None and str(uuid) in people_agg:
+                agg = people_agg[str(uuid)]
+            else:
+                agg = self.get_person_agg(uuid, startdate, enddate,
+                                          identities_db, type_analysis = None)
             fperson = os.path.join(destdir,self.get_person_agg_file(uuid))
             createJSON (agg, fperson)
 
@@ -381,6 +533,7 @@ class DataSource(object):
         if filter_ is not None:
             type_analysis = filter_.get_type_analysis()
 
+        items = None
         if type_analysis and type_analysis[1] is None:
             # We need the items for filling later values in group by queries
             items = DS.get_filter_items(filter_, startdate, enddate, identities_db)
@@ -404,14 +557,36 @@ class DataSource(object):
             for r in metrics_reports:
                 if r in reports_on: metrics_on += [r]
 
+        metrics_run = []
         for item in all_metrics:
-            # print item
             if item.id not in metrics_on: continue
+            if type_analysis is None and item.id in DS._metrics_skip: continue
+            if not evol and type_analysis is None and item.id in DS._metrics_agg:
+                data[item.id] = DS._metrics_agg[item.id]
+                continue
+            metrics_run.append(item)
+
+        # Metrics sharing tables and filters are computed in one query
+        fused_values = {}
+        if not (type_analysis and type_analysis[1] is None):
+            queries = []
+            for item in metrics_run:
+                mfilter_orig = item.filters
+                mfilter.global_filter = mfilter_orig.global_filter
+                mfilter.set_closed_condition(mfilter_orig.closed_condition)
+                item.filters = mfilter
+                queries.append(capture_query(item, evol))
+                item.filters = mfilter_orig
+            fused_values = get_fused_values(queries, evol)
+
+        for item in metrics_run:
+            # print item
             mfilter_orig = item.filters
             mfilter.global_filter = mfilter_orig.global_filter
             mfilter.set_closed_condition(mfilter_orig.closed_condition)
             item.filters = mfilter
-            if evol: mvalue = item.get_ts()
+            if item.id in fused_values: mvalue = fused_values[item.id]
+            elif evol: mvalue = item.get_ts()
             else:    mvalue = item.get_agg()
 
             if type_analysis and type_analysis[1] is None and mvalue:
@@ -454,21 +629,15 @@ class DataSource(object):
             if automator_metrics in automator['r']:
                 metrics_trends = automator['r'][automator_metrics].split(",")
 
-            for i in [7,30,365]:
-                for item in all_metrics:
-                    if item.id not in metrics_trends: continue
-                    mfilter_orig = item.filters
-                    item.filters = mfilter
-                    period_data = item.get_trends(enddate, i)
-                    item.filters = mfilter_orig
-
-                    if type_analysis and type_analysis[1] is None:
-                        group_field = dsquery.get_group_field(type_analysis[0])
-                        if 'CONCAT' not in group_field:
-                            group_field = group_field.split('.')[1] # remove table name
-                        period_data = fill_and_order_items(items, period_data, group_field)
+            for item in all_metrics:
+                if item.id not in metrics_trends: continue
+                mfilter_orig = item.filters
+                item.filters = mfilter
+                # Ordered like items in GROUP BY queries
+                period_data = item.get_trends_windows(enddate, [7,30,365], items)
+                item.filters = mfilter_orig
 
-                    data = dict(data.items() + period_data.items())
+                data = dict(data.items() + period_data.items())
 
         return data
 
@@ -560,14 +729,18 @@ class DataSource(object):
                         continue
                 item_metrics[metric] = data[metric][i]
             filter_item = Filter(filter_.get_name(), item)
+            axis_fn = None
             if evolutionary:
                 for field in ts_fields:
                     # Shared time series fields
                     item_metrics[field] = data[field]
                 fn = os.path.join(destdir, filter_item.get_evolutionary_filename(cls()))
+                axis_fn = os.path.join(destdir, filter_item.get_evolutionary_axis_filename(cls()))
+                bundle_fn = os.path.join(destdir, filter_item.get_evolutionary_bundle_filename(cls()))
             else:
                 fn = os.path.join(destdir, filter_item.get_static_filename(cls()))
-            createJSON(item_metrics, fn)
+                bundle_fn = os.path.join(destdir, filter_item.get_static_bundle_filename(cls()))
+            createJSON(item_metrics, fn, axis_filepath = axis_fn, bundle_filepath = bundle_fn)
 
     @classmethod
     def ages_study_com (ds, items, period,
@@ -25,7 +25,6 @@
 #
 
 import numpy as np
-from scipy import stats
 
 
 class DataHandler(object):
@@ -72,7 +71,7 @@ class DHESA(DataHandler):
         Parameters
         ----------
 
-        dataset: list of elements
+        dataset: list of elements or NumPy array
         filters: MetricFilters object
 
         """
@@ -80,8 +79,8 @@ class DHESA(DataHandler):
         self.filters = filters
         self.data = {}
 
-        if not isinstance(dataset, list):
-            raise Exception("__init__ dataset should be a list")
+        if not isinstance(dataset, (list, np.ndarray)):
+            raise Exception("__init__ dataset should be a list or an array")
         if len(dataset) == 0:
             self.data["median"] = 0
             self.data["mean"] = 0
@@ -91,6 +90,8 @@ class DHESA(DataHandler):
             self.data["percentile25"] = 0
             self.data["percentile75"] = 0
         else:
+            # scipy is slow to import: only when needed
+            from scipy import stats
             self.data["median"] = np.median(dataset)
             self.data["mean"] = np.mean(dataset)
             self.data["mode"] = stats.mode(dataset)
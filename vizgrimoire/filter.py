@@ -66,6 +66,14 @@ class Filter(object):
     def get_evolutionary_filename_all (self, ds):
         return ds.get_name()+"-"+self.get_name_short()+"-all-evolutionary.json"
 
+    def get_evolutionary_axis_filename (self, ds):
+        """ Time axis shared by the evolutionary files of all the items """
+        return ds.get_name()+"-"+self.get_name_short()+"-axis-evolutionary.json"
+
+    def get_evolutionary_bundle_filename (self, ds):
+        """ Bundle with the evolutionary files of all the items """
+        return ds.get_name()+"-"+self.get_name_short()+"-evolutionary.bundle"
+
     def get_evolutionary_filename (self, ds):
         name  = None
 
@@ -82,6 +90,10 @@ class Filter(object):
     def get_static_filename_all (self, ds):
         return ds.get_name()+"-"+self.get_name_short()  +"-all-static.json"
 
+    def get_static_bundle_filename (self, ds):
+        """ Bundle with the static files of all the items """
+        return ds.get_name()+"-"+self.get_name_short()+"-static.bundle"
+
     def get_static_filename (self, ds):
         name  = None
 
@@ -0,0 +1,187 @@
+## Copyright (C) 2014 Bitergia
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 3 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+##
+## This file is a part of GrimoireLib
+##  (an Python library for the MetricsGrimoire and vizGrimoire systems)
+
+""" Incremental generation of the global reports of the data sources
+
+    The per period time series of the previous run are kept in the
+    evolutionary JSON files. In the next run only the periods since the last
+    activity found in the data source (the high-water mark) are queried and
+    merged with the old ones. Aggregated values of additive metrics are
+    derived from the merged time series.
+"""
+
+import json, logging, os
+from datetime import datetime, timedelta
+from dateutil.relativedelta import relativedelta
+
+from vizgrimoire.GrimoireUtils import createJSON
+from vizgrimoire.data_source import DataSource
+from vizgrimoire.metrics.metrics import Metrics
+from vizgrimoire.report import Report
+
+# Number of periods before the high-water mark queried again by default
+default_lookback = 1
+
+def get_state_filename(ds):
+    return ds.get_name() + "-incremental.json"
+
+def read_json(filename):
+    if not os.path.isfile(filename): return None
+    try:
+        f = open(filename)
+        data = json.load(f)
+        f.close()
+    except ValueError:
+        logging.warn("Can not read " + filename)
+        return None
+    return data
+
+def get_period_start(date, period, lookback = 0):
+    """ First day of the period including date, lookback periods before """
+    if period == "week":
+        return date - timedelta(days = date.weekday()) - timedelta(weeks = lookback)
+    elif period == "month":
+        return date.replace(day = 1) - relativedelta(months = lookback)
+    elif period == "year":
+        return date.replace(month = 1, day = 1) - relativedelta(years = lookback)
+    return None
+
+def get_lookback():
+    lookback = default_lookback
+    if 'incremental_lookback' in Report.get_config()['r']:
+        lookback = int(Report.get_config()['r']['incremental_lookback'])
+    return lookback
+
+def get_bucketed_metrics(ds):
+    """ Metrics whose time series values only depend on each period data """
+    metrics = []
+    for item in DataSource.get_metrics_set(ds):
+        if type(item).get_ts.im_func is Metrics.get_ts.im_func:
+            metrics.append(item.id)
+    return metrics
+
+def get_high_water_mark(ds, startdate, enddate, identities_db):
+    """ Date of the last activity in the data source """
+    last_date = ds.get_date_end(startdate, enddate, identities_db, None)
+    if last_date is None or last_date.get('last_date') is None: return None
+    return str(last_date['last_date'])
+
+def get_incremental_startdate(state, period, startdate, enddate):
+    """ Start date for querying the time series or None for a full query """
+    if state is None: return None
+    if state['period'] != period or state['startdate'] != startdate:
+        return None
+    if enddate < state['enddate']: return None
+
+    # Last day included in the previous run
+    last = datetime.strptime(state['enddate'].replace("'", ""), "%Y-%m-%d")
+    last = last - timedelta(days=1)
+    if state['last_date'] is not None:
+        last = min(last, datetime.strptime(state['last_date'], "%Y-%m-%d"))
+    start = get_period_start(last, period, get_lookback())
+    if start is None: return None
+    start = "'" + start.strftime("%Y-%m-%d") + "'"
+    if start <= startdate: return None
+    return start
+
+def merge_ts(old, new, period):
+    """ Replace the periods in old time series with the new ones """
+    if old is None or period not in old or period not in new: return None
+    if len(new[period]) == 0 or new[period][0] not in old[period]:
+        return None
+    keep = old[period].index(new[period][0])
+
+    merged = {}
+    for field in new:
+        if field not in old or not isinstance(new[field], list): return None
+        if len(old[field]) != len(old[period]): return None
+        merged[field] = old[field][:keep] + new[field]
+    merged['id'] = range(0, len(merged[period]))
+    return merged
+
+def get_evolutionary_data(ds, period, startdate, enddate, identities_db, destdir):
+    """ Get the evolutionary data reusing the time series of the last run """
+    state = read_json(os.path.join(destdir, get_state_filename(ds)))
+    ds_config = [ds.get_name() + "_startdate", ds.get_name() + "_enddate"]
+    if [key for key in ds_config if key in Report.get_config()['r']]:
+        # Data sources with their own dates are always fully generated
+        state = None
+    inc_startdate = get_incremental_startdate(state, period, startdate, enddate)
+    bucketed = get_bucketed_metrics(ds)
+
+    # Metrics not bucketed by period and studies use the whole history
+    DataSource.set_metrics_skip(ds, bucketed)
+    try:
+        data = ds.get_evolutionary_data(period, startdate, enddate, identities_db)
+    finally:
+        DataSource.set_metrics_skip(ds, [])
+    if [metric for metric in bucketed if metric in data]:
+        # Data sources not using get_metrics_data are always fully generated
+        return data
+
+    not_bucketed = [item.id for item in DataSource.get_metrics_set(ds)
+                    if item.id not in bucketed]
+    DataSource.set_metrics_skip(ds, not_bucketed)
+    try:
+        merged = None
+        if inc_startdate is not None:
+            logging.info(ds.get_name() + " incremental evolutionary data from " + inc_startdate)
+            new = ds.get_metrics_data(period, inc_startdate, enddate, identities_db, None, True)
+            old = read_json(os.path.join(destdir, ds().get_evolutionary_filename()))
+            merged = merge_ts(old, new, period)
+            if merged is not None and period in data and data[period] != merged[period]:
+                merged = None
+        if merged is None:
+            logging.info(ds.get_name() + " full evolutionary data")
+            merged = ds.get_metrics_data(period, startdate, enddate, identities_db, None, True)
+    finally:
+        DataSource.set_metrics_skip(ds, [])
+
+    return dict(data.items() + merged.items())
+
+def get_additive_agg(ds, evol):
+    """ Aggregated values of additive metrics from their time series """
+    agg = {}
+    for item in DataSource.get_metrics_set(ds):
+        if not item.additive or item.id not in evol: continue
+        values = evol[item.id]
+        if not isinstance(values, list): continue
+        if [value for value in values if not isinstance(value, (int, long, float))]:
+            continue
+        agg[item.id] = sum(values)
+    return agg
+
+def create_reports(ds, period, startdate, enddate, destdir, identities_db):
+    """ Create the evolutionary and aggregated reports of a data source """
+    # High-water mark before querying so new activity is included next time
+    last_date = get_high_water_mark(ds, startdate, enddate, identities_db)
+
+    evol = get_evolutionary_data(ds, period, startdate, enddate, identities_db, destdir)
+    createJSON(evol, os.path.join(destdir, ds().get_evolutionary_filename()))
+
+    DataSource.set_metrics_agg(ds, get_additive_agg(ds, evol))
+    try:
+        agg = ds.get_agg_data(period, startdate, enddate, identities_db)
+    finally:
+        DataSource.set_metrics_agg(ds, {})
+    createJSON(agg, os.path.join(destdir, ds().get_agg_filename()))
+
+    state = {"period": period, "startdate": startdate, "enddate": enddate,
+             "last_date": last_date}
+    createJSON(state, os.path.join(destdir, get_state_filename(ds)))
@@ -0,0 +1,131 @@
+## Copyright (C) 2014 Bitergia
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 3 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+##
+## This file is a part of GrimoireLib
+##  (an Python library for the MetricsGrimoire and vizGrimoire systems)
+
+""" Bundles of the JSON files of filter items
+
+    A bundle packs the files of all the items of a filter in a data source
+    (i.e. all the *-scm-com-evolutionary.json files) in a single file:
+
+        JSON of each file, followed by a new line
+        index: JSON object {file name: [offset, length]}
+        trailer: offset of the index, 16 digits, and a new line
+
+    BundleReader maps the bundle in memory and only parses the index, so a
+    single file is read without parsing the whole bundle.
+
+    Each process appends the files to its own part files (data and index),
+    merged in the bundle by iter_merged.
+"""
+
+import glob
+import json
+import mmap
+import os
+
+_trailer_size = 17
+
+def get_part_filenames(filepath, pid):
+    """ Data and index part files of a process """
+    return ("%s.part.%i" % (filepath, pid), "%s.idx.part.%i" % (filepath, pid))
+
+def get_parts(filepath):
+    """ Data and index part files of all the processes, oldest first, so the
+        files written again by the last run are taken from it """
+    parts = [get_part_filenames(filepath, int(data.rsplit(".", 1)[1]))
+             for data in glob.glob(filepath + ".part.*")]
+    parts = [(data, index) for (data, index) in parts if os.path.exists(index)]
+    return sorted(parts, key=lambda part: os.path.getmtime(part[0]))
+
+def write_part(filepath, files):
+    """ Append the files [(name, json)] to the part files of this process """
+    (data_part, index_part) = get_part_filenames(filepath, os.getpid())
+    fd = open(data_part, "ab")
+    offset = os.fstat(fd.fileno()).st_size
+    index = []
+    for (name, data) in files:
+        fd.write(data + "\n")
+        index.append(json.dumps([name, offset, len(data)]) + "\n")
+        offset += len(data) + 1
+    fd.close()
+    # The index after the data: its entries are always in the data part
+    fd = open(index_part, "a")
+    fd.writelines(index)
+    fd.close()
+
+def iter_merged(filepath, parts):
+    """ Chunks of the bundle with the files of the parts (data, index) and
+        those of the current bundle not in them """
+    files = {} # name: (data file, offset, length)
+    if os.path.exists(filepath):
+        reader = BundleReader(filepath)
+        for (name, (offset, length)) in reader.index.items():
+            files[name] = (filepath, offset, length)
+        reader.close()
+    for (data_part, index_part) in parts:
+        for line in open(index_part):
+            (name, offset, length) = json.loads(line)
+            files[name] = (data_part, offset, length)
+
+    index = {}
+    offset = 0
+    fds = {}
+    try:
+        for name in sorted(files.keys()):
+            (data_file, file_offset, length) = files[name]
+            if data_file not in fds: fds[data_file] = open(data_file, "rb")
+            fds[data_file].seek(file_offset)
+            yield fds[data_file].read(length) + "\n"
+            index[name] = [offset, length]
+            offset += length + 1
+    finally:
+        for fd in fds.values():
+            fd.close()
+    yield json.dumps(index, sort_keys=True)
+    yield "%016i\n" % offset
+
+class BundleReader(object):
+    """ Read the JSON files in a bundle """
+
+    def __init__(self, filepath):
+        self.fd = open(filepath, "rb")
+        self.map = mmap.mmap(self.fd.fileno(), 0, access=mmap.ACCESS_READ)
+        index_offset = int(self.map[-_trailer_size:])
+        self.index = json.loads(self.map[index_offset:-_trailer_size])
+
+    def close(self):
+        self.map.close()
+        self.fd.close()
+
+    def get_names(self):
+        return sorted(self.index.keys())
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def get_raw(self, name):
+        """ JSON of the file name, None if it is not in the bundle """
+        if name not in self.index: return None
+        (offset, length) = self.index[name]
+        return self.map[offset:offset + length]
+
+    def get(self, name):
+        """ Data of the file name, None if it is not in the bundle """
+        data = self.get_raw(name)
+        if data is None: return None
+        return json.loads(data)
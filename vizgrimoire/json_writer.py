@@ -0,0 +1,367 @@
+## Copyright (C) 2014 Bitergia
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 3 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+##
+## This file is a part of GrimoireLib
+##  (an Python library for the MetricsGrimoire and vizGrimoire systems)
+
+""" Writer of the JSON files of the dashboard
+
+    Values are converted in one pass: decimals to rounded floats, dates to
+    strings and NaN to "NA". Dicts are copied with their keys sorted so the
+    C JSON encoder can be used (it does not support sort_keys), and the
+    values of the top level dict are written to the file as they are
+    encoded. Files are written to a temporary file renamed once complete,
+    so readers never get a partial file.
+
+    Optionally a compressed copy (file.json.gz) is written for the web
+    server, and the time axis of the evolutionary files of filter items
+    (the same for all items) is written once to a shared axis file.
+
+    With the manifest enabled, the hash, size and mtime of the files
+    written in a directory are kept in its manifest file, and files whose
+    content did not change are not written again, so their mtime does not
+    change and they are not transferred again to the web servers.
+
+    With bundles enabled, the files of filter items are packed in a bundle
+    per data source, filter and kind (see json_bundle) instead of written.
+
+    Each process appends its manifest changes and bundled files to its own
+    part files, written by flush and merged by save.
+"""
+
+import glob
+import gzip
+import hashlib
+import json
+import logging
+import os
+from collections import OrderedDict
+from datetime import date
+from decimal import Decimal
+
+from vizgrimoire import json_bundle
+
+_gzip = False
+_shared_axis = False
+_axis_written = {} # axis file: axis written to it by this process
+_manifest = False
+_manifests = {} # directory: {file name: [sha1, size, mtime]}
+_changes = [] # (directory, file name, entry, written) not saved yet
+_bundles = False
+_bundle_files = [] # (bundle, file name, json) not written yet
+_bundle_size = 0
+_bundle_flush_size = 8 * 1024 * 1024
+_bundles_written = set() # bundles with part files of this process
+_pid = None
+
+manifest_name = ".json_manifest"
+
+# Fields with the time axis of evolutionary data
+axis_fields = ["id", "date", "unixtime", "day", "week", "month", "year"]
+
+_encoder = json.JSONEncoder()
+
+# Types encoded as they are
+_plain_types = frozenset([int, long, bool, str, unicode, type(None)])
+_plain_float_types = _plain_types.union([float])
+
+def set_gzip(enabled):
+    """ Write also a compressed copy of each file """
+    global _gzip
+    _gzip = enabled
+
+def set_shared_axis(enabled):
+    """ Write the time axis of the filter items once per filter """
+    global _shared_axis, _axis_written
+    _shared_axis = enabled
+    _axis_written = {}
+
+def set_manifest(enabled):
+    """ Do not write again the files with the same content """
+    global _manifest, _manifests, _changes, _pid
+    _manifest = enabled
+    _manifests = {}
+    _changes = []
+    _pid = os.getpid()
+
+def set_bundles(enabled):
+    """ Pack the files of filter items in bundles """
+    global _bundles, _bundle_files, _bundle_size, _bundles_written, _pid
+    _bundles = enabled
+    _bundle_files = []
+    _bundle_size = 0
+    _bundles_written = set()
+    _pid = os.getpid()
+
+def _check_fork():
+    """ Forked: the pending changes of the parent are written by it """
+    global _changes, _bundle_files, _bundle_size, _bundles_written, _pid
+    if _pid == os.getpid(): return
+    _changes = []
+    _bundle_files = []
+    _bundle_size = 0
+    _bundles_written = set()
+    _pid = os.getpid()
+
+def _read_manifest(dirname):
+    manifest = {}
+    filepath = os.path.join(dirname, manifest_name)
+    if os.path.exists(filepath):
+        try:
+            manifest = json.load(open(filepath))
+        except ValueError:
+            logging.warning("Wrong JSON manifest %s, ignored" % filepath)
+    return manifest
+
+def _get_manifest(dirname):
+    _check_fork()
+    if dirname not in _manifests:
+        _manifests[dirname] = _read_manifest(dirname)
+    return _manifests[dirname]
+
+def _get_file_entry(filepath, sha1):
+    stat = os.stat(filepath)
+    return [sha1, stat.st_size, int(stat.st_mtime)]
+
+def _is_unchanged(filepath, sha1):
+    """ Whether filepath was written with this content and not changed """
+    (dirname, name) = os.path.split(filepath)
+    entry = _get_manifest(dirname).get(name)
+    if entry is None or entry[0] != sha1: return False
+    if not os.path.exists(filepath): return False
+    if _get_file_entry(filepath, sha1) != entry: return False
+    if _gzip: return os.path.exists(filepath + ".gz")
+    return True
+
+def _add_change(filepath, sha1, written):
+    (dirname, name) = os.path.split(filepath)
+    entry = _get_file_entry(filepath, sha1)
+    _get_manifest(dirname)[name] = entry
+    _changes.append((dirname, name, entry, written))
+
+def _add_to_bundle(bundle_filepath, name, data):
+    global _bundle_size
+    _check_fork()
+    _bundle_files.append((bundle_filepath, name, data))
+    _bundle_size += len(data)
+    if _bundle_size >= _bundle_flush_size: _flush_bundles()
+
+def _flush_bundles():
+    global _bundle_files, _bundle_size
+    bundles = {}
+    for (bundle_filepath, name, data) in _bundle_files:
+        bundles.setdefault(bundle_filepath, []).append((name, data))
+    for bundle_filepath in bundles:
+        json_bundle.write_part(bundle_filepath, bundles[bundle_filepath])
+        _bundles_written.add(bundle_filepath)
+    _bundle_files = []
+    _bundle_size = 0
+
+def _flush_manifest():
+    global _changes
+    parts = {}
+    for (dirname, name, entry, written) in _changes:
+        if dirname not in parts:
+            parts[dirname] = open("%s.part.%i" % (os.path.join(dirname, manifest_name),
+                                                  os.getpid()), "a")
+        parts[dirname].write(json.dumps([name, entry, written]) + "\n")
+    for fd in parts.values():
+        fd.close()
+    _changes = []
+
+def flush():
+    """ Append the manifest changes and bundled files of this process to
+        its part files """
+    _check_fork()
+    _flush_bundles()
+    _flush_manifest()
+
+def _save_bundles(dirnames):
+    """ Merge the part files of the bundles in dirnames """
+    bundles = set([os.path.normpath(bundle) for bundle in _bundles_written])
+    for dirname in dirnames:
+        for part in glob.glob(os.path.join(dirname, "*.bundle.part.*")):
+            bundles.add(os.path.normpath(part.rsplit(".part.", 1)[0]))
+    for bundle_filepath in sorted(bundles):
+        parts = json_bundle.get_parts(bundle_filepath)
+        if len(parts) == 0: continue
+        _write_file(bundle_filepath, json_bundle.iter_merged(bundle_filepath, parts))
+        for (data_part, index_part) in parts:
+            os.remove(data_part)
+            os.remove(index_part)
+    _bundles_written.clear()
+
+def _save_manifests(dirnames):
+    """ Merge the part files of the manifests in dirnames and log the
+        written and skipped files """
+    _flush_manifest()
+    dirnames = set([os.path.normpath(dirname)
+                    for dirname in _manifests.keys() + list(dirnames)])
+    for dirname in sorted(dirnames):
+        filepath = os.path.join(dirname, manifest_name)
+        # Parts left by a failed run are merged too: the mtime of their
+        # entries will not match if the files were written again
+        parts = glob.glob(filepath + ".part.*")
+        if len(parts) == 0: continue
+        manifest = _read_manifest(dirname)
+        written = skipped = 0
+        for part in parts:
+            for line in open(part):
+                (name, entry, changed) = json.loads(line)
+                manifest[name] = entry
+                if changed: written += 1
+                else: skipped += 1
+        _write_file(filepath, [json.dumps(manifest, sort_keys=True)], False)
+        for part in parts:
+            os.remove(part)
+        logging.info("JSON files in %s: %i written, %i unchanged" % (dirname, written, skipped))
+
+def save(dirnames = []):
+    """ Merge the part files of all processes in the bundles and manifests
+        of the directories written by this process and of dirnames """
+    flush()
+    dirnames = [os.path.normpath(dirname) for dirname in dirnames]
+    if _bundles: _save_bundles(dirnames)
+    if _manifest: _save_manifests(dirnames)
+
+def _prepare(value, ndigits):
+    """ Returns the value converted in place in its containers, like
+        removeDecimals, roundDecimals and convertDatetime do, and the
+        value to be encoded """
+    if isinstance(value, float):
+        value = round(value, ndigits)
+        if value != value: return (value, "NA")
+        return (value, value)
+    if isinstance(value, (basestring, int, long)) or value is None:
+        return (value, value)
+    if isinstance(value, list):
+        # Fast paths for the lists of numbers and strings of time series
+        types = set(map(type, value))
+        if types <= _plain_types: return (value, value)
+        if types <= _plain_float_types:
+            value[:] = [round(item, ndigits) if type(item) is float else item
+                        for item in value]
+            return (value, ["NA" if item != item else item for item in value])
+        encoded = []
+        for i in range(0, len(value)):
+            (value[i], item) = _prepare(value[i], ndigits)
+            encoded.append(item)
+        return (value, encoded)
+    if isinstance(value, dict):
+        encoded = OrderedDict()
+        for key in sorted(value.keys()):
+            (value[key], encoded[key]) = _prepare(value[key], ndigits)
+        return (value, encoded)
+    if isinstance(value, Decimal):
+        return _prepare(float(value), ndigits)
+    if isinstance(value, date):
+        value = str(value)
+        return (value, value)
+    if isinstance(value, tuple):
+        return (value, [_prepare(item, ndigits)[1] for item in value])
+    return (value, value)
+
+def _encode_key(key):
+    if isinstance(key, basestring): return _encoder.encode(key)
+    # JSON keys are strings: true, null, numbers ...
+    return _encoder.encode(_encoder.encode(key))
+
+def _write_file(filepath, chunks, data_file = True):
+    """ Write atomically the chunks to filepath and, for the data files of
+        the dashboard, its compressed copy """
+    sha1 = None
+    if _manifest and data_file:
+        chunks = ["".join(chunks)]
+        sha1 = hashlib.sha1(chunks[0]).hexdigest()
+        if _is_unchanged(filepath, sha1):
+            if not _gzip and os.path.exists(filepath + ".gz"):
+                os.remove(filepath + ".gz")
+            _add_change(filepath, sha1, False)
+            return
+    tmp = "%s.tmp%i" % (filepath, os.getpid())
+    gz_tmp = "%s.gz.tmp%i" % (filepath, os.getpid())
+    fd = open(tmp, "wb")
+    gz_fd = gz = None
+    try:
+        if _gzip and data_file:
+            gz_fd = open(gz_tmp, "wb")
+            # mtime 0: the same data gives the same compressed file
+            gz = gzip.GzipFile(os.path.basename(filepath), "wb", 6, gz_fd, 0)
+        for chunk in chunks:
+            fd.write(chunk)
+            if gz is not None: gz.write(chunk)
+    except:
+        fd.close()
+        os.remove(tmp)
+        if gz_fd is not None:
+            gz_fd.close()
+            os.remove(gz_tmp)
+        raise
+    fd.close()
+    os.rename(tmp, filepath)
+    if sha1 is not None: _add_change(filepath, sha1, True)
+    if gz is not None:
+        gz.close()
+        gz_fd.close()
+        os.rename(gz_tmp, filepath + ".gz")
+    elif data_file and os.path.exists(filepath + ".gz"):
+        # Stale compressed copy of a previous run
+        os.remove(filepath + ".gz")
+
+def _iter_chunks(data):
+    if not isinstance(data, dict):
+        yield _encoder.encode(data)
+        return
+    yield "{"
+    first = True
+    for key in data:
+        if not first: yield ", "
+        first = False
+        yield _encode_key(key) + ": " + _encoder.encode(data[key])
+    yield "}"
+
+def _split_axis(data, axis_filepath):
+    """ data without the time axis if it is the one written in the shared
+        axis file, with the name of this file instead """
+    axis = OrderedDict([(field, data[field]) for field in data if field in axis_fields])
+    if len(axis) == 0: return data
+    written = _axis_written.get(axis_filepath)
+    if written is None:
+        _write_file(axis_filepath, _iter_chunks(axis))
+        _axis_written[axis_filepath] = written = axis
+    if written != axis: return data
+    item = OrderedDict([(field, data[field]) for field in data if field not in axis_fields])
+    item["axis"] = os.path.basename(axis_filepath)
+    # Sorted keys, like all the files
+    return OrderedDict([(key, item[key]) for key in sorted(item.keys())])
+
+def write_json(data, filepath, axis_filepath = None, bundle_filepath = None):
+    """ Write data to filepath. If the shared axis is enabled the time axis
+        of data is written to axis_filepath, if given. If bundles are enabled
+        and bundle_filepath is given, data is added to it instead. """
+    # Circular import
+    from vizgrimoire.metrics.metrics import Metrics
+    from vizgrimoire.GrimoireUtils import convertCombinedFiltersName
+
+    data = convertCombinedFiltersName(data)
+    encoded = _prepare(data, Metrics.max_decimals)[1]
+    if _shared_axis and axis_filepath is not None and isinstance(encoded, dict):
+        encoded = _split_axis(encoded, axis_filepath)
+    if _bundles and bundle_filepath is not None:
+        _add_to_bundle(bundle_filepath, os.path.basename(filepath),
+                       "".join(_iter_chunks(encoded)))
+        return
+    _write_file(filepath, _iter_chunks(encoded))
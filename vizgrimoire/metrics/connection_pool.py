@@ -0,0 +1,301 @@
+## Copyright (C) 2014 Bitergia
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 3 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+##
+## This file is a part of GrimoireLib
+##  (an Python library for the MetricsGrimoire and vizGrimoire systems)
+
+""" Pools of MySQL connections shared by DSQuery and GrimoireSQL
+
+    Each thread checks out its own connection and keeps it, so session
+    state (user variables, temporary tables) is kept between its queries,
+    until it releases it or the thread ends. Idle connections are pinged
+    before being used again and connections lost by the server are opened
+    again. Connections inherited from a parent process are never used.
+"""
+
+import logging
+import os
+import threading
+import time
+
+import MySQLdb
+import MySQLdb.cursors
+
+# Client errors for connections closed by the server
+# 2006: MySQL server has gone away, 2013: Lost connection during query
+lost_connection_errors = (2006, 2013)
+
+class ConnectionPool(object):
+    """ Bounded pool of connections to a database """
+
+    default_max_size = 8
+    ping_interval = 60 # seconds idle before checking a connection
+    wait_timeout = 600 # seconds waiting for a free connection
+    fetch_size = 10000 # rows read at once by execute_iter
+    # Executed once when each connection is opened
+    init_statements = ["SET NAMES 'utf8'"]
+
+    def __init__(self, user=None, password=None, database=None,
+                 host="127.0.0.1", port=3306, group=None, max_size=None):
+        self.params = dict(user=user, password=password, database=database,
+                           host=host, port=port, group=group)
+        self.max_size = max_size
+        if max_size is None: self.max_size = ConnectionPool.default_max_size
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._lock = threading.Condition(threading.Lock())
+        self._idle = [] # (connection, last use)
+        self._owners = {} # connection: owner thread
+        self._local = threading.local()
+        self.stats = {"open": 0, "in_use": 0, "checkouts": 0, "waits": 0,
+                      "wait_time": 0.0, "reconnects": 0}
+
+    def _check_pid(self):
+        # Connections can not be shared with forked processes
+        if self._pid != os.getpid():
+            _inherited_conns.extend([conn for (conn, last) in self._idle])
+            _inherited_conns.extend(self._owners.keys())
+            self._reset()
+
+    def _open(self):
+        if self.params['group'] is None:
+            conn = MySQLdb.connect(user=self.params['user'],
+                                   passwd=self.params['password'],
+                                   db=self.params['database'],
+                                   host=self.params['host'],
+                                   port=self.params['port'])
+        else:
+            conn = MySQLdb.connect(read_default_group=self.params['group'],
+                                   db=self.params['database'])
+        cursor = conn.cursor()
+        for sql in self.init_statements:
+            cursor.execute(sql)
+        cursor.close()
+        return conn
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except MySQLdb.Error:
+            pass
+
+    def _reclaim(self):
+        """ Connections of finished threads are idle again """
+        for (conn, owner) in self._owners.items():
+            if not owner.is_alive():
+                del self._owners[conn]
+                self._idle.append((conn, 0))
+                self.stats["in_use"] -= 1
+
+    def _is_alive(self, conn, last_use):
+        if time.time() - last_use < self.ping_interval: return True
+        try:
+            conn.ping()
+        except MySQLdb.Error:
+            return False
+        return True
+
+    def get_connection(self):
+        """ Connection of the current thread, checked out if needed """
+        self._check_pid()
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None: return conn
+
+        self._lock.acquire()
+        try:
+            self._reclaim()
+            start = time.time()
+            waited = False
+            while not self._idle and self.stats["open"] >= self.max_size:
+                if time.time() - start > self.wait_timeout:
+                    raise MySQLdb.OperationalError("No free connection to %s after %is"
+                                                   % (self.params['database'], self.wait_timeout))
+                waited = True
+                self._lock.wait(1)
+                self._reclaim()
+            if waited:
+                self.stats["waits"] += 1
+                self.stats["wait_time"] += time.time() - start
+            if self._idle:
+                (conn, last_use) = self._idle.pop()
+            else:
+                conn, last_use = None, None
+                self.stats["open"] += 1
+            self.stats["in_use"] += 1
+            self.stats["checkouts"] += 1
+        finally:
+            self._lock.release()
+
+        # Connect out of the lock
+        try:
+            if conn is not None and not self._is_alive(conn, last_use):
+                logging.info("Reconnecting stale connection to " + str(self.params['database']))
+                self.stats["reconnects"] += 1
+                self._close(conn)
+                conn = None
+            if conn is None:
+                conn = self._open()
+        except:
+            self._free_slot()
+            raise
+        self._lock.acquire()
+        try:
+            self._owners[conn] = threading.current_thread()
+        finally:
+            self._lock.release()
+        self._local.conn = conn
+        return conn
+
+    def _free_slot(self):
+        self._lock.acquire()
+        try:
+            self.stats["open"] -= 1
+            self.stats["in_use"] -= 1
+            self._lock.notify()
+        finally:
+            self._lock.release()
+
+    def _discard(self, conn):
+        """ Close a broken connection of the current thread """
+        self._local.conn = None
+        self._close(conn)
+        self._lock.acquire()
+        try:
+            self._owners.pop(conn, None)
+        finally:
+            self._lock.release()
+        self._free_slot()
+
+    def release(self):
+        """ Return the connection of the current thread to the pool """
+        self._check_pid()
+        conn = getattr(self._local, 'conn', None)
+        if conn is None: return
+        self._local.conn = None
+        self._lock.acquire()
+        try:
+            self._owners.pop(conn, None)
+            self._idle.append((conn, time.time()))
+            self.stats["in_use"] -= 1
+            self._lock.notify()
+        finally:
+            self._lock.release()
+
+    def execute(self, sql, cursorclass = None):
+        """ Execute sql with the thread connection and return the cursor """
+        conn = self.get_connection()
+        cursor = conn.cursor(cursorclass)
+        try:
+            cursor.execute(sql)
+        except MySQLdb.OperationalError, e:
+            if e.args[0] not in lost_connection_errors: raise
+            # Lost during a query it could have been executed
+            if e.args[0] == 2013 and not sql.lstrip()[0:6].upper() == "SELECT":
+                raise
+            logging.warning("Connection to %s lost, reconnecting: %s" %
+                            (self.params['database'], e))
+            self._discard(conn)
+            self.stats["reconnects"] += 1
+            cursor = self.get_connection().cursor(cursorclass)
+            cursor.execute(sql)
+        return cursor
+
+    def execute_iter(self, sql, batch_size = None):
+        """ Execute sql with a server side cursor and yield its rows as
+            tuples or, with batch_size, dicts of columns with up to
+            batch_size rows. Rows are read from the server while iterating,
+            so the thread connection can not execute other queries until
+            the iteration ends. """
+        cursor = self.execute(sql, MySQLdb.cursors.SSCursor)
+        try:
+            if cursor.description is None: return
+            columns = [column[0] for column in cursor.description]
+            while True:
+                rows = cursor.fetchmany(batch_size or self.fetch_size)
+                if not rows: break
+                if batch_size is None:
+                    for row in rows: yield row
+                else:
+                    yield dict([(column, [row[i] for row in rows])
+                                for (i, column) in enumerate(columns)])
+        finally:
+            # Read the pending rows so the connection can be used again
+            cursor.close()
+
+    def close(self):
+        """ Close the idle connections """
+        self._check_pid()
+        self._lock.acquire()
+        try:
+            for (conn, last_use) in self._idle:
+                self._close(conn)
+            self.stats["open"] -= len(self._idle)
+            self._idle = []
+        finally:
+            self._lock.release()
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats["idle"] = len(self._idle)
+        return stats
+
+# Pools by connection params, shared by all data sources
+_pools = {}
+# Connections inherited from a parent process. They are kept referenced
+# but never used: closing them would close the parent session.
+_inherited_conns = []
+
+def get_pool(user=None, password=None, database=None,
+             host="127.0.0.1", port=3306, group=None):
+    key = (user, password, database, host, port, group)
+    if key not in _pools:
+        _pools[key] = ConnectionPool(user, password, database, host, port, group)
+    return _pools[key]
+
+def set_max_size(max_size):
+    """ Max number of connections of each pool """
+    ConnectionPool.default_max_size = max_size
+    for pool in _pools.values():
+        pool.max_size = max_size
+
+def reset_pools():
+    """ Forget all connections, i.e. those inherited after a fork """
+    for pool in _pools.values():
+        _inherited_conns.extend([conn for (conn, last) in pool._idle])
+        _inherited_conns.extend(pool._owners.keys())
+        pool._reset()
+
+def get_stats():
+    """ Statistics of all pools by database """
+    stats = {}
+    for pool in _pools.values():
+        database = str(pool.params['database'])
+        pool_stats = pool.get_stats()
+        if database in stats:
+            for key in pool_stats: stats[database][key] += pool_stats[key]
+        else:
+            stats[database] = pool_stats
+    return stats
+
+def log_stats(title):
+    for (database, stats) in sorted(get_stats().items()):
+        logging.info(title + " connections to %s open: %i in use: %i idle: %i "
+                     "checkouts: %i waits: %i wait time: %.2fs reconnects: %i" %
+                     (database, stats["open"], stats["in_use"], stats["idle"],
+                      stats["checkouts"], stats["waits"], stats["wait_time"],
+                      stats["reconnects"]))
@@ -0,0 +1,81 @@
+## Copyright (C) 2014 Bitergia
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 3 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+##
+## This file is a part of GrimoireLib
+##  (an Python library for the MetricsGrimoire and vizGrimoire systems)
+
+""" Statistics of values by group for the "time to" metrics
+
+    Values are sorted once by group (i.e. item and month) and by value,
+    so the count, mean, median and percentiles of all the groups are
+    computed with array operations instead of scanning the values of each
+    group. Groups are the integer codes of ResultSet.codes or month ids.
+"""
+
+import numpy
+
+def get_month_ids(dates):
+    """ year*12+month of each date of a datetime64 array, as the month
+        ids used in the time series. NULL dates get negative ids. """
+    dates = numpy.asarray(dates).astype("datetime64[M]")
+    months = dates.astype(numpy.int64) + 1970 * 12 + 1
+    months[numpy.isnat(dates)] = -1
+    return months
+
+def _get_percentile(values, starts, counts, percentile):
+    # Linear interpolation between the closest ranks, like numpy.percentile
+    position = (counts - 1) * (percentile / 100.0)
+    low = numpy.floor(position).astype(numpy.int64)
+    high = numpy.ceil(position).astype(numpy.int64)
+    low_values = values[starts + low]
+    return low_values + (values[starts + high] - low_values) * (position - low)
+
+def get_grouped_stats(keys, values, percentiles = []):
+    """ Statistics of values grouped by keys, a list of integer arrays
+        (no keys is a single group). Rows with NaN values or negative keys
+        are ignored. Returns a dict with the keys of each group, ordered
+        by them, and the count, mean, median and percentile<N> arrays. """
+    values = numpy.asarray(values, dtype=numpy.float64)
+    keys = [numpy.asarray(key) for key in keys]
+    valid = ~numpy.isnan(values)
+    for key in keys:
+        valid &= key >= 0
+    values = values[valid]
+    keys = [key[valid] for key in keys]
+
+    # Sorted by the first key, then by the next ones and then by value
+    order = numpy.lexsort([values] + keys[::-1])
+    values = values[order]
+    keys = [key[order] for key in keys]
+
+    changes = numpy.zeros(len(values), dtype=bool)
+    if len(values) > 0: changes[0] = True
+    for key in keys:
+        changes[1:] |= key[1:] != key[:-1]
+    starts = numpy.flatnonzero(changes)
+    counts = numpy.diff(numpy.append(starts, len(values)))
+
+    stats = {"keys": [key[starts] for key in keys], "count": counts}
+    if len(starts) == 0:
+        sums = numpy.array([], dtype=numpy.float64)
+    else:
+        sums = numpy.add.reduceat(values, starts)
+    stats["mean"] = sums / counts
+    stats["median"] = _get_percentile(values, starts, counts, 50)
+    for percentile in percentiles:
+        stats["percentile" + str(percentile)] = \
+            _get_percentile(values, starts, counts, percentile)
+    return stats
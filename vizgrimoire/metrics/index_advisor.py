@@ -0,0 +1,134 @@
+## Copyright (C) 2014 Bitergia
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 3 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+##
+## This file is a part of GrimoireLib
+##  (an Python library for the MetricsGrimoire and vizGrimoire systems)
+
+""" Indexes for the queries of the metrics
+
+    The indexes of each data source are in the indexes attribute of its
+    query builder: (table, columns) with the columns used to filter the
+    events by date and to join them with the identities. They are created
+    only if there is no index starting with the same columns.
+
+    IndexAdvisor collects the SQL of the metrics of a data source, finds
+    the full table scans with EXPLAIN and times the queries.
+"""
+
+import logging
+import time
+
+import MySQLdb
+
+def get_index_name(table, columns):
+    return "grimoire_" + "_".join([table.split(".")[-1]] + columns)
+
+def get_table_indexes(db, table):
+    """ Columns of each index of table, by index name """
+    indexes = {}
+    cursor = db._get_pool().execute("SHOW INDEX FROM " + table)
+    names = [column[0] for column in cursor.description]
+    for row in cursor.fetchall():
+        row = dict(zip(names, row))
+        columns = indexes.setdefault(row['Key_name'], [])
+        columns.append((row['Seq_in_index'], row['Column_name']))
+    for name in indexes:
+        indexes[name] = [column for (seq, column) in sorted(indexes[name])]
+    return indexes
+
+def has_index(db, table, columns):
+    """ Whether table has an index starting with columns """
+    for index in get_table_indexes(db, table).values():
+        if index[0:len(columns)] == columns: return True
+    return False
+
+def create_indexes(db, indexes):
+    """ Create the indexes (table, columns) that do not exist yet.
+        Returns the names of the created indexes. """
+    created = []
+    for (table, columns) in indexes:
+        name = get_index_name(table, columns)
+        try:
+            if has_index(db, table, columns): continue
+            logging.info("Creating index %s on %s" % (name, table))
+            db._get_pool().execute("CREATE INDEX %s ON %s (%s)" %
+                                   (name, table, ", ".join(columns)))
+            created.append(name)
+        except MySQLdb.Error, e:
+            # Missing tables in old databases, no privileges ...
+            logging.warning("Index %s not created: %s" % (name, e))
+    return created
+
+def explain(db, sql):
+    """ Rows of the EXPLAIN of sql as dicts """
+    cursor = db._get_pool().execute("EXPLAIN " + sql)
+    names = [column[0] for column in cursor.description]
+    return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+def get_full_scans(plan):
+    """ Tables (aliases) read completely in the EXPLAIN rows of a query,
+        and the estimated number of rows read """
+    scans = []
+    for row in plan:
+        if row.get('type') != 'ALL': continue
+        table = row.get('table')
+        # Derived and temporary tables can not have indexes
+        if table is None or table.startswith("<"): continue
+        scans.append((table, row.get('rows')))
+    return scans
+
+class IndexAdvisor(object):
+    """ Full table scans and execution times of the queries of metrics """
+
+    def __init__(self):
+        self.queries = [] # (metric id, sql, query builder)
+
+    def add_metrics(self, metrics_set):
+        """ Collect the aggregated and evolutionary SQL of the metrics """
+        for metric in metrics_set:
+            for evolutionary in [False, True]:
+                try:
+                    sql = metric._get_sql(evolutionary)
+                except Exception:
+                    # Metrics not defined with a single query
+                    continue
+                if not isinstance(sql, basestring) or sql.strip() == "": continue
+                self.queries.append((metric.id, sql, metric.db))
+
+    def get_full_scans(self):
+        """ Full table scans of each query: [(metric id, [(table, rows)])] """
+        report = []
+        for (metric_id, sql, db) in self.queries:
+            try:
+                scans = get_full_scans(explain(db, sql))
+            except MySQLdb.Error, e:
+                logging.warning("Can not explain %s: %s" % (metric_id, e))
+                continue
+            if len(scans) > 0: report.append((metric_id, scans))
+        return report
+
+    def get_times(self):
+        """ Execution time of the queries of each metric, in seconds """
+        times = {}
+        for (metric_id, sql, db) in self.queries:
+            start = time.time()
+            try:
+                db._get_pool().execute(sql).fetchall()
+            except MySQLdb.Error, e:
+                logging.warning("Can not execute %s: %s" % (metric_id, e))
+                continue
+            times[metric_id] = times.get(metric_id, 0) + time.time() - start
+        return times
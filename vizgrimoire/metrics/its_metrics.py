@@ -44,6 +44,7 @@ class Opened(Metrics):
     desc = "Number of opened tickets"
     envision =  {"y_labels" : "true", "show_markers" : "true"}
     data_source = ITS
+    additive = True
 
     def _get_sql(self, evolutionary):
         fields = Set([])
@@ -29,7 +29,8 @@ import MySQLdb
 from numpy import median, average
 from sets import Set
 
-from vizgrimoire.GrimoireUtils import completePeriodIds, checkListArray, medianAndAvgByPeriod, removeDecimals
+from vizgrimoire.GrimoireUtils import completePeriodIds, medianAndAvgByPeriod, removeDecimals
+from vizgrimoire.metrics.grouped_stats import get_grouped_stats
 from vizgrimoire.metrics.metrics import Metrics
 from vizgrimoire.metrics.metrics_filter import MetricFilters
 from vizgrimoire.SCR import SCR
@@ -43,6 +44,16 @@ class TimeToReviewPendingSCR(Metrics):
     desc = "Total time to review for pending reviews"
     data_source = SCR
 
+    def _get_items_stats(self, data, id_field, column):
+        """ Median, average and number of values of column by item """
+        codes, items = data.codes(id_field)
+        stats = get_grouped_stats([codes], data[column])
+        items_stats = {}
+        for (i, code) in enumerate(stats["keys"][0].tolist()):
+            items_stats[items[code]] = (stats["median"][i], stats["mean"][i],
+                                        int(stats["count"][i]))
+        return items_stats
+
     def _get_agg_all(self):
         # All items data is returned together
 
@@ -72,100 +83,39 @@ class TimeToReviewPendingSCR(Metrics):
                    }
 
         q = self.db.GetTimeToReviewPendingQuerySQL(self.filters, identities_db, bots)
-        ttr_data = self.db.ExecuteQuery(q)
-        checkListArray(ttr_data)
+        ttr_data = self.db.ExecuteQueryArrays(q)
 
         q = self.db.GetTimeToReviewPendingQuerySQL(self.filters, identities_db, bots, reviewers_pending)
-        ttr_reviewers_data = self.db.ExecuteQuery(q)
-        checkListArray(ttr_reviewers_data)
+        ttr_reviewers_data = self.db.ExecuteQueryArrays(q)
 
         q = self.db.GetTimeToReviewPendingQuerySQL (self.filters, identities_db, bots, False, True)
-        ttr_upload_data = self.db.ExecuteQuery(q)
-        checkListArray(ttr_upload_data)
+        ttr_upload_data = self.db.ExecuteQueryArrays(q)
 
         # This query is really slow.
         q = self.db.GetTimeToReviewPendingQuerySQL (self.filters, identities_db, bots, reviewers_pending, True)
-        ttr_reviewers_upload_data = self.db.ExecuteQuery(q)
-        checkListArray(ttr_reviewers_upload_data)
-
-        all_items_ids = []
-        for items in [ttr_data,ttr_reviewers_data,ttr_upload_data,ttr_reviewers_upload_data]:
-            # Get the list of items and add them to the global list
-            all_items_ids = list(Set(items[id_field] + all_items_ids))
-
-        time_to['name'] = all_items_ids
-
-        # Review time
-        for item in time_to['name']:
-            data_item_revtime = []
-            # Get all values for the item
-            for i in range(0, len(ttr_data[id_field])):
-                if ttr_data[id_field][i] == item:
-                    data_item_revtime.append(ttr_data['revtime'][i])
-
-            if (len(data_item_revtime) == 0):
-                ttr_median = float("nan")
-                ttr_avg = float("nan")
-            else:
-                ttr_median = median(removeDecimals(data_item_revtime))
-                ttr_avg = average(removeDecimals(data_item_revtime))
-
-            time_to["review_time_pending_days_median"].append(ttr_median)
-            time_to["review_time_pending_days_avg"].append(ttr_avg)
-
-        # Review time for reviewers
-        for item in time_to['name']:
-            data_item_revtime = []
-            # Get all values for the item
-            for i in range(0, len(ttr_reviewers_data[id_field])):
-                if ttr_reviewers_data[id_field][i] == item:
-                    data_item_revtime.append(ttr_reviewers_data['revtime'][i])
-
-            if (len(data_item_revtime) == 0):
-                ttr_reviewers_median = float("nan")
-                ttr_reviewers_avg = float("nan")
-            else:
-                ttr_reviewers_median = median(removeDecimals(data_item_revtime))
-                ttr_reviewers_avg = average(removeDecimals(data_item_revtime))
+        ttr_reviewers_upload_data = self.db.ExecuteQueryArrays(q)
 
-            time_to["review_time_pending_ReviewsWaitingForReviewer_days_median"].append(ttr_reviewers_median)
-            time_to["review_time_pending_ReviewsWaitingForReviewer_days_avg"].append(ttr_reviewers_avg)
+        metrics_data = [("review_time_pending", ttr_data),
+                        ("review_time_pending_ReviewsWaitingForReviewer", ttr_reviewers_data),
+                        ("review_time_pending_upload", ttr_upload_data),
+                        ("review_time_pending_upload_ReviewsWaitingForReviewer", ttr_reviewers_upload_data)]
 
-        # Upload time
-        for item in time_to['name']:
-            data_item_revtime = []
-            # Get all values for the item
-            for i in range(0, len(ttr_upload_data[id_field])):
-                if ttr_upload_data[id_field][i] == item:
-                    data_item_revtime.append(ttr_upload_data['revtime'][i])
-
-            if (len(data_item_revtime) == 0):
-                ttr_median_upload = float("nan")
-                ttr_avg_upload = float("nan")
-            else:
-                ttr_median_upload = median(removeDecimals(data_item_revtime))
-                ttr_avg_upload = average(removeDecimals(data_item_revtime))
-
-            time_to["review_time_pending_upload_days_median"].append(ttr_median_upload)
-            time_to["review_time_pending_upload_days_avg"].append(ttr_median_upload)
-
-        # Upload time for reviewers
-        for item in time_to['name']:
-            data_item_revtime = []
-            # Get all values for the item
-            for i in range(0, len(ttr_reviewers_upload_data[id_field])):
-                if ttr_reviewers_upload_data[id_field][i] == item:
-                    data_item_revtime.append(ttr_reviewers_upload_data['revtime'][i])
-
-            if (len(data_item_revtime) == 0):
-                ttr_reviewers_median_upload = float("nan")
-                ttr_reviewers_avg_upload = float("nan")
-            else:
-                ttr_reviewers_median_upload = median(removeDecimals(data_item_revtime))
-                ttr_reviewers_avg_upload = average(removeDecimals(data_item_revtime))
-
-            time_to["review_time_pending_upload_ReviewsWaitingForReviewer_days_median"].append(ttr_reviewers_median_upload)
-            time_to["review_time_pending_upload_ReviewsWaitingForReviewer_days_avg"].append(ttr_reviewers_avg_upload)
+        all_items_ids = Set([])
+        for (metric, data) in metrics_data:
+            # Get the list of items and add them to the global list
+            all_items_ids.union_update(data.codes(id_field)[1])
+        time_to['name'] = list(all_items_ids)
+
+        for (metric, data) in metrics_data:
+            items_stats = self._get_items_stats(data, id_field, 'revtime')
+            for item in time_to['name']:
+                if item in items_stats:
+                    (ttr_median, ttr_avg, nreviews) = items_stats[item]
+                else:
+                    ttr_median = float("nan")
+                    ttr_avg = float("nan")
+                time_to[metric + "_days_median"].append(ttr_median)
+                time_to[metric + "_days_avg"].append(ttr_avg)
 
         # In SCR the item field name must be url for repository
         if self.filters.type_analysis[0] == 'repository':
@@ -191,9 +141,7 @@ class TimeToReviewPendingSCR(Metrics):
 
         # Review time
         q = self.db.GetTimeToReviewPendingQuerySQL(self.filters, identities_db, bots)
-        data = self.db.ExecuteQuery(q)
-        data = data['revtime']
-        if (isinstance(data, list) == False): data = [data]
+        data = self.db.ExecuteQueryColumns(q, ["revtime"])["revtime"]
         if (len(data) == 0):
             ttr_median = float("nan")
             ttr_avg = float("nan")
@@ -203,9 +151,7 @@ class TimeToReviewPendingSCR(Metrics):
 
         # Review time for reviewers
         q = self.db.GetTimeToReviewPendingQuerySQL(self.filters, identities_db, bots, reviewers_pending)
-        data = self.db.ExecuteQuery(q)
-        data = data['revtime']
-        if (isinstance(data, list) == False): data = [data]
+        data = self.db.ExecuteQueryColumns(q, ["revtime"])["revtime"]
         if (len(data) == 0):
             ttr_reviewers_median = float("nan")
             ttr_reviewers_avg = float("nan")
@@ -215,9 +161,7 @@ class TimeToReviewPendingSCR(Metrics):
 
         # Upload time
         q = self.db.GetTimeToReviewPendingQuerySQL (self.filters, identities_db, bots, False, True)
-        data = self.db.ExecuteQuery(q)
-        data = data['revtime']
-        if (isinstance(data, list) == False): data = [data]
+        data = self.db.ExecuteQueryColumns(q, ["revtime"])["revtime"]
         if (len(data) == 0):
             ttr_median_upload = float("nan")
             ttr_avg_upload = float("nan")
@@ -228,9 +172,7 @@ class TimeToReviewPendingSCR(Metrics):
 
         # Upload time for reviewers
         q = self.db.GetTimeToReviewPendingQuerySQL (self.filters, identities_db, bots, reviewers_pending, True)
-        data = self.db.ExecuteQuery(q)
-        data = data['revtime']
-        if (isinstance(data, list) == False): data = [data]
+        data = self.db.ExecuteQueryColumns(q, ["revtime"])["revtime"]
         if (len(data) == 0):
             ttr_reviewers_median_upload = float("nan")
             ttr_reviewers_avg_upload = float("nan")
@@ -375,85 +317,59 @@ class TimeToReviewPendingSCR(Metrics):
 
             for i in range(0, months+1):
                 # First get all data from SQL
-                newtime = self.db.ExecuteQuery(get_sql(start_month+i))
-                uploadtime = self.db.ExecuteQuery(get_sql(start_month+i, False, True))
-                newtime_rev = self.db.ExecuteQuery(get_sql(start_month+i, True))
+                newtime = self.db.ExecuteQueryArrays(get_sql(start_month+i))
+                uploadtime = self.db.ExecuteQueryArrays(get_sql(start_month+i, False, True))
+                newtime_rev = self.db.ExecuteQueryArrays(get_sql(start_month+i, True))
                 # This is the slow query
-                uploadtime_rev = self.db.ExecuteQuery(get_sql(start_month+i, True, True))
+                uploadtime_rev = self.db.ExecuteQueryArrays(get_sql(start_month+i, True, True))
+                month_stats = [(self._get_items_stats(newtime, id_field, 'newtime'),
+                                'review_time_pending_reviews',
+                                'review_time_pending_days_acc_median'),
+                               (self._get_items_stats(uploadtime, id_field, 'uploadtime'),
+                                'review_time_pending_upload_reviews',
+                                'review_time_pending_upload_days_acc_median'),
+                               (self._get_items_stats(newtime_rev, id_field, 'newtime'),
+                                'review_time_pending_ReviewsWaitingForReviewer_reviews',
+                                'review_time_pending_ReviewsWaitingForReviewer_days_acc_median'),
+                               (self._get_items_stats(uploadtime_rev, id_field, 'uploadtime'),
+                                'review_time_pending_upload_ReviewsWaitingForReviewer_reviews',
+                                'review_time_pending_upload_ReviewsWaitingForReviewer_days_acc_median')]
                 # Build a common list for all items
-                all_items_month_ids = []
-                # for data_sql in [newtime, uploadtime, newtime_rev, uploadtime_rev]:
+                all_items_month_ids = Set([])
                 for data_sql in [newtime, uploadtime, newtime_rev, uploadtime_rev]:
-                    checkListArray(data_sql)
-                    all_items_month_ids = list(Set(data_sql[id_field]+all_items_month_ids))
+                    all_items_month_ids.union_update(data_sql.codes(id_field)[1])
+                all_items_month_ids = list(all_items_month_ids)
                 acc_pending_time_median_month["name"][i] = all_items_month_ids
 
                 # Now add the data in a common dict for all metrics in this month
-                # review time
-                for item in all_items_month_ids:
-                    data_item = []
-                    for j in range(0, len(newtime[id_field])):
-                        if newtime[id_field][j] == item:
-                            data_item.append(newtime['newtime'][j])
-                    values = get_values_median(data_item)
-                    # print start_month+i, "newtime", item, values
-                    nreviews = len(data_item)
-                    acc_pending_time_median_month['review_time_pending_reviews'][i].append(nreviews)
-                    acc_pending_time_median_month['review_time_pending_days_acc_median'][i].append(values)
-
-                # upload time
-                for item in all_items_month_ids:
-                    data_item = []
-                    for j in range(0, len(uploadtime[id_field])):
-                        if uploadtime[id_field][j] == item:
-                            data_item.append(uploadtime['uploadtime'][j])
-
-                    values = get_values_median(data_item)
-                    # print start_month+i, "upload", item, values
-                    nreviews = len(data_item)
-                    acc_pending_time_median_month['review_time_pending_upload_reviews'][i].append(nreviews)
-                    acc_pending_time_median_month['review_time_pending_upload_days_acc_median'][i].append(values)
-                # review time reviewers
-                for item in all_items_month_ids:
-                    # Now just for reviews waiting for Reviewer
-                    data_item = []
-                    for j in range(0, len(newtime_rev[id_field])):
-                        if newtime_rev[id_field][j] == item:
-                            data_item.append(newtime_rev['newtime'][j])
-                    values = get_values_median(data_item)
-                    nreviews = len(data_item)
-                    acc_pending_time_median_month['review_time_pending_ReviewsWaitingForReviewer_reviews'][i].append(nreviews)
-                    acc_pending_time_median_month['review_time_pending_ReviewsWaitingForReviewer_days_acc_median'][i].append(values)
-
-                # upload time reviewers
-                for item in all_items_month_ids:
-                    data_item = []
-                    for j in range(0, len(uploadtime_rev[id_field])):
-                        if uploadtime_rev[id_field][j] == item:
-                            data_item.append(uploadtime_rev['uploadtime'][j])
-                    values = get_values_median(data_item)
-                    nreviews = len(data_item)
-                    acc_pending_time_median_month['review_time_pending_upload_ReviewsWaitingForReviewer_reviews'][i].append(nreviews)
-                    acc_pending_time_median_month['review_time_pending_upload_ReviewsWaitingForReviewer_days_acc_median'][i].append(values)
+                for (items_stats, reviews_metric, median_metric) in month_stats:
+                    for item in all_items_month_ids:
+                        if item in items_stats:
+                            (values, avg, nreviews) = items_stats[item]
+                        else:
+                            values = float('nan')
+                            nreviews = 0
+                        acc_pending_time_median_month[reviews_metric][i].append(nreviews)
+                        acc_pending_time_median_month[median_metric][i].append(values)
 
             # Now we need to consolidate all names in a single list
             all_items = []
             for lnames in acc_pending_time_median_month['name']:
                 all_items = list(Set(lnames+all_items))
+            # Position of each item in the data of each month
+            items_month_pos = [dict([(item, k) for (k, item) in enumerate(lnames)])
+                               for lnames in acc_pending_time_median_month['name']]
             # And now time to create the final version that should be completePeriod
             for item in all_items:
                 # Add the ts for the item to the final dict
                 for i in range(0, months+1):
-                    mitems = acc_pending_time_median_month['name'][i]
-                    found_item = False
-                    for k in range(0, len(mitems)):
-                        if mitems[k] == item:
-                            # Found the item, get all metrics for this month
-                            found_item = True
-                            for metric in metrics:
-                                item_metric_month_value = acc_pending_time_median_month[metric][i][k]
-                                acc_pending_time_median[metric][i].append(item_metric_month_value)
-                    if not found_item:
+                    k = items_month_pos[i].get(item)
+                    if k is not None:
+                        # Found the item, get all metrics for this month
+                        for metric in metrics:
+                            item_metric_month_value = acc_pending_time_median_month[metric][i][k]
+                            acc_pending_time_median[metric][i].append(item_metric_month_value)
+                    else:
                         for metric in metrics:
                             # 0 reviews, 0 review time
                             acc_pending_time_median[metric][i].append(0)
@@ -530,32 +446,28 @@ class TimeToReviewPendingSCR(Metrics):
         for i in range(0, months+1):
             acc_pending_time_median['month'].append(start_month+i)
 
-            reviews = self.db.ExecuteQuery(get_sql(start_month+i))
+            reviews = self.db.ExecuteQueryColumns(get_sql(start_month+i), ["newtime"])
             values = get_values_median(reviews['newtime'])
-            if isinstance(reviews['newtime'], list): nreviews = len(reviews['newtime'])
-            else: nreviews = 1 # sure 1?
+            nreviews = len(reviews['newtime'])
             acc_pending_time_median['review_time_pending_reviews'].append(nreviews)
             acc_pending_time_median['review_time_pending_days_acc_median'].append(values)
             # upload time
-            reviews = self.db.ExecuteQuery(get_sql(start_month+i, False, True))
+            reviews = self.db.ExecuteQueryColumns(get_sql(start_month+i, False, True), ["uploadtime"])
             values = get_values_median(reviews['uploadtime'])
-            if isinstance(reviews['uploadtime'], list): nreviews = len(reviews['uploadtime'])
-            else: nreviews = 1
+            nreviews = len(reviews['uploadtime'])
             acc_pending_time_median['review_time_pending_upload_reviews'].append(nreviews)
             acc_pending_time_median['review_time_pending_upload_days_acc_median'].append(values)
 
             # Now just for reviews waiting for Reviewer
-            reviews = self.db.ExecuteQuery(get_sql(start_month+i, True))
+            reviews = self.db.ExecuteQueryColumns(get_sql(start_month+i, True), ["newtime"])
             values = get_values_median(reviews['newtime'])
-            if isinstance(reviews['newtime'], list): nreviews = len(reviews['newtime'])
-            else: nreviews = 1
+            nreviews = len(reviews['newtime'])
             acc_pending_time_median['review_time_pending_ReviewsWaitingForReviewer_reviews'].append(nreviews)
             acc_pending_time_median['review_time_pending_ReviewsWaitingForReviewer_days_acc_median'].append(values)
 
-            reviews = self.db.ExecuteQuery(get_sql(start_month+i, True, True))
+            reviews = self.db.ExecuteQueryColumns(get_sql(start_month+i, True, True), ["uploadtime"])
             values = get_values_median(reviews['uploadtime'])
-            if isinstance(reviews['uploadtime'], list): nreviews = len(reviews['uploadtime'])
-            else: nreviews = 1
+            nreviews = len(reviews['uploadtime'])
             acc_pending_time_median['review_time_pending_upload_ReviewsWaitingForReviewer_reviews'].append(nreviews)
             acc_pending_time_median['review_time_pending_upload_ReviewsWaitingForReviewer_days_acc_median'].append(values)
 
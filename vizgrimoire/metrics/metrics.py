@@ -25,7 +25,8 @@
 
 import logging
 
-from vizgrimoire.GrimoireUtils import completePeriodIds, GetDates, GetPercentageDiff, check_array_values
+from vizgrimoire.GrimoireUtils import completePeriodIds, GetDates, GetPercentageDiff, check_array_values, \
+    fill_and_order_items
 from vizgrimoire.metrics.query_builder import DSQuery
 from vizgrimoire.metrics.metrics_filter import MetricFilters
 
@@ -51,9 +52,13 @@ class Metrics(object):
     name = None
     desc = None
     data_source = None
+    # The aggregated value is the sum of the time series values
+    additive = False
     domains_limit = 30
     max_decimals = 2
     min_item_per_tag = 20
+    # Metrics not supported in GROUP BY (all items) trends
+    trends_all_items_not_supported = ['bmitickets']
 
     def __init__(self, dbcon = None, filters = None):
         """db connection and filter to be used"""
@@ -234,6 +239,39 @@ class Metrics(object):
         self.filters = filters
         return (data)
 
+    def get_trends_windows(self, date, windows, items = None):
+        """ Returns the trend metrics for several windows of days. In GROUP
+            BY (all items) queries the values of each window are ordered
+            like items (by default, the items of all windows) """
+        from vizgrimoire.metrics.query_fusion import get_trends_single_pass
+
+        windows_data = None
+        if type(self).get_trends.im_func is Metrics.get_trends.im_func:
+            # All windows in one query when the metric SQL supports it
+            data = get_trends_single_pass(self, date, windows)
+            if data is not None: windows_data = [data]
+        if windows_data is None:
+            windows_data = [self.get_trends(date, days) for days in windows]
+
+        type_analysis = self.filters.type_analysis
+        if type_analysis and type_analysis[1] is None:
+            # Each window has its own order of items
+            group_field = self.db.get_group_field(type_analysis[0])
+            if 'CONCAT' not in group_field:
+                group_field = group_field.split('.')[1] # remove table name
+            if items is None:
+                items = []
+                for window_data in windows_data:
+                    for item in window_data.get(group_field, []):
+                        if item not in items: items.append(item)
+            windows_data = [fill_and_order_items(items, window_data, group_field)
+                            for window_data in windows_data]
+
+        data = {}
+        for window_data in windows_data:
+            data = dict(data.items() + window_data.items())
+        return data
+
     def _get_trends_all_items(self, date, days):
         """ Returns the trend metrics between now and now-days values """
         from vizgrimoire.GrimoireUtils import check_array_values
@@ -241,10 +279,7 @@ class Metrics(object):
         # Keeping state of origin filters
         filters = self.filters
 
-        # metrics not supported in group_by queries
-        metrics_not_supported = ['bmitickets']
-
-        if self.id in metrics_not_supported:
+        if self.id in Metrics.trends_all_items_not_supported:
             logging.warning(self.id + " not supported in GROUP BY queries.")
             return {}
 
@@ -26,8 +26,6 @@
 
 import logging
 
-from datetime import datetime
-
 from vizgrimoire.data_source import DataSource
 from vizgrimoire.GrimoireUtils import completePeriodIds, GetDates, GetPercentageDiff
 from vizgrimoire.filter import Filter
@@ -100,6 +98,7 @@ class EmailsSent(Metrics):
     name = "Emails Sent"
     desc = "Emails sent to mailing lists"
     data_source = MLS
+    additive = True
 
     def _get_sql(self, evolutionary):
         fields = Set([])
@@ -711,24 +710,17 @@ class UnansweredPosts(Metrics):
     desc = "Unanswered posts in mailing lists"""
     data_source = MLS
 
-    def __get_date_from_month(self, monthid):
-        # month format: year*12+month
-        year = (monthid-1) / 12
-        month = monthid - year*12
-        day = 1
-        current = str(year) + "-" + str(month) + "-" + str(day)
-        return (current)
-
-    def __get_messages(self, from_date, to_date):
-        fields = Set([])
+    def __get_messages(self, grouped):
+        """ Messages in the period ordered by date with their month and,
+            when grouped, their mailing list """
         tables = Set([])
         filters = Set([])
 
-        fields.add("m.message_ID as message_ID")
-        fields.add("m.is_response_of as is_response_of")
+        fields = "m.message_ID, m.is_response_of, "
+        fields += "YEAR(m.first_date)*12+MONTH(m.first_date) AS month"
+        if grouped:
+            fields += ", " + self.db.get_group_field(self.filters.type_analysis[0])
         tables.add("messages m")
-        filters.add("m.first_date >= '" + str(from_date) + "' ") 
-        filters.add("m.first_date < '" + str(to_date) + "' ")
         filters.add("m.first_date >= " + str(self.filters.startdate))
         filters.add("m.first_date < " + str(self.filters.enddate))
 
@@ -736,7 +728,7 @@ class UnansweredPosts(Metrics):
             tables.union_update(self.db.GetSQLReportFrom(self.filters))
             filters.union_update(self.db.GetSQLReportWhere(self.filters))
 
-        select_str = "select " + self.db._get_fields_query(fields)
+        select_str = "select " + fields
         from_str = " from " + self.db._get_tables_query(tables)
         where_str = " where " + self.db._get_filters_query(filters)
 
@@ -744,21 +736,15 @@ class UnansweredPosts(Metrics):
 
         query = select_str + from_str + where_str
 
-        results = self.db.ExecuteQuery(query)
-
-        if isinstance(results['message_ID'], list):
-            return [(results['message_ID'][i], results['is_response_of'][i])\
-                    for i in range(len(results['message_ID']))]
-        else:
-            return [(results['message_ID'], results['is_response_of'])]
+        return self.db.ExecuteQueryIter(query)
 
     def get_agg(self):
         return {}
 
     def get_ts(self):
-        # Get all posts for each month and determine which from those
-        # are still unanswered. Returns the number of unanswered
-        # posts on each month.
+        # Get all posts and determine which from those are still
+        # unanswered at the end of their month. Returns the number of
+        # unanswered posts on each month, for each mailing list if grouped.
         period = self.filters.period
 
         if (self.filters.type_analysis and self.filters.type_analysis[0] not in ("repository")):
@@ -768,39 +754,56 @@ class UnansweredPosts(Metrics):
             logging.error("Period not supported in " + self.id + " " + period)
             return None
 
-        startdate = self.filters.startdate
-        enddate = self.filters.enddate
-
-        start = datetime.strptime(startdate, "'%Y-%m-%d'")
-        end = datetime.strptime(enddate, "'%Y-%m-%d'")
-
-        start_month = (start.year * 12 + start.month) - 1
-        end_month = (end.year * 12 + end.month) - 1
-        months = end_month - start_month + 2
-        num_unanswered = {'month' : [],
-                          'unanswered_posts' : []}
-
-        for i in range(0, months):
-            unanswered = []
-            current_month = start_month + i
-            from_date = self.__get_date_from_month(current_month)
-            to_date = self.__get_date_from_month(current_month + 1)
-            messages = self.__get_messages(from_date, to_date)
-
-            for message in messages:
-                message_id = message[0]
-                response_of = message[1]
-
-                if response_of is None:
-                    unanswered.append(message_id)
-                    continue
-
-                if response_of in unanswered:
-                    unanswered.remove(response_of)
-
-            num_unanswered['month'].append(current_month)
-            num_unanswered['unanswered_posts'].append(len(unanswered))
-
-        return completePeriodIds(num_unanswered, self.filters.period,
-                                 self.filters.startdate, self.filters.enddate)
+        grouped = self.filters.type_analysis and self.filters.type_analysis[1] is None
+
+        def close_month(state):
+            if state["month"] is None: return
+            state["ts"]["month"].append(state["month"])
+            state["ts"]["unanswered_posts"].append(state["unanswered"])
+
+        # Messages are read once ordered by date. Each mailing list keeps
+        # the roots posted in its current month not answered yet.
+        states = {}
+        for row in self.__get_messages(grouped):
+            (message_id, response_of, month) = (row[0], row[1], int(row[2]))
+            item = None
+            if grouped: item = row[3]
+            state = states.get(item)
+            if state is None:
+                state = {"month": None, "roots": {}, "unanswered": 0,
+                         "ts": {"month": [], "unanswered_posts": []}}
+                states[item] = state
+
+            if month != state["month"]:
+                # Only replies in the same month answer a post
+                close_month(state)
+                state["month"] = month
+                state["roots"] = {}
+                state["unanswered"] = 0
+
+            roots = state["roots"]
+            if response_of is None:
+                roots[message_id] = roots.get(message_id, 0) + 1
+                state["unanswered"] += 1
+            elif roots.get(response_of, 0) > 0:
+                roots[response_of] -= 1
+                state["unanswered"] -= 1
+
+        for state in states.values():
+            close_month(state)
+
+        if not grouped:
+            num_unanswered = {'month' : [], 'unanswered_posts' : []}
+            if None in states: num_unanswered = states[None]["ts"]
+            return completePeriodIds(num_unanswered, self.filters.period,
+                                     self.filters.startdate, self.filters.enddate)
+
+        id_field = self.db.get_group_field(self.filters.type_analysis[0])
+        id_field = id_field.split('.')[1] # remove table name
+        items = states.keys()
+        num_unanswered = {id_field : items,
+                          'month' : [states[item]["ts"]["month"] for item in items],
+                          'unanswered_posts' : [states[item]["ts"]["unanswered_posts"] for item in items]}
+        return Metrics._complete_period_ids_items(num_unanswered, id_field, self.filters.period,
+                                                  self.filters.startdate, self.filters.enddate)
 
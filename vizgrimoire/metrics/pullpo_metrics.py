@@ -37,7 +37,6 @@ from vizgrimoire.metrics.metrics import Metrics
 from vizgrimoire.metrics.metrics_filter import MetricFilters
 from vizgrimoire.Pullpo import Pullpo
 from vizgrimoire.metrics.query_builder import PullpoQuery
-from vizgrimoire.datahandlers.data_handler import DHESA
 
 class Submitted(Metrics):
     id = "submitted"
@@ -21,22 +21,43 @@
 ##   Daniel Izquierdo-Cortazar <dizquierdo@bitergia.com>
 ##   Alvaro del Castillo <acs@bitergia.com>
 
+import hashlib
 import logging
 import MySQLdb
+import MySQLdb.cursors
 import re
 import sys
 from sets import Set
 import datetime
 import time
 
+from vizgrimoire.metrics import connection_pool
+from vizgrimoire.metrics import index_advisor
+from vizgrimoire.metrics import query_profile
 from vizgrimoire.metrics.metrics_filter import MetricFilters
+from vizgrimoire.metrics.query_cache import QueryCache
+from vizgrimoire.metrics.rollups import SCMRollup, IssuesRollup, MLSRollup
 from vizgrimoire.GrimoireUtils import genDates
-from vizgrimoire.datahandlers.data_handler import DHESA
 
 class DSQuery(object):
     """ Generic methods to control access to db """
 
-    db_conn_pool = {} # one connection per database
+    _query_cache = None # QueryCache shared by all data sources
+    _cache_fingerprints = {} # data source contents fingerprint per database
+    # Tables, and their date (or auto increment id) field, whose max value
+    # and number of rows are checked to invalidate the cached results of a
+    # data source, along with the checksum of the identities tables
+    cache_check_tables = []
+    # Query builder classes and databases whose indexes are already created
+    _indexed = Set([])
+    # Indexes (table, columns) created by create_indexes, if enabled
+    indexes = []
+    identities_indexes = [("enrollments", ["uuid", "organization_id"])]
+    _create_indexes = False
+    # Daily activity rollups used instead of the events tables, if enabled
+    rollups = []
+    _use_rollups = False
+    _rollups_updated = {} # rollups ready per query builder class and database
 
     def __init__(self, user, password, database,
                  identities_db = None, projects_db = None,
@@ -49,21 +70,46 @@ class DSQuery(object):
         self.host = host
         self.port = port
         self.group = group
-        if database in DSQuery.db_conn_pool:
-            db = DSQuery.db_conn_pool[database]
-        else:
-            db = self.__SetDBChannel__(user, password, database, host, port, group)
-            DSQuery.db_conn_pool[database] = db
-        self.cursor = db.cursor()
-        self.cursor.execute("SET NAMES 'utf8'")
+        # Connected when the first query is executed
+        self._pool = None
+
+    def _get_pool(self):
+        if self._pool is None:
+            # Connections are shared with all DSQuery using the same database
+            self._pool = connection_pool.get_pool(self.user, self.password, self.database,
+                                                  self.host, self.port, self.group)
+        indexed = (type(self), self.database)
+        if indexed not in DSQuery._indexed:
+            DSQuery._indexed.add(indexed)
+            self.create_indexes()
+        return self._pool
+
+    def reconnect(self):
+        """ Get a connection owned by the current process """
+        self._pool = None
 
-        db = self.__SetDBChannel__(user, password, database, host, port, group)
+    @staticmethod
+    def reset_connections():
+        """ Forget all connections, i.e. those inherited after a fork """
+        connection_pool.reset_pools()
 
-        self.create_indexes()
+    @staticmethod
+    def set_create_indexes(create):
+        """ Create the missing indexes of each data source when connecting """
+        DSQuery._create_indexes = create
+
+    def get_indexes(self):
+        """ Indexes of the data source and identities tables it uses """
+        indexes = list(self.indexes)
+        if self.identities_db is not None and len(self.indexes) > 0:
+            indexes += [(self.identities_db + "." + table, columns)
+                        for (table, columns) in self.identities_indexes]
+        return indexes
 
     def create_indexes(self):
         """ Basic indexes used in each data source """
-        pass
+        if not DSQuery._create_indexes: return
+        index_advisor.create_indexes(self, self.get_indexes())
 
     @classmethod
     def GetSQLGlobal(cls, date, fields, tables, filters, start, end, all_items = None):
@@ -190,6 +236,10 @@ class DSQuery(object):
             # Special case where query fields are sets.
             # TODO: The "if" should be removed after the migration given that
             # all of the queries will use this.
+            if DSQuery._use_rollups and self.get_all_items(type_analysis) is None:
+                query = self._get_rollup_query(startdate, enddate, date_field,
+                                               fields, tables, filters)
+                if query is not None: (date_field, fields, tables, filters) = query
             fields = self._get_fields_query(fields)
             tables = self._get_tables_query(tables)
             filters = self._get_filters_query(filters)
@@ -205,39 +255,163 @@ class DSQuery(object):
                                   startdate, enddate, all_items)
         return(q)
 
-    def __SetDBChannel__ (self, user=None, password=None, database=None,
-                      host="127.0.0.1", port=3306, group=None):
-        if (group == None):
-            db = MySQLdb.connect(user=user, passwd=password,
-                                 db=database, host=host, port=port)
-        else:
-            db = MySQLdb.connect(read_default_group=group, db=database)
+    @staticmethod
+    def set_use_rollups(use):
+        """ Use the daily activity rollups in the queries they can answer """
+        DSQuery._use_rollups = use
+
+    def _get_rollups(self):
+        """ Rollups of the data source, updated the first time they are used """
+        key = (type(self), self.database)
+        if key not in DSQuery._rollups_updated:
+            DSQuery._rollups_updated[key] = [rollup for rollup in self.rollups
+                                             if rollup.update(self)]
+        return DSQuery._rollups_updated[key]
+
+    def _get_rollup_query(self, startdate, enddate, date_field, fields, tables, filters):
+        """ date field, fields, tables and filters of an equivalent query
+            using a rollup, or None """
+        # Rollups have days: the limits of the periods must be days
+        day_re = re.compile("^'[0-9]{4}-[0-9]{2}-[0-9]{2}'$")
+        if not day_re.match(startdate) or not day_re.match(enddate): return None
+        if len(self.rollups) == 0: return None
+        for rollup in self._get_rollups():
+            query = rollup.get_query(date_field, fields, tables, filters)
+            if query is not None: return query
+        return None
+
+    @staticmethod
+    def set_query_cache(cache):
+        """ Set the QueryCache to be used by ExecuteQuery. None disables it """
+        DSQuery._query_cache = cache
 
-        return db
+    @staticmethod
+    def get_query_cache():
+        return DSQuery._query_cache
+
+    def _get_cache_fingerprint(self):
+        """ Fingerprint of the data source contents using max(date) and
+            the number of rows of its main tables and the checksum of the
+            identities ones """
+        if self.database in DSQuery._cache_fingerprints:
+            return DSQuery._cache_fingerprints[self.database]
+
+        fingerprint = None
+        if len(self.cache_check_tables) > 0:
+            checks = ["SELECT MAX(%s), COUNT(*) FROM %s" % (date, table)
+                      for (table, date) in self.cache_check_tables]
+            # Row counts miss the updated identities and affiliations
+            checks.append("CHECKSUM TABLE people_uidentities")
+            if self.identities_db is not None:
+                checks.append("CHECKSUM TABLE %s.enrollments" % (self.identities_db))
+                checks.append("CHECKSUM TABLE %s.uidentities" % (self.identities_db))
+            try:
+                values = []
+                for q in checks:
+                    values.append(self._get_pool().execute(q).fetchall())
+                fingerprint = hashlib.sha1(repr(values)).hexdigest()
+            except MySQLdb.Error, e:
+                logging.warning("Query cache disabled for %s: %s" % (self.database, e))
+        DSQuery._cache_fingerprints[self.database] = fingerprint
+        return fingerprint
 
     def ExecuteQuery (self, sql):
         if sql is None: return {}
+        cache = DSQuery._query_cache
+        if cache is None:
+            return self._execute_query(sql)
+        if not QueryCache.is_cacheable(sql):
+            # The data source could be modified: check its contents again
+            DSQuery._cache_fingerprints.pop(self.database, None)
+            return self._execute_query(sql)
+
+        fingerprint = self._get_cache_fingerprint()
+        if fingerprint is None:
+            return self._execute_query(sql)
+        start = time.time()
+        result = cache.get(self.database, sql, fingerprint)
+        if result is None:
+            result = self._execute_query(sql)
+            cache.put(self.database, sql, fingerprint, result)
+        elif query_profile.is_enabled():
+            query_profile.record(sql, time.time() - start, result,
+                                 type(self).__name__, cached = True)
+        return result
+
+    def _execute_query (self, sql):
+        if not query_profile.is_enabled(): return self._fetch_result(sql)
+        start = time.time()
+        result = self._fetch_result(sql)
+        query_profile.record(sql, time.time() - start, result, type(self).__name__)
+        return result
+
+    def _fetch_result (self, sql):
         result = {}
-        self.cursor.execute(sql)
-        rows = self.cursor.rowcount
-        columns = self.cursor.description
+        cursor = self._get_pool().execute(sql)
+        rows = cursor.rowcount
+        columns = cursor.description
 
         if columns is None: return result
 
         for column in columns:
             result[column[0]] = []
         if rows > 1:
-            for value in self.cursor.fetchall():
+            for value in cursor.fetchall():
                 for (index,column) in enumerate(value):
                     result[columns[index][0]].append(column)
         elif rows == 1:
-            value = self.cursor.fetchone()
+            value = cursor.fetchone()
             for i in range (0, len(columns)):
                 result[columns[i][0]] = value[i]
         return result
 
+    def ExecuteQueryIter(self, sql, batch_size = None):
+        """ Execute sql reading its rows from the server while iterating.
+            Rows are returned as tuples or, with batch_size, as dicts of
+            columns with up to batch_size rows. Results are not cached and
+            no other query can be executed until the iteration ends. """
+        return self._get_pool().execute_iter(sql, batch_size)
+
+    def ExecuteQueryArrays(self, sql):
+        """ Result of sql as a ResultSet with a NumPy array per column,
+            filled from a server side cursor. Results are not cached. """
+        # numpy is slow to import: only when needed
+        from vizgrimoire.metrics.result_set import ResultSet
+        cursor = self._get_pool().execute(sql, MySQLdb.cursors.SSCursor)
+        return ResultSet.from_cursor(cursor, connection_pool.ConnectionPool.fetch_size)
+
+    def ExecuteQueryColumns(self, sql, columns, group_column = None):
+        """ Values of some columns of sql as a dict of lists, or a dict of
+            them by the value of group_column. Rows are read in batches and
+            only the values of columns are kept. Decimals are converted to
+            float. """
+        from decimal import Decimal
+        result = {}
+        if group_column is None:
+            result = dict([(column, []) for column in columns])
+        for batch in self.ExecuteQueryIter(sql, connection_pool.ConnectionPool.fetch_size):
+            if group_column is None:
+                groups = [(result, range(0, len(batch[columns[0]])))]
+            else:
+                rows_group = {}
+                for (i, group) in enumerate(batch[group_column]):
+                    rows_group.setdefault(group, []).append(i)
+                groups = []
+                for (group, rows) in rows_group.items():
+                    if group not in result:
+                        result[group] = dict([(column, []) for column in columns])
+                    groups.append((result[group], rows))
+            for (values, rows) in groups:
+                for column in columns:
+                    batch_values = batch[column]
+                    for i in rows:
+                        value = batch_values[i]
+                        if isinstance(value, Decimal): value = float(value)
+                        values[column].append(value)
+        return result
+
     def ExecuteViewQuery(self, sql):
-        self.cursor.execute(sql)
+        self._get_pool().execute(sql)
 
     def get_subprojects(self, project):
         """ Return all subprojects ids for a project in a string join by comma """
@@ -271,13 +445,14 @@ class DSQuery(object):
     def get_group_field (ds_query, filter_type):
         """ Return the name of the field to group by in filter all queries """
         field = None
-        supported = ['people2','company','country','domain','project','repository','company'+MetricFilters.DELIMITER+'country']
+        supported = ['people2','uuid','company','country','domain','project','repository','company'+MetricFilters.DELIMITER+'country']
 
         analysis = filter_type
 
         if analysis not in supported:
             raise Exception("Can't get_group_field for " +  filter_type)
         if analysis == 'people2': field = "up.identifier"
+        elif analysis == 'uuid': field = "pup.uuid"
         elif analysis == "company": field = "org.name"
         elif analysis == "country": field = "cou.name"
         elif analysis == "domain": field = "d.name"
@@ -317,6 +492,15 @@ class DSQuery(object):
 class SCMQuery(DSQuery):
     """ Specific query builders for source code management system data source """
 
+    cache_check_tables = [("scmlog", "date"), ("actions", "id"), ("commits_lines", "id")]
+    rollups = [SCMRollup()]
+    indexes = [("scmlog", ["author_date", "author_id"]),
+               ("scmlog", ["author_id"]),
+               ("scmlog", ["repository_id"]),
+               ("actions", ["commit_id", "file_id"]),
+               ("commits_lines", ["commit_id"]),
+               ("people_uidentities", ["people_id", "uuid"])]
+
     def GetSQLRepositoriesFrom (self):
         #tables necessaries for repositories
         tables = Set([])
@@ -739,6 +923,16 @@ class SCMQuery(DSQuery):
 
 class ITSQuery(DSQuery):
     """ Specific query builders for issue tracking system data source """
+
+    cache_check_tables = [("issues", "submitted_on"), ("changes", "changed_on")]
+    rollups = [IssuesRollup()]
+    indexes = [("issues", ["submitted_on", "submitted_by"]),
+               ("issues", ["tracker_id"]),
+               ("changes", ["changed_on", "issue_id"]),
+               ("changes", ["issue_id"]),
+               ("changes", ["changed_by"]),
+               ("people_uidentities", ["people_id", "uuid"])]
+
     def GetSQLRepositoriesFrom (self):
         # tables necessary for repositories 
         tables = Set([])
@@ -1117,6 +1311,16 @@ class ITSQuery(DSQuery):
 
 class MLSQuery(DSQuery):
     """ Specific query builders for mailing lists data source """
+
+    cache_check_tables = [("messages", "first_date")]
+    rollups = [MLSRollup()]
+    indexes = [("messages", ["first_date"]),
+               ("messages", ["mailing_list_url"]),
+               ("messages", ["is_response_of"]),
+               ("messages_people", ["message_id"]),
+               ("messages_people", ["email_address"]),
+               ("people_uidentities", ["people_id", "uuid"])]
+
     def GetSQLRepositoriesFrom (self):
         # tables necessary for repositories
         #return (" messages m ") 
@@ -1450,6 +1654,10 @@ class MLSQuery(DSQuery):
 class SCRQuery(DSQuery):
     """ Specific query builders for source code review source"""
 
+    cache_check_tables = [("issues", "submitted_on"), ("changes", "changed_on")]
+    rollups = [IssuesRollup("scr_rollup_daily")]
+    indexes = ITSQuery.indexes + [("issues_ext_gerrit", ["issue_id"])]
+
     def GetSQLRepositoriesFrom (self):
         #tables necessaries for repositories
         tables = Set([])
@@ -2180,6 +2388,22 @@ class SCRQuery(DSQuery):
 
         return (self.ExecuteQuery(q))
 
+    def GetCompaniesQuartersAll (self, first_year, last_year):
+        """ Like GetCompaniesQuarters for all the quarters of the years,
+            without limit, ordered the same way """
+        q = """
+            SELECT COUNT(i.id) AS total, org.name, org.id, QUARTER(submitted_on) as quarter, YEAR(submitted_on) year
+            FROM issues i, people p , people_uidentities pup, %s.enrollments enr,%s.organizations org
+            WHERE i.submitted_by=p.id AND pup.people_id=p.id
+                AND pup.uuid = enr.uuid AND enr.organization_id = org.id
+                AND status='merged'
+                AND YEAR(submitted_on) >= %s AND YEAR(submitted_on) <= %s
+              GROUP BY year, quarter, org.id
+              ORDER BY year, quarter, total DESC, org.name
+            """ % (self.identities_db, self.identities_db, first_year, last_year)
+
+        return (self.ExecuteQuery(q))
+
 
     # PEOPLE
     def GetPeopleQuarters (self, year, quarter, limit = 25, bots = []) :
@@ -2206,6 +2430,25 @@ class SCRQuery(DSQuery):
            """ % (self.identities_db, filters, quarter, year, limit)
         return (self.ExecuteQuery(q))
 
+    def GetPeopleQuartersAll (self, first_year, last_year, bots = []) :
+        """ Like GetPeopleQuarters for all the quarters of the years,
+            without limit, ordered the same way """
+        filter_bots = ''
+        for bot in bots:
+            filter_bots = filter_bots + " up.identifier<>'"+bot+"' AND "
+
+        q = """
+            SELECT COUNT(i.id) AS total, p.name, pup.uuid as id,
+                QUARTER(submitted_on) as quarter, YEAR(submitted_on) year
+            FROM issues i, people p , people_uidentities pup, %s.uidentities up
+            WHERE %s i.submitted_by=p.id AND pup.people_id=p.id AND pup.uuid = up.uuid
+                AND status='merged'
+                AND YEAR(submitted_on) >= %s AND YEAR(submitted_on) <= %s
+           GROUP BY year, quarter, pup.uuid
+           ORDER BY year, quarter, total DESC, id
+           """ % (self.identities_db, filter_bots, first_year, last_year)
+        return (self.ExecuteQuery(q))
+
     def GetPeopleList (self, startdate, enddate, bots):
 
         filter_bots = ""
@@ -2245,10 +2488,7 @@ class SCRQuery(DSQuery):
                  host="127.0.0.1", port=3306, group=None):
         super(SCRQuery, self).__init__(user, password, database, identities_db, projects_db,
                                        host, port, group)
-        # _filter_submitter_id as a static global var to avoid SQL re-execute
-        people_userid = 'l10n-bot'
-        q = "SELECT id FROM people WHERE user_id = '%s'" % (people_userid)
-        self._filter_submitter_id = self.ExecuteQuery(q)['id']
+        # people id of 'l10n-bot' to filter its submissions
         self._filter_submitter_id = None # don't filter in general
 
     # To be used for issues table
@@ -2266,6 +2506,7 @@ class SCRQuery(DSQuery):
         return filters
 
 class IRCQuery(DSQuery):
+    cache_check_tables = [("irclog", "date")]
 
     def GetSQLRepositoriesFrom (self):
         # tables necessary for repositories
@@ -2489,6 +2730,7 @@ class IRCQuery(DSQuery):
         return where
 
 class MediawikiQuery(DSQuery):
+    cache_check_tables = [("wiki_pages_revs", "date")]
 
     def GetSQLPeople2Where(self, name = None):
         # filters necessary to organizations analysis
@@ -2854,6 +3096,7 @@ class ReleasesDSQuery(DSQuery):
 
 
 class PullpoQuery(DSQuery):
+    cache_check_tables = [("pull_requests", "updated_at")]
 
     def GetSQLRepositoriesFrom (self):
         # tables necessary for repositories
@@ -3073,13 +3316,15 @@ class PullpoQuery(DSQuery):
 
         #Building the query
         timeto_sql = self.GetTimeToSQL(metric_filters, closed_field, metric_name)
-        data = self.ExecuteQuery(timeto_sql)
+        times = self.ExecuteQueryArrays(timeto_sql).dropna(metric_name)
 
         #Calculating specific statistical values
         median = 0.0
         mean = 0.0
-        if isinstance(data[metric_name], list):
-            stats_data = DHESA(data[metric_name])
+        if len(times) > 0:
+            # numpy and scipy are slow to import: only when needed
+            from vizgrimoire.datahandlers.data_handler import DHESA
+            stats_data = DHESA(times)
             to_days = 3600*24
             median = round(stats_data.data["median"] / to_days, 2)
             mean = round(stats_data.data["mean"] / to_days, 2)
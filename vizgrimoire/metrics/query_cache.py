@@ -0,0 +1,136 @@
+## Copyright (C) 2014 Bitergia
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 3 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+##
+## This file is a part of GrimoireLib
+##  (an Python library for the MetricsGrimoire and vizGrimoire systems)
+
+""" On disk cache for the results of the queries executed with DSQuery """
+
+import cPickle
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import time
+
+class QueryCache(object):
+    """ LRU cache of query results stored in a SQLite database
+
+        Results are keyed by the normalized SQL text and the database name.
+        Each result is stored with the fingerprint of the data source
+        contents when it was computed, so it is invalidated once the data
+        source changes.
+    """
+
+    default_max_size = 512 * 1024 * 1024 # bytes
+
+    # Only deterministic queries without side effects are cached
+    _no_cache_re = re.compile(r"(:=|@|\bNOW\(|\bCURDATE\(|\bRAND\(|\bINTO\b)",
+                              re.IGNORECASE)
+
+    def __init__(self, path, max_size = None):
+        self.path = path
+        self.max_size = max_size
+        if max_size is None: self.max_size = QueryCache.default_max_size
+        self.hits = 0
+        self.misses = 0
+        self._db = None
+        self._pid = None
+
+    def _get_db(self):
+        # SQLite connections can not be shared with forked processes
+        if self._db is None or self._pid != os.getpid():
+            self._db = sqlite3.connect(self.path, timeout = 60)
+            self._db.text_factory = str
+            self._pid = os.getpid()
+            self._db.execute("""CREATE TABLE IF NOT EXISTS results (
+                                  key TEXT PRIMARY KEY,
+                                  fingerprint TEXT,
+                                  result BLOB,
+                                  size INTEGER,
+                                  last_access REAL)""")
+            self._db.execute("""CREATE INDEX IF NOT EXISTS results_access
+                                ON results (last_access)""")
+            self._db.commit()
+        return self._db
+
+    @staticmethod
+    def normalize_sql(sql):
+        """ Remove not significant white spaces and final ; """
+        sql = " ".join(sql.split())
+        return sql.rstrip(";").strip()
+
+    @staticmethod
+    def is_cacheable(sql):
+        sql = QueryCache.normalize_sql(sql)
+        if not sql[0:6].upper() == "SELECT": return False
+        return QueryCache._no_cache_re.search(sql) is None
+
+    @staticmethod
+    def get_key(database, sql):
+        sql = QueryCache.normalize_sql(sql)
+        return hashlib.sha1(str(database) + "\n" + sql).hexdigest()
+
+    def get(self, database, sql, fingerprint):
+        """ Return the cached result or None if not found or invalid """
+        db = self._get_db()
+        key = QueryCache.get_key(database, sql)
+        row = db.execute("SELECT fingerprint, result FROM results WHERE key = ?",
+                         (key,)).fetchone()
+        if row is None or row[0] != fingerprint:
+            if row is not None:
+                db.execute("DELETE FROM results WHERE key = ?", (key,))
+                db.commit()
+            self.misses += 1
+            return None
+        db.execute("UPDATE results SET last_access = ? WHERE key = ?",
+                   (time.time(), key))
+        db.commit()
+        self.hits += 1
+        return cPickle.loads(str(row[1]))
+
+    def put(self, database, sql, fingerprint, result):
+        db = self._get_db()
+        key = QueryCache.get_key(database, sql)
+        data = cPickle.dumps(result, cPickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_size: return
+        db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                   (key, fingerprint, sqlite3.Binary(data), len(data), time.time()))
+        db.commit()
+        self._evict()
+
+    def _evict(self):
+        """ Remove the least recently used results over max_size """
+        db = self._get_db()
+        total = db.execute("SELECT SUM(size) FROM results").fetchone()[0]
+        if total is None or total <= self.max_size: return
+        evicted = []
+        for (key, size) in db.execute("SELECT key, size FROM results ORDER BY last_access"):
+            if total <= self.max_size: break
+            evicted.append((key,))
+            total -= size
+        db.executemany("DELETE FROM results WHERE key = ?", evicted)
+        db.commit()
+        logging.info("Query cache: %i results evicted" % (len(evicted)))
+
+    def clear(self):
+        db = self._get_db()
+        db.execute("DELETE FROM results")
+        db.commit()
+
+    def get_stats(self):
+        return {"hits": self.hits, "misses": self.misses}
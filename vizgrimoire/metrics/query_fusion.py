@@ -0,0 +1,293 @@
+## Copyright (C) 2014 Bitergia
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 3 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+##
+## This file is a part of GrimoireLib
+##  (an Python library for the MetricsGrimoire and vizGrimoire systems)
+
+""" Fusion of the queries of several metrics in a single query
+
+    Metrics built with DSQuery.BuildQuery using the same date field, tables
+    and filters scan the same rows, so all their fields can be computed in
+    one query and the result split back using the columns of each metric.
+
+    The same approach is used for the trends of a metric: all the windows
+    of days are computed in one query using conditional aggregation.
+"""
+
+import logging, re
+from sets import Set
+
+from vizgrimoire.GrimoireUtils import completePeriodIds, GetDates, GetPercentageDiff
+from vizgrimoire.GrimoireUtils import check_array_values
+from vizgrimoire.metrics.metrics import Metrics
+from vizgrimoire.metrics.metrics_filter import MetricFilters
+
+_alias_re = re.compile(r"\s+as\s+`?(\w+)`?\s*$", re.IGNORECASE)
+_aggregate_re = re.compile(r"^(count|sum|avg|max|min)\s*\(\s*(distinct\b)?\s*(.*)\)$",
+                           re.IGNORECASE | re.DOTALL)
+
+class BuildQueryRecorder(object):
+    """ DSQuery proxy recording the arguments used in BuildQuery """
+
+    def __init__(self, db):
+        self._db = db
+        self.calls = []
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+    def BuildQuery (self, period, startdate, enddate, date_field, fields,
+                    tables, filters, evolutionary, type_analysis = None):
+        args = None
+        if isinstance(fields, Set) and isinstance(tables, Set) and isinstance(filters, Set):
+            # BuildQuery empties the sets
+            args = (period, startdate, enddate, date_field, Set(fields),
+                    Set(tables), Set(filters), evolutionary, type_analysis)
+        sql = self._db.BuildQuery(period, startdate, enddate, date_field, fields,
+                                  tables, filters, evolutionary, type_analysis)
+        self.calls.append((args, sql))
+        return sql
+
+def normalize(sql):
+    return " ".join(str(sql).split())
+
+def split_fields(fields):
+    """ Split a list of SQL fields separated by commas """
+    columns = []
+    depth = 0
+    quote = None
+    start = 0
+    for i, char in enumerate(fields):
+        if quote is not None:
+            if char == quote: quote = None
+        elif char in ("'", '"'): quote = char
+        elif char == "(": depth += 1
+        elif char == ")": depth -= 1
+        elif char == "," and depth == 0:
+            columns.append(fields[start:i])
+            start = i + 1
+    columns.append(fields[start:])
+    return [column.strip() for column in columns if column.strip() != ""]
+
+def get_column_name(field):
+    match = _alias_re.search(field)
+    if match is None: return None
+    return match.group(1)
+
+def is_balanced(expression):
+    """ Check all parentheses in expression are closed inside it """
+    depth = 0
+    for char in expression:
+        if char == "(": depth += 1
+        elif char == ")": depth -= 1
+        if depth < 0: return False
+    return depth == 0
+
+def capture_query(item, evolutionary):
+    """ Get the query parts of a metric or None if it can not be fused """
+    if item.db is None or item.db.get_all_items(item.filters.type_analysis) is not None:
+        return None
+    # Only metrics using the generic get_ts and get_agg
+    if evolutionary: method = "get_ts"
+    else: method = "get_agg"
+    if getattr(type(item), method).im_func is not getattr(Metrics, method).im_func:
+        return None
+
+    db = item.db
+    recorder = BuildQueryRecorder(db)
+    item.db = recorder
+    try:
+        sql = item._get_sql(evolutionary)
+    except Exception:
+        # It will be reported when computing the metric
+        return None
+    finally:
+        item.db = db
+
+    if len(recorder.calls) != 1: return None
+    args, built_sql = recorder.calls[0]
+    # The query must be the BuildQuery one without additions
+    if args is None or sql != built_sql: return None
+    if bool(args[7]) != bool(evolutionary): return None
+
+    columns = {}
+    for field in args[4]:
+        for column in split_fields(str(field)):
+            name = get_column_name(column)
+            if name is None: return None
+            columns[name] = normalize(column)
+
+    (period, startdate, enddate, date_field, fields, tables, filters) = args[0:7]
+    key = (id(db), period, startdate, enddate, normalize(date_field),
+           frozenset([normalize(table) for table in tables]),
+           frozenset([normalize(filter_) for filter_ in filters]))
+    return (item, key, columns, args)
+
+def get_fused_values(queries, evolutionary):
+    """ Execute the captured queries sharing date field, tables and filters
+        as a single query. Returns the values of the fused metrics by id. """
+    groups = {}
+    for query in queries:
+        if query is None: continue
+        groups.setdefault(query[1], []).append(query)
+
+    values = {}
+    for group in groups.values():
+        fused = []
+        all_columns = {}
+        for (item, key, columns, args) in group:
+            conflict = [name for name in columns
+                        if name in all_columns and all_columns[name] != columns[name]]
+            if conflict: continue
+            all_columns.update(columns)
+            fused.append((item, columns, args))
+        if len(fused) < 2: continue
+
+        (period, startdate, enddate, date_field, fields, tables, filters,
+         evol, type_analysis) = fused[0][2]
+        fields = Set([])
+        for (item, columns, args) in fused:
+            fields.union_update(args[4])
+        db = fused[0][0].db
+        sql = db.BuildQuery(period, startdate, enddate, date_field, fields,
+                            Set(tables), Set(filters), evol, type_analysis)
+        result = db.ExecuteQuery(sql)
+        logging.info("Metrics computed in one query: " +
+                     ",".join([str(item.id) for (item, columns, args) in fused]))
+
+        period_columns = []
+        if evolutionary: period_columns = [period, "unixtime"]
+        for (item, columns, args) in fused:
+            value = {}
+            for column in columns.keys() + period_columns:
+                if column in result: value[column] = result[column]
+            if evolutionary:
+                value = completePeriodIds(value, period, startdate, enddate)
+            values[item.id] = value
+    return values
+
+def get_window_field(field, condition, alias):
+    """ Aggregated field computed only for the rows matching condition """
+    field = _alias_re.sub("", field).strip()
+    match = _aggregate_re.match(field)
+    if match is None: return None
+    function, distinct, arg = match.groups()
+    arg = arg.strip()
+    if not is_balanced(arg) or len(split_fields(arg)) != 1: return None
+    if arg == "*":
+        if distinct: return None
+        arg = "1"
+    if distinct: function += "(DISTINCT "
+    else: function += "("
+    return function + "CASE WHEN " + condition + " THEN " + arg + " END) AS " + alias
+
+def _capture_agg_query(item, startdate, enddate):
+    filters = item.filters
+    item.filters = MetricFilters(filters.period, startdate, enddate, filters.type_analysis)
+    item.filters.global_filter = filters.global_filter
+    item.filters.closed_condition = filters.closed_condition
+    db = item.db
+    recorder = BuildQueryRecorder(db)
+    item.db = recorder
+    try:
+        sql = item._get_sql(False)
+    except Exception:
+        return None
+    finally:
+        item.db = db
+        item.filters = filters
+
+    if len(recorder.calls) != 1: return None
+    args, built_sql = recorder.calls[0]
+    if args is None or sql != built_sql or args[7]: return None
+    # Dates must be used only in the BuildQuery dates condition
+    if args[1] != startdate or args[2] != enddate: return None
+    return args
+
+def get_trends_single_pass(item, date, windows):
+    """ Trends of the metric for all windows of days in one query,
+        the same data than Metrics.get_trends. None if not supported. """
+    if item.db is None or len(windows) == 0: return None
+    if type(item).get_agg.im_func is not Metrics.get_agg.im_func: return None
+    type_analysis = item.filters.type_analysis
+    if type_analysis and type_analysis[1] is None and \
+        item.id in Metrics.trends_all_items_not_supported:
+        return None
+
+    widest = GetDates(date, max(windows))
+    narrowest = GetDates(date, min(windows))
+    queries = [_capture_agg_query(item, widest[2], widest[1]),
+               _capture_agg_query(item, narrowest[1], narrowest[0])]
+    if None in queries: return None
+    parts = []
+    for args in queries:
+        parts.append((normalize(args[3]),
+                      frozenset([normalize(table) for table in args[5]]),
+                      frozenset([normalize(filter_) for filter_ in args[6]])))
+    if parts[0] != parts[1]: return None
+
+    (period, startdate, enddate, date_field, fields, tables, filters,
+     evol, type_analysis) = queries[0]
+    id_fields = [field for field in fields if get_column_name(str(field)) == item.id]
+    if len(id_fields) != 1: return None
+
+    window_fields = []
+    for days in windows:
+        chardates = GetDates(date, days)
+        last = date_field + ">=" + chardates[1] + " AND " + date_field + "<" + chardates[0]
+        prev = date_field + ">=" + chardates[2] + " AND " + date_field + "<" + chardates[1]
+        window_fields.append(get_window_field(str(id_fields[0]), last, "last_" + str(days)))
+        window_fields.append(get_window_field(str(id_fields[0]), prev, "prev_" + str(days)))
+    if None in window_fields: return None
+
+    fields = " , ".join(window_fields)
+    group_field = None
+    all_items = item.db.get_all_items(type_analysis)
+    if all_items:
+        group_field = item.db.get_group_field(all_items)
+        fields = group_field + ", " + fields
+    sql = item.db.GetSQLGlobal(date_field, fields,
+                               item.db._get_tables_query(Set(tables)),
+                               item.db._get_filters_query(Set(filters)),
+                               widest[2], widest[0])
+    if group_field is not None: sql += " GROUP BY " + group_field
+    result = item.db.ExecuteQuery(sql)
+
+    data = {}
+    if group_field is None:
+        for days in windows:
+            values = {}
+            for window in ["last", "prev"]:
+                value = result[window + "_" + str(days)]
+                if value is None: value = 0
+                values[window] = int(value)
+            data['diff_net'+item.id+'_'+str(days)] = values["last"] - values["prev"]
+            data['percentage_'+item.id+'_'+str(days)] = GetPercentageDiff(values["prev"], values["last"])
+            data[item.id+'_'+str(days)] = values["last"]
+    else:
+        result = check_array_values(result)
+        if 'CONCAT' not in group_field:
+            group_field = group_field.split('.')[1] # remove table name
+        data[group_field] = result[group_field]
+        for days in windows:
+            last = [value or 0 for value in result["last_" + str(days)]]
+            prev = [value or 0 for value in result["prev_" + str(days)]]
+            data[item.id+'_'+str(days)] = last
+            data['diff_net'+item.id+'_'+str(days)] = \
+                [last[i] - prev[i] for i in range(0, len(prev))]
+            data['percentage_'+item.id+'_'+str(days)] = \
+                [GetPercentageDiff(prev[i], last[i]) for i in range(0, len(prev))]
+    return data
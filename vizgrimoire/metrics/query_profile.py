@@ -0,0 +1,195 @@
+## Copyright (C) 2014 Bitergia
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 3 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+##
+## This file is a part of GrimoireLib
+##  (an Python library for the MetricsGrimoire and vizGrimoire systems)
+
+""" Profile of the queries executed in a report
+
+    When enabled, DSQuery.ExecuteQuery and GrimoireSQL.ExecuteQuery record
+    for each query its fingerprint (the SQL without literals), the metric
+    that executed it, its data source and filter item, the rows returned
+    and the wall time. Each process appends its records to its own file,
+    and write_report merges all of them in a JSON and a CSV file sorted by
+    time and logs the slowest queries.
+"""
+
+import csv
+import glob
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+
+_path = None # profile files prefix, None if profiling is disabled
+_records = []
+_pid = None
+_flush_size = 1000
+
+fields = ["fingerprint", "data_source", "metric_class", "metric_id", "filter",
+          "item", "rows", "time", "cached", "caller", "sql"]
+
+_literals_re = re.compile(r"'(?:[^'\\]|\\.|'')*'|\b[0-9]+(?:\.[0-9]+)?\b")
+
+def enable(path):
+    """ Profile the queries, writing the profile to path.json and path.csv """
+    global _path, _records, _pid
+    _path = path
+    _records = []
+    _pid = os.getpid()
+    # Parts of a previous run
+    for part in glob.glob(_path + ".part.*"):
+        os.remove(part)
+
+def is_enabled():
+    return _path is not None
+
+def get_fingerprint(sql):
+    """ Normalized sql without literals and its hash """
+    sql = _literals_re.sub("?", " ".join(sql.split()))
+    return (hashlib.sha1(sql).hexdigest()[0:12], sql)
+
+def _get_rows(result):
+    """ Number of rows of a result of ExecuteQuery """
+    if not isinstance(result, dict) or len(result) == 0: return 0
+    value = result.values()[0]
+    if isinstance(value, list): return len(value)
+    return 1
+
+def _get_context():
+    """ Metric executing the query, or the first function calling the
+        query builders if there is no metric """
+    frame = sys._getframe(2)
+    caller = None
+    while frame is not None:
+        obj = frame.f_locals.get('self')
+        # Duck typing: metrics modules import the query builders
+        if hasattr(obj, 'filters') and hasattr(obj, 'data_source') and hasattr(obj, 'id'):
+            return (obj, caller)
+        code = frame.f_code
+        module = os.path.basename(code.co_filename)
+        if caller is None and module not in ["query_builder.py", "GrimoireSQL.py",
+                                             "query_profile.py", "query_fusion.py"]:
+            caller = module + ":" + code.co_name
+        frame = frame.f_back
+    return (None, caller)
+
+def record(sql, wall_time, result, data_source, cached = False):
+    """ Record the execution of sql in data_source (name or query builder) """
+    global _records, _pid
+    if _path is None: return
+    if _pid != os.getpid():
+        # Forked: the records of the parent are written by it
+        _records = []
+        _pid = os.getpid()
+
+    (metric, caller) = _get_context()
+    (fingerprint, normalized) = get_fingerprint(sql)
+    item = {"fingerprint": fingerprint, "data_source": data_source,
+            "metric_class": None, "metric_id": None, "filter": None, "item": None,
+            "rows": _get_rows(result), "time": wall_time, "cached": cached,
+            "caller": caller, "sql": normalized}
+    if metric is not None:
+        item["metric_class"] = type(metric).__name__
+        item["metric_id"] = metric.id
+        if metric.data_source is not None:
+            item["data_source"] = metric.data_source.get_name()
+        type_analysis = metric.filters.type_analysis
+        if type_analysis is not None and len(type_analysis) > 1:
+            item["filter"] = type_analysis[0]
+            item["item"] = type_analysis[1]
+    _records.append(item)
+    if len(_records) >= _flush_size: flush()
+
+def flush():
+    """ Append the records of this process to its part file """
+    global _records
+    if _path is None or len(_records) == 0: return
+    if _pid != os.getpid():
+        _records = []
+        return
+    fd = open("%s.part.%i" % (_path, os.getpid()), "a")
+    for item in _records:
+        fd.write(json.dumps(item) + "\n")
+    fd.close()
+    _records = []
+
+def read_records():
+    """ Records of all the processes of the run """
+    flush()
+    records = []
+    if _path is None: return records
+    for part in glob.glob(_path + ".part.*"):
+        fd = open(part)
+        for line in fd:
+            records.append(json.loads(line))
+        fd.close()
+    return records
+
+def get_summary(records, top = 20):
+    """ Slowest queries, and the total time and number of queries of the
+        slowest fingerprints """
+    records = sorted(records, key=lambda item: item["time"], reverse=True)
+    groups = {}
+    for item in records:
+        group = groups.setdefault(item["fingerprint"],
+                                  {"fingerprint": item["fingerprint"], "sql": item["sql"],
+                                   "count": 0, "time": 0, "metrics": set()})
+        group["count"] += 1
+        group["time"] += item["time"]
+        group["metrics"].add(str(item["metric_id"] or item["caller"]))
+    groups = sorted(groups.values(), key=lambda group: group["time"], reverse=True)
+    for group in groups:
+        group["metrics"] = sorted(group["metrics"])
+    return {"queries": len(records), "time": sum([item["time"] for item in records]),
+            "slowest": records[0:top], "fingerprints": groups[0:top]}
+
+def write_report(top = 20):
+    """ Write the profile of all processes sorted by time and log the top
+        slowest queries """
+    if _path is None: return
+    records = read_records()
+    records.sort(key=lambda item: item["time"], reverse=True)
+
+    fd = open(_path + ".json", "w")
+    json.dump(records, fd, indent=1)
+    fd.close()
+    fd = open(_path + ".csv", "wb")
+    writer = csv.DictWriter(fd, fields)
+    writer.writeheader()
+    for item in records:
+        writer.writerow(dict([(key, value.encode("utf-8") if isinstance(value, unicode) else value)
+                              for (key, value) in item.items()]))
+    fd.close()
+    for part in glob.glob(_path + ".part.*"):
+        os.remove(part)
+
+    summary = get_summary(records, top)
+    logging.info("Queries profile: %i queries, %.2fs in %s.json" %
+                 (summary["queries"], summary["time"], _path))
+    logging.info("Slowest queries:")
+    for item in summary["slowest"]:
+        logging.info("%8.3fs %6i rows %-8s %-20s %s %s" %
+                     (item["time"], item["rows"], item["data_source"],
+                      item["metric_id"] or item["caller"], item["item"] or "",
+                      item["fingerprint"]))
+    logging.info("Slowest queries by fingerprint:")
+    for group in summary["fingerprints"]:
+        logging.info("%8.3fs %5i queries %s %s: %s" %
+                     (group["time"], group["count"], group["fingerprint"],
+                      ",".join(group["metrics"][0:5]), group["sql"][0:120]))
@@ -0,0 +1,206 @@
+## Copyright (C) 2014 Bitergia
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 3 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+##
+## This file is a part of GrimoireLib
+##  (an Python library for the MetricsGrimoire and vizGrimoire systems)
+
+""" Columnar results of queries
+
+    Each column of a ResultSet is a typed NumPy array: numbers are int64 or
+    float64 (NULL as NaN), dates are datetime64 (NULL as NaT) and strings
+    are integer codes of a list of categories (NULL as -1). The arrays are
+    filled from the cursor in batches, and there are arrays for all the
+    columns also when the query returns one or no rows.
+"""
+
+import datetime
+from decimal import Decimal
+
+import numpy
+
+NUMBER, DATETIME, STRING, OBJECT = "number", "datetime", "string", "object"
+
+def _get_kind(value):
+    if isinstance(value, (bool, int, long, float, Decimal)): return NUMBER
+    if isinstance(value, (datetime.datetime, datetime.date)): return DATETIME
+    if isinstance(value, basestring): return STRING
+    return OBJECT
+
+class ResultSet(object):
+    """ Columns of a query result as NumPy arrays """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.kinds = dict([(column, None) for column in columns])
+        self.categories = dict([(column, []) for column in columns])
+        self._codes = dict([(column, {}) for column in columns])
+        self._chunks = dict([(column, []) for column in columns])
+        self._nulls = dict([(column, 0) for column in columns])
+        self._arrays = {}
+        self._len = 0
+
+    @staticmethod
+    def from_cursor(cursor, batch_size = 10000):
+        """ Read all the rows of an executed cursor and close it """
+        try:
+            if cursor.description is None: return ResultSet([])
+            result = ResultSet([column[0] for column in cursor.description])
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows: break
+                result.append_rows(rows)
+        finally:
+            cursor.close()
+        return result
+
+    @staticmethod
+    def from_dict(data):
+        """ ResultSet with the data returned by ExecuteQuery """
+        result = ResultSet(data.keys())
+        values = [data[column] for column in result.columns]
+        values = [value if isinstance(value, list) else [value] for value in values]
+        if values:
+            result.append_rows(zip(*values))
+        return result
+
+    def append_rows(self, rows):
+        for (i, column) in enumerate(self.columns):
+            self._append(column, [row[i] for row in rows])
+        self._len += len(rows)
+        self._arrays = {}
+
+    def _append(self, column, values):
+        kind = self.kinds[column]
+        if kind is None:
+            for value in values:
+                if value is not None:
+                    kind = _get_kind(value)
+                    break
+            if kind is None:
+                # Only NULLs yet: the type is not known
+                self._nulls[column] += len(values)
+                return
+            self.kinds[column] = kind
+            values = [None] * self._nulls[column] + values
+            self._nulls[column] = 0
+
+        if kind == NUMBER:
+            if None in values:
+                array = numpy.array([numpy.nan if value is None else float(value)
+                                     for value in values], dtype=numpy.float64)
+            elif [value for value in values if isinstance(value, (float, Decimal))]:
+                array = numpy.array([float(value) for value in values], dtype=numpy.float64)
+            else:
+                array = numpy.array(values, dtype=numpy.int64)
+        elif kind == DATETIME:
+            array = numpy.array(values, dtype="datetime64[s]")
+        elif kind == STRING:
+            codes = self._codes[column]
+            categories = self.categories[column]
+            array = numpy.empty(len(values), dtype=numpy.int32)
+            for (i, value) in enumerate(values):
+                if value is None:
+                    array[i] = -1
+                    continue
+                code = codes.get(value)
+                if code is None:
+                    code = codes[value] = len(categories)
+                    categories.append(value)
+                array[i] = code
+        else:
+            array = numpy.empty(len(values), dtype=object)
+            array[:] = values
+        self._chunks[column].append(array)
+
+    def __len__(self):
+        return self._len
+
+    def __contains__(self, column):
+        return column in self.kinds
+
+    def _get_array(self, column):
+        if column not in self._arrays:
+            chunks = self._chunks[column]
+            if self.kinds[column] is None:
+                # All values are NULL
+                array = numpy.empty(self._len, dtype=object)
+                array[:] = None
+            elif len(chunks) == 1:
+                array = chunks[0]
+            else:
+                # int64 chunks are upcast to float64 if needed
+                array = numpy.concatenate(chunks)
+                self._chunks[column] = [array]
+            self._arrays[column] = array
+        return self._arrays[column]
+
+    def codes(self, column):
+        """ Integer codes of the values of a string column and the list
+            of categories they point to. Other columns are factorized. """
+        array = self._get_array(column)
+        if self.kinds[column] is None:
+            return (numpy.zeros(self._len, dtype=numpy.int32) - 1, [])
+        if self.kinds[column] == STRING:
+            return (array, self.categories[column])
+        if self.kinds[column] == NUMBER and array.dtype == numpy.float64:
+            nulls = numpy.isnan(array)
+            uniques, codes = numpy.unique(array[~nulls], return_inverse=True)
+            all_codes = numpy.empty(len(array), dtype=numpy.int32)
+            all_codes.fill(-1)
+            all_codes[~nulls] = codes
+            return (all_codes, uniques.tolist())
+        uniques, codes = numpy.unique(array, return_inverse=True)
+        return (codes.astype(numpy.int32), uniques.tolist())
+
+    def __getitem__(self, column):
+        """ Array with the values of column. Strings are decoded. """
+        array = self._get_array(column)
+        if self.kinds[column] == STRING:
+            categories = numpy.empty(len(self.categories[column]) + 1, dtype=object)
+            categories[:-1] = self.categories[column]
+            # Code -1 is the last item: NULL
+            categories[-1] = None
+            return categories[array]
+        return array
+
+    def dropna(self, column):
+        """ Array with the values of column that are not NULL """
+        kind = self.kinds[column]
+        if kind is None: return numpy.array([], dtype=numpy.float64)
+        array = self[column]
+        if kind == NUMBER:
+            if array.dtype != numpy.float64: return array
+            return array[~numpy.isnan(array)]
+        if kind == DATETIME: return array[~numpy.isnat(array)]
+        if kind == STRING: return array[self._get_array(column) >= 0]
+        return array[numpy.array([value is not None for value in array], dtype=bool)]
+
+    def get(self, column, default = None):
+        if column not in self: return default
+        return self[column]
+
+    def to_dict(self):
+        """ dict of lists with Python values, like ExecuteQuery but
+            always with lists """
+        data = {}
+        for column in self.columns:
+            array = self[column]
+            if self.kinds[column] == NUMBER and array.dtype == numpy.float64:
+                values = [None if numpy.isnan(value) else value for value in array.tolist()]
+            else:
+                values = array.tolist()
+            data[column] = values
+        return data
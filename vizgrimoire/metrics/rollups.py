@@ -0,0 +1,325 @@
+## Copyright (C) 2014 Bitergia
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 3 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, write to the Free Software
+## Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+##
+## This file is a part of GrimoireLib
+##  (an Python library for the MetricsGrimoire and vizGrimoire systems)
+
+""" Daily activity rollup tables
+
+    A rollup table has a row with the activity of each person (uuid) in
+    each repository (or tracker, mailing list) each day. The queries of the
+    metrics without filters that count events or people are rewritten to
+    use the rollup instead of the raw events tables. Period limits are
+    days, so filtering by day gives the same rows than filtering by date.
+
+    Rollups are updated before they are used: only the days from the
+    oldest event added since the last update are computed again. All the
+    days are computed again if the identities changed.
+"""
+
+import logging
+
+import MySQLdb
+
+from sets import Set
+
+def _normalize(sql):
+    return " ".join(sql.split())
+
+class Rollup(object):
+    """ Daily rollup table of a data source """
+
+    # Name of the table in the data source database
+    table = None
+    # Type of the item column (repository, tracker or mailing list)
+    item_type = "INT"
+    # Columns with the activity of a person in an item each day
+    columns = []
+    # Events tables: (table, date field, auto increment id). Changes in
+    # tables without date or id compute all the days again.
+    sources = []
+    # Joins of the events tables t with the tables of their date field
+    source_joins = {}
+    # Queries that can use the rollup: (date field, tables, filters,
+    # field) and the field and filter (or None) used with the rollup r
+    rules = []
+
+    # State of all the rollups of a database
+    state_table = "rollups_state"
+    lock_timeout = 600 # seconds
+
+    def __init__(self, table = None):
+        if table is not None: self.table = table
+        self._rules = {}
+        for (date, tables, filters, field, rollup_field, rollup_filter) in self.rules:
+            key = (_normalize(date), frozenset([_normalize(t) for t in tables]),
+                   frozenset([_normalize(f) for f in filters]))
+            self._rules.setdefault(key, {})[_normalize(field)] = (rollup_field, rollup_filter)
+
+    def get_select(self, since = None):
+        """ SELECT with the rows of the rollup, only for the days since the
+            given one if any. Columns: day, uuid, item and columns. """
+        raise NotImplementedError
+
+    def get_query(self, date_field, fields, tables, filters):
+        """ date field, fields, tables and filters of a query using the
+            rollup equivalent to the given one, or None """
+        key = (_normalize(date_field), frozenset([_normalize(t) for t in tables]),
+               frozenset([_normalize(f) for f in filters]))
+        if key not in self._rules: return None
+        rollup_fields = Set([])
+        rollup_filters = Set([])
+        for field in fields:
+            rule = self._rules[key].get(_normalize(field))
+            if rule is None: return None
+            rollup_fields.add(rule[0])
+            # Only the days with the events counted, so periods without
+            # them are not in the results, like in the original query
+            if rule[1] is not None: rollup_filters.add(rule[1])
+        return ("r.day", rollup_fields, Set([self.table + " r"]), rollup_filters)
+
+    def _execute(self, db, sql):
+        return db._get_pool().execute(sql).fetchall()
+
+    def _get_marks(self, db):
+        """ Number of rows and last id (or date) of each events table and
+            checksum of the identities, to find what changed since the last
+            update """
+        marks = []
+        for (table, date, id_field) in self.sources:
+            if id_field is None: id_field = date
+            rows = self._execute(db, "SELECT COUNT(*), MAX(%s) FROM %s" % (id_field, table))
+            marks.append("%s:%s" % rows[0])
+        rows = self._execute(db, "CHECKSUM TABLE people_uidentities")
+        marks.append(str(rows[0][1]))
+        return marks
+
+    def _get_since(self, db, old_marks, marks):
+        """ Oldest day with new events, "" if all the days must be computed
+            again or None if nothing changed """
+        if old_marks == marks: return None
+        if old_marks is None or len(old_marks) != len(marks) or old_marks[-1] != marks[-1]:
+            return ""
+        days = []
+        for (i, (table, date, id_field)) in enumerate(self.sources):
+            if old_marks[i] == marks[i]: continue
+            if date is None or id_field is None: return ""
+            (old_count, old_id) = old_marks[i].split(":")
+            if old_id == "None": return ""
+            rows = self._execute(db, "SELECT COUNT(*), DATE(MIN(%s)) FROM %s t %s WHERE t.%s > %s" %
+                                 (date, table, self.source_joins.get(table, ""),
+                                  id_field, old_id))
+            # Only new rows: otherwise rows were removed
+            if int(old_count) + rows[0][0] != int(marks[i].split(":")[0]): return ""
+            if rows[0][1] is not None: days.append(rows[0][1])
+        if len(days) == 0: return None
+        return "'" + str(min(days)) + "'"
+
+    def _create(self, db):
+        columns = ", ".join(["%s %s" % (column, type_) for (column, type_) in self.columns])
+        self._execute(db, """CREATE TABLE IF NOT EXISTS %s (
+                               day DATE NOT NULL,
+                               uuid VARCHAR(128),
+                               item %s,
+                               %s,
+                               INDEX %s_day (day)
+                             )""" %
+                      (self.table, self.item_type, columns, self.table))
+        self._execute(db, """CREATE TABLE IF NOT EXISTS %s (
+                               rollup VARCHAR(64) PRIMARY KEY,
+                               marks VARCHAR(255)
+                             )""" % (self.state_table))
+
+    def update(self, db):
+        """ Update the rollup with the events added since the last update.
+            Returns whether the rollup can be used. """
+        lock = db.database + "." + self.table
+        try:
+            self._create(db)
+            rows = self._execute(db, "SELECT GET_LOCK('%s', %i)" % (lock, self.lock_timeout))
+            if rows[0][0] != 1:
+                logging.warning("Rollup %s locked, not used" % (self.table))
+                return False
+            try:
+                rows = self._execute(db, "SELECT marks FROM %s WHERE rollup = '%s'" %
+                                     (self.state_table, self.table))
+                old_marks = None
+                if len(rows) > 0: old_marks = rows[0][0].split(",")
+                marks = self._get_marks(db)
+                since = self._get_since(db, old_marks, marks)
+                if since is None: return True
+
+                if since == "":
+                    logging.info("Building rollup " + self.table)
+                    self._execute(db, "DELETE FROM " + self.table)
+                    self._execute(db, "INSERT INTO %s %s" % (self.table, self.get_select()))
+                else:
+                    logging.info("Updating rollup %s since %s" % (self.table, since))
+                    self._execute(db, "DELETE FROM %s WHERE day >= %s" % (self.table, since))
+                    self._execute(db, "INSERT INTO %s %s" % (self.table, self.get_select(since)))
+                self._execute(db, "REPLACE INTO %s (rollup, marks) VALUES ('%s', '%s')" %
+                              (self.state_table, self.table, ",".join(marks)))
+                self._execute(db, "COMMIT")
+            except MySQLdb.Error:
+                self._execute(db, "ROLLBACK")
+                raise
+            finally:
+                self._execute(db, "SELECT RELEASE_LOCK('%s')" % (lock))
+        except MySQLdb.Error, e:
+            logging.warning("Rollup %s not used: %s" % (self.table, e))
+            return False
+        return True
+
+class SCMRollup(Rollup):
+    """ Commits, lines and files of each author in each repository """
+
+    table = "scm_rollup_daily"
+    columns = [("commits", "INT"), ("added_lines", "BIGINT"), ("removed_lines", "BIGINT"),
+               ("added_lines_no_cvs2svn", "BIGINT"), ("removed_lines_no_cvs2svn", "BIGINT"),
+               ("files", "INT")]
+    # Lines can be added to existing commits by the CommitsLines extension:
+    # the days of actions and lines are those of their commits
+    sources = [("scmlog", "author_date", "id"), ("actions", "s.author_date", "id"),
+               ("commits_lines", "s.author_date", "id")]
+    source_joins = {"actions": "LEFT JOIN scmlog s ON s.id = t.commit_id",
+                    "commits_lines": "LEFT JOIN scmlog s ON s.id = t.commit_id"}
+    rules = [
+        ("s.author_date", ["scmlog s"],
+         ["s.id IN (select distinct(a.commit_id) from actions a)"],
+         "count(distinct(s.rev)) as commits", "SUM(r.commits) AS commits", "r.commits > 0"),
+        ("s.author_date", ["people_uidentities pup", "scmlog s"], ["s.author_id = pup.people_id"],
+         "count(distinct(pup.uuid)) as authors", "COUNT(DISTINCT(r.uuid)) AS authors", None),
+        ("s.author_date", ["commits_lines cl", "scmlog s"], ["cl.commit_id = s.id"],
+         "sum(cl.added) as added_lines", "SUM(r.added_lines) AS added_lines",
+         "r.added_lines IS NOT NULL"),
+        ("s.author_date", ["commits_lines cl", "scmlog s"], ["cl.commit_id = s.id"],
+         "sum(cl.removed) as removed_lines", "SUM(r.removed_lines) AS removed_lines",
+         "r.removed_lines IS NOT NULL"),
+        ("s.author_date", ["commits_lines cl", "scmlog s"],
+         ["cl.commit_id = s.id", "s.message not like '%cvs2svn%'"],
+         "sum(cl.added) as added_lines", "SUM(r.added_lines_no_cvs2svn) AS added_lines",
+         "r.added_lines_no_cvs2svn IS NOT NULL"),
+        ("s.author_date", ["commits_lines cl", "scmlog s"],
+         ["cl.commit_id = s.id", "s.message not like '%cvs2svn%'"],
+         "sum(cl.removed) as removed_lines", "SUM(r.removed_lines_no_cvs2svn) AS removed_lines",
+         "r.removed_lines_no_cvs2svn IS NOT NULL")
+    ]
+
+    def get_select(self, since = None):
+        where, where_first = "", ""
+        if since is not None:
+            where = "WHERE s.author_date >= " + since
+            where_first = "AND s.author_date >= " + since
+        # A commit in several repositories is counted once, in the first
+        # one: all of them have the same author_date.
+        return """
+            SELECT DATE(s.author_date), pup.uuid, s.repository_id,
+                   COUNT(first.id), SUM(cl.added), SUM(cl.removed),
+                   SUM(IF(s.message NOT LIKE '%%cvs2svn%%', cl.added, NULL)),
+                   SUM(IF(s.message NOT LIKE '%%cvs2svn%%', cl.removed, NULL)),
+                   COALESCE(SUM(a.files), 0)
+            FROM scmlog s
+            LEFT JOIN people_uidentities pup ON s.author_id = pup.people_id
+            LEFT JOIN (SELECT MIN(s.id) AS id
+                       FROM scmlog s, (SELECT DISTINCT(commit_id) FROM actions) a
+                       WHERE s.id = a.commit_id %s
+                       GROUP BY s.rev) first ON first.id = s.id
+            LEFT JOIN (SELECT commit_id, SUM(added) AS added, SUM(removed) AS removed
+                       FROM commits_lines GROUP BY commit_id) cl ON cl.commit_id = s.id
+            LEFT JOIN (SELECT commit_id, COUNT(DISTINCT(file_id)) AS files
+                       FROM actions GROUP BY commit_id) a ON a.commit_id = s.id
+            %s
+            GROUP BY DATE(s.author_date), pup.uuid, s.repository_id
+            """ % (where_first, where)
+
+class IssuesRollup(Rollup):
+    """ Issues opened and changes done by each person in each tracker """
+
+    table = "its_rollup_daily"
+    columns = [("opened", "INT"), ("changes", "INT")]
+    sources = [("issues", "submitted_on", "id"), ("changes", "changed_on", "id")]
+    rules = [
+        ("submitted_on", ["issues i"], [],
+         "count(distinct(i.id)) as opened", "SUM(r.opened) AS opened", "r.opened > 0"),
+        ("submitted_on", ["issues i", "people_uidentities pup"], ["i.submitted_by = pup.people_id"],
+         "count(distinct(pup.uuid)) as openers", "COUNT(DISTINCT(r.uuid)) AS openers",
+         "r.opened > 0"),
+        ("submitted_on", ["issues i", "people_uidentities pup"], ["i.submitted_by = pup.people_id"],
+         "count(distinct(pup.uuid)) as submitters", "COUNT(DISTINCT(r.uuid)) AS submitters",
+         "r.opened > 0")
+    ]
+
+    def get_select(self, since = None):
+        where_issues, where_changes = "", ""
+        if since is not None:
+            where_issues = "WHERE i.submitted_on >= " + since
+            where_changes = "WHERE ch.changed_on >= " + since
+        return """
+            SELECT day, uuid, item, SUM(opened), SUM(changes)
+            FROM (
+              SELECT DATE(i.submitted_on) AS day, pup.uuid AS uuid, i.tracker_id AS item,
+                     COUNT(i.id) AS opened, 0 AS changes
+              FROM issues i
+              LEFT JOIN people_uidentities pup ON i.submitted_by = pup.people_id
+              %s
+              GROUP BY DATE(i.submitted_on), pup.uuid, i.tracker_id
+              UNION ALL
+              SELECT DATE(ch.changed_on), pup.uuid, i.tracker_id, 0, COUNT(ch.id)
+              FROM changes ch
+              JOIN issues i ON ch.issue_id = i.id
+              LEFT JOIN people_uidentities pup ON ch.changed_by = pup.people_id
+              %s
+              GROUP BY DATE(ch.changed_on), pup.uuid, i.tracker_id
+            ) t
+            GROUP BY day, uuid, item
+            """ % (where_issues, where_changes)
+
+class MLSRollup(Rollup):
+    """ Messages sent by each person to each mailing list """
+
+    table = "mls_rollup_daily"
+    item_type = "VARCHAR(255)"
+    columns = [("sent", "INT")]
+    # messages has no auto increment id: all the days are computed again
+    sources = [("messages", "first_date", None)]
+    rules = [
+        ("m.first_date", ["messages m"], [],
+         "count(distinct(m.message_ID)) as sent", "SUM(r.sent) AS sent", "r.sent > 0"),
+        ("m.first_date", ["people_uidentities pup", "messages m", "messages_people mp"],
+         ["m.message_ID = mp.message_id", "mp.email_address = pup.people_id",
+          "mp.type_of_recipient = 'From'"],
+         "count(distinct(pup.uuid)) as senders", "COUNT(DISTINCT(r.uuid)) AS senders", None)
+    ]
+
+    def get_select(self, since = None):
+        where = ""
+        if since is not None: where = "WHERE m.first_date >= " + since
+        # A message sent to several mailing lists is counted once, in the
+        # first one. Messages without sender have a NULL uuid.
+        return """
+            SELECT DATE(m.first_date), pup.uuid, m.mailing_list_url,
+                   COUNT(DISTINCT(IF(m.mailing_list_url = first.mailing_list_url,
+                                     m.message_ID, NULL)))
+            FROM messages m
+            JOIN (SELECT message_ID, MIN(mailing_list_url) AS mailing_list_url
+                  FROM messages GROUP BY message_ID) first
+              ON first.message_ID = m.message_ID
+            LEFT JOIN messages_people mp
+              ON mp.message_id = m.message_ID AND mp.type_of_recipient = 'From'
+            LEFT JOIN people_uidentities pup ON mp.email_address = pup.people_id
+            %s
+            GROUP BY DATE(m.first_date), pup.uuid, m.mailing_list_url
+            """ % (where)
@@ -106,6 +106,7 @@ class Commits(Metrics):
     envision = {"y_labels" : "true",
                 "show_markers" : "true" }
     data_source = SCM
+    additive = True
 
     def _get_sql(self, evolutionary):
         fields = Set([])
@@ -580,6 +581,7 @@ class AddedLines(Metrics):
     name = "Added Lines"
     desc = "Number of added lines"
     data_source = SCM
+    additive = True
 
     def _get_sql(self, evolutionary):
         # This function contains basic parts of the query to count added and removed lines
@@ -608,6 +610,7 @@ class RemovedLines(Metrics):
     name = "Removed Lines"
     desc = "Number of removed lines"
     data_source = SCM
+    additive = True
 
     def _get_sql(self, evolutionary):
         # This function contains basic parts of the query to count added and removed lines
@@ -666,6 +669,7 @@ class Actions(Metrics):
     name = "Actions"
     desc = "Actions performed on several files (add, remove, copy, ... each file)"
     data_source = SCM
+    additive = True
 
     def _get_sql (self, evolutionary):
         # Basic parts of the query needed when calculating actions
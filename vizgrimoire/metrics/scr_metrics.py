@@ -24,14 +24,16 @@
 
 """ Metrics for the source code review system """
 
+from bisect import bisect_left
 from datetime import datetime
 import logging
 import MySQLdb
 import numpy
 
-from vizgrimoire.GrimoireUtils import completePeriodIds, checkListArray, medianAndAvgByPeriod, check_array_values
+from vizgrimoire.GrimoireUtils import completePeriodIds, check_array_values
 from vizgrimoire.metrics.query_builder import DSQuery
 
+from vizgrimoire.metrics.grouped_stats import get_grouped_stats, get_month_ids
 from vizgrimoire.metrics.metrics import Metrics
 
 from vizgrimoire.metrics.metrics_filter import MetricFilters
@@ -105,6 +107,7 @@ class Submitted(Metrics):
     name = "Submitted reviews"
     desc = "Number of submitted code review processes"
     data_source = SCR
+    additive = True
 
     def _get_sql(self, evolutionary):
         q = self.db.GetReviewsSQL("submitted", self.filters, evolutionary)
@@ -740,123 +743,162 @@ class ReviewsWaitingForReviewerTS(Metrics):
         current = str(year)+"-"+str(month)+"-"+str(last_day)
         return (current)
 
-    def _get_pending(self, month, reviewers = False):
-        startdate = self.filters.startdate
-        enddate = self.filters.enddate
-        identities_db = self.db.identities_db
-        type_analysis =  self.filters.type_analysis
-
-        current = self._get_date_from_month(month)
-
-        sql_max_patchset = self.db.get_sql_max_patchset_for_reviews (current)
-        sql_reviews_reviewed = self.db.get_sql_reviews_reviewed(self.filters.startdate, current)
-        sql_reviews_closed = self.db.get_sql_reviews_closed(self.filters.startdate, current)
-
-        fields = Set([])
-
-
-        fields.add("COUNT(DISTINCT(i.id)) as pending")
-        fields = self.db._get_fields_query(fields)
-
-        tables = Set([])
-        tables.add("issues i")
-        tables.union_update(self.db.GetSQLReportFrom(self.filters))
-        tables = self.db._get_tables_query(tables)
-
-        # Pending (NEW = submitted-merged-abandoned) REVIEWS
-        filters = Set([])
-        filters.add(" i.submitted_on <= '"+current+"'")
-        filters.union_update(self.db.GetSQLReportWhere(self.filters,"issues"))
-        # remove closed reviews
-        filters.add("i.id NOT IN ("+ sql_reviews_closed +")")
-
-        if reviewers:
-            filters.add("i.id NOT IN (%s)" % (sql_reviews_reviewed))
-
-        filters = self.db._get_filters_query(filters)
-
-        all_items = self.db.get_all_items(self.filters.type_analysis)
+    def _get_reviews_query(self, fields, tables, filters):
+        """ Query for the reviews submitted in the analysis dates """
+        all_tables = Set(["issues i"])
+        all_tables.union_update(tables)
+        all_tables.union_update(self.db.GetSQLReportFrom(self.filters))
+        all_filters = Set(filters)
+        all_filters.union_update(self.db.GetSQLReportWhere(self.filters,"issues"))
+        q = self.db.GetSQLGlobal('i.submitted_on', "DISTINCT " + ", ".join(fields),
+                                 self.db._get_tables_query(all_tables),
+                                 self.db._get_filters_query(all_filters),
+                                 self.filters.startdate, self.filters.enddate)
+        return q
 
-        q = self.db.GetSQLGlobal('i.submitted_on', fields, tables, filters,
-                                 startdate, enddate, all_items)
+    def _get_reviews_timeline(self, group_field = None):
+        """ Submission and close dates, patchsets uploaded and patchsets
+            reviewed negatively of each review """
+        fields = ["i.id AS issue_id", "i.submitted_on AS submitted_on",
+                  """(SELECT MIN(ie.mod_date) FROM issues_ext_gerrit ie
+                      WHERE ie.issue_id = i.id
+                      AND (i.status='MERGED' OR i.status='ABANDONED')) AS closed_on"""]
+        if group_field is not None:
+            fields.append(group_field + " AS item")
+        reviews = check_array_values(self.db.ExecuteQuery(
+                                     self._get_reviews_query(fields, [], [])))
+        if group_field is None:
+            reviews['item'] = [None] * len(reviews['issue_id'])
+
+        fields = ["c.issue_id AS issue_id", "c.changed_on AS changed_on",
+                  "CAST(c.old_value as UNSIGNED) AS patchset"]
+        filters = ["c.issue_id = i.id", "c.old_value<>''", "c.old_value<>'None'"]
+        patchsets = check_array_values(self.db.ExecuteQuery(
+                                       self._get_reviews_query(fields, ["changes c"], filters)))
+
+        fields = ["c.issue_id AS issue_id", "CAST(c.old_value as UNSIGNED) AS patchset"]
+        filters = ["c.issue_id = i.id",
+                   """((c.field = 'Code-Review' AND (c.new_value = -1 or c.new_value = -2))
+                      OR (c.field = 'Verified' AND (c.new_value = -1 or c.new_value = -2)))"""]
+        reviewed = check_array_values(self.db.ExecuteQuery(
+                                      self._get_reviews_query(fields, ["changes c"], filters)))
+
+        return (reviews, patchsets, reviewed)
+
+    @staticmethod
+    def _get_reviewed_months(changes, reviewed, month_dates):
+        """ Ranges of months in which the last patchset of a review
+            has been reviewed negatively """
+        months = []
+        changes = sorted([change for change in changes if change[0] is not None])
+        last_patchset = None
+        for i in range(0, len(changes)):
+            if last_patchset is None or changes[i][1] > last_patchset:
+                last_patchset = changes[i][1]
+            if last_patchset not in reviewed: continue
+            first = bisect_left(month_dates, changes[i][0])
+            last = len(month_dates)
+            if i+1 < len(changes): last = bisect_left(month_dates, changes[i+1][0])
+            if first < last: months.append((first, last))
+        return months
+
+    def _get_pending_ts(self, month_dates, group_field = None):
+        """ Pending reviews and reviews waiting for reviewer at the end of
+            each month, for each item if group_field is provided """
+        reviews, patchsets, reviewed = self._get_reviews_timeline(group_field)
+
+        changes = {}
+        for i in range(0, len(patchsets['issue_id'])):
+            changes.setdefault(patchsets['issue_id'][i], []).append(
+                (patchsets['changed_on'][i], patchsets['patchset'][i]))
+        reviewed_patchsets = {}
+        for i in range(0, len(reviewed['issue_id'])):
+            reviewed_patchsets.setdefault(reviewed['issue_id'][i], Set([])).add(
+                reviewed['patchset'][i])
+
+        # Changes in the pending counters for each month
+        nmonths = len(month_dates)
+        pending_diff = {}
+        waiting_diff = {}
+        reviewed_months = {}
+        for i in range(0, len(reviews['issue_id'])):
+            issue_id = reviews['issue_id'][i]
+            item = reviews['item'][i]
+            first = bisect_left(month_dates, reviews['submitted_on'][i])
+            last = nmonths
+            if reviews['closed_on'][i] is not None:
+                last = bisect_left(month_dates, reviews['closed_on'][i])
+            if first >= last: continue
+            if item not in pending_diff:
+                pending_diff[item] = [0] * (nmonths + 1)
+                waiting_diff[item] = [0] * (nmonths + 1)
+            pending_diff[item][first] += 1
+            pending_diff[item][last] -= 1
+            waiting_diff[item][first] += 1
+            waiting_diff[item][last] -= 1
+            if issue_id not in reviewed_months:
+                reviewed_months[issue_id] = self._get_reviewed_months(
+                    changes.get(issue_id, []), reviewed_patchsets.get(issue_id, Set([])),
+                    month_dates)
+            for (reviewed_first, reviewed_last) in reviewed_months[issue_id]:
+                reviewed_first = max(first, reviewed_first)
+                reviewed_last = min(last, reviewed_last)
+                if reviewed_first >= reviewed_last: continue
+                waiting_diff[item][reviewed_first] -= 1
+                waiting_diff[item][reviewed_last] += 1
+
+        pending = {}
+        for item in pending_diff:
+            pending_ts = []
+            waiting_ts = []
+            pending_total = 0
+            waiting_total = 0
+            for i in range(0, nmonths):
+                pending_total += pending_diff[item][i]
+                waiting_total += waiting_diff[item][i]
+                pending_ts.append(pending_total)
+                waiting_ts.append(waiting_total)
+            pending[item] = (pending_ts, waiting_ts)
+        return pending
 
-        rs = self.db.ExecuteQuery(q)
-        if all_items is not None:
-            checkListArray(rs)
-        else:
-            rs = rs['pending']
-        return rs
+    def _get_months(self):
+        """ Months ids and their last day for the analysis dates """
+        start = datetime.strptime(self.filters.startdate, "'%Y-%m-%d'")
+        end = datetime.strptime(self.filters.enddate, "'%Y-%m-%d'")
 
+        start_month = start.year*12 + start.month
+        end_month = end.year*12 + end.month
+        months = range(start_month, end_month+1)
+        month_dates = [datetime.strptime(self._get_date_from_month(month), "%Y-%m-%d")
+                       for month in months]
+        return (months, month_dates)
 
     def _get_ts_all(self):
-        startdate = self.filters.startdate
-        enddate = self.filters.enddate
-        period = self.filters.period
-        start = datetime.strptime(startdate, "'%Y-%m-%d'")
-        end = datetime.strptime(enddate, "'%Y-%m-%d'")
-
-        if (period != "month"):
-            logging.error("Period not supported in " + self.id  + " " + period)
+        if (self.filters.period != "month"):
+            logging.error("Period not supported in " + self.id  + " " + self.filters.period)
             return {}
 
-        start_month = start.year*12 + start.month
-        end_month = end.year*12 + end.month
-        months = end_month - start_month
-
         # First, we need to group by the filter field the data
         all_items = self.db.get_all_items(self.filters.type_analysis)
         group_field = self.db.get_group_field(all_items)
         id_field = group_field.split('.')[1] # remove table name
 
-        # First we get all the data from db
-        pending_data = {'month':[],'pending':[],id_field:[]}
-        pending_reviewers_data = {'month':[],'pending':[],id_field:[]}
-        for i in range(0, months+1):
-            # total pending this month
-            pending_month = self._get_pending(start_month+i)
-            pending_data['month'].append(start_month+i)
-            pending_data[id_field].append(pending_month[id_field])
-            pending_data['pending'].append(pending_month['pending'])
-            # total pending waiting for reviewers this month
-            pending_reviewers_month = self._get_pending(start_month+i, True)
-            pending_reviewers_data['month'].append(start_month+i)
-            pending_reviewers_data[id_field].append(pending_reviewers_month[id_field])
-            pending_reviewers_data['pending'].append(pending_reviewers_month['pending'])
-        # print pending_review_data
-        # Get the complete list of items
-        all_items = []
-        for data in pending_data[id_field]:
-            all_items = list(Set(all_items+data))
+        months, month_dates = self._get_months()
+        pending_items = self._get_pending_ts(month_dates, group_field)
+        # Only items with pending reviews in some month
+        all_items = [item for item in pending_items if max(pending_items[item][0]) > 0]
+
         # Build the final dict with format [[months],[itens],[[item1_ts],...]
         pending = {"month":[]}
-        pending['month'] = pending_data['month']
+        pending['month'] = months
         pending = completePeriodIds(pending, self.filters.period,
                                     self.filters.startdate, self.filters.enddate)
         pending["ReviewsWaiting_ts"] = []
         pending["ReviewsWaitingForReviewer_ts"] = []
         pending[id_field] = all_items
-        # For each item build the tme series and append it
         for item in all_items:
-            item_ts = []
-            for i in range(0, months+1):
-                if len(pending_data[id_field])>0 and \
-                   item in pending_data[id_field][i]:
-                    pos = pending_data[id_field][i].index(item)
-                    item_ts.append(pending_data['pending'][i][pos])
-                else:
-                    # No pendings reviews for this item
-                    item_ts.append(0)
-            pending['ReviewsWaiting_ts'].append(item_ts)
-            item_reviewers_ts = []
-            for i in range(0, months+1):
-                if len(pending_reviewers_data[id_field])>0 and \
-                   item in pending_reviewers_data[id_field][i]:
-                    pos = pending_reviewers_data[id_field][i].index(item)
-                    item_reviewers_ts.append(pending_reviewers_data['pending'][i][pos])
-                else:
-                    # No pendings reviews for this item
-                    item_reviewers_ts.append(0)
-            pending['ReviewsWaitingForReviewer_ts'].append(item_reviewers_ts)
+            pending['ReviewsWaiting_ts'].append(pending_items[item][0])
+            pending['ReviewsWaitingForReviewer_ts'].append(pending_items[item][1])
         return pending
 
     def get_ts(self):
@@ -865,31 +907,19 @@ class ReviewsWaitingForReviewerTS(Metrics):
             # Support for GROUP BY queries
             return self._get_ts_all()
 
-        pending = {"month":[],
-                   "ReviewsWaiting_ts":[],
-                   "ReviewsWaitingForReviewer_ts":[]}
-
-        startdate = self.filters.startdate
-        enddate = self.filters.enddate
-        period = self.filters.period
-        start = datetime.strptime(startdate, "'%Y-%m-%d'")
-        end = datetime.strptime(enddate, "'%Y-%m-%d'")
-
-        if (period != "month"):
-            logging.error("Period not supported in " + self.id  + " " + period)
+        if (self.filters.period != "month"):
+            logging.error("Period not supported in " + self.id  + " " + self.filters.period)
             return {}
 
-        start_month = start.year*12 + start.month
-        end_month = end.year*12 + end.month
-        months = end_month - start_month
-
-        for i in range(0, months+1):
-            pending['month'].append(start_month+i)
-            pending_month = self._get_pending(start_month+i)
-            pending_reviewers_month = self._get_pending(start_month+i, True)
-            pending['ReviewsWaiting_ts'].append(pending_month)
-            pending['ReviewsWaitingForReviewer_ts'].append(pending_reviewers_month)
+        months, month_dates = self._get_months()
+        pending_ts = self._get_pending_ts(month_dates)
+        if None not in pending_ts:
+            # No pending reviews at all
+            pending_ts[None] = ([0] * len(months), [0] * len(months))
 
+        pending = {"month": months,
+                   "ReviewsWaiting_ts": pending_ts[None][0],
+                   "ReviewsWaitingForReviewer_ts": pending_ts[None][1]}
         return pending
 
 
@@ -1489,100 +1519,62 @@ class TimeToReview(Metrics):
         q = self.db.GetTimeToReviewQuerySQL (self.filters, bots)
         return q
 
-    def _get_agg_all(self, data):
-        from numpy import median, average
-        from vizgrimoire.GrimoireUtils import removeDecimals
-
-        data_all = {}
-
-        # First, we need to group by the filter field the data
+    def _get_id_field(self):
         all_items = self.db.get_all_items(self.filters.type_analysis)
         group_field = self.db.get_group_field(all_items)
-        id_field = group_field.split('.')[1] # remove table name
+        return group_field.split('.')[1] # remove table name
 
-        items =  list(Set(data[id_field]))
-        data_all[id_field] = items
-        for id in ["review_time_days_median", "review_time_days_avg"]:
-            data_all[id] = []
+    def _get_agg_all(self, data):
+        # Median and average of the reviews of each item
+        id_field = self._get_id_field()
+        codes, items = data.codes(id_field)
+        stats = get_grouped_stats([codes], data["revtime"])
 
-        for item in items:
-            # First, extract the data for the item
-            data_item = {"changed_on":[],"revtime":[]}
-            for i in range(0,len(data[id_field])):
-                if data[id_field][i] == item:
-                    data_item["changed_on"].append(data["changed_on"][i])
-                    data_item["revtime"].append(data["revtime"][i])
-            data_revtime = data_item['revtime']
-            if (isinstance(data, list) == False): data_revtime = [data_revtime]
-            # ttr_median = sorted(data)[len(data)//2]
-            if (len(data_revtime) == 0):
-                ttr_median = float("nan")
-                ttr_avg = float("nan")
-            else:
-                ttr_median = float(median(removeDecimals(data_revtime)))
-                ttr_avg = float(average(removeDecimals(data_revtime)))
-            data_all["review_time_days_median"].append(ttr_median)
-            data_all["review_time_days_avg"].append(ttr_avg)
+        data_all = {}
+        data_all[id_field] = [items[code] for code in stats["keys"][0]]
+        data_all["review_time_days_median"] = stats["median"].tolist()
+        data_all["review_time_days_avg"] = stats["mean"].tolist()
         return data_all
 
     def get_agg(self):
-        from numpy import median, average
-        from vizgrimoire.GrimoireUtils import removeDecimals
-
         q = self._get_sql()
         if q is None: return {}
-        data = self.db.ExecuteQuery(q)
+        data = self.db.ExecuteQueryArrays(q)
 
         if self.filters.type_analysis and self.filters.type_analysis[1] is None:
             # Support for GROUP BY queries
             return self._get_agg_all(data)
 
-        data = data['revtime']
-        if (isinstance(data, list) == False): data = [data]
+        data = data.dropna('revtime')
         # ttr_median = sorted(data)[len(data)//2]
         if (len(data) == 0):
             ttr_median = float("nan")
             ttr_avg = float("nan")
         else:
-            ttr_median = float(median(removeDecimals(data)))
-            ttr_avg = float(average(removeDecimals(data)))
+            ttr_median = float(numpy.median(data))
+            ttr_avg = float(numpy.mean(data))
         return {"review_time_days_median":ttr_median, "review_time_days_avg":ttr_avg}
 
     def _get_ts_all(self, data):
-        from numpy import median, average
-        from vizgrimoire.GrimoireUtils import removeDecimals
+        # Median and average of the reviews of each item and month
+        id_field = self._get_id_field()
+        codes, items = data.codes(id_field)
+        months = get_month_ids(data["changed_on"])
+        stats = get_grouped_stats([codes, months], data["revtime"])
+        # Groups are sorted by item: position of the first group of each one
+        item_starts = numpy.searchsorted(stats["keys"][0], range(0, len(items) + 1))
 
         data_all = {}
-
-        # First, we need to group by the filter field the data
-        all_items = self.db.get_all_items(self.filters.type_analysis)
-        group_field = self.db.get_group_field(all_items)
-        id_field = group_field.split('.')[1] # remove table name
-
-        items =  list(Set(data[id_field]))
         data_all[id_field] = items
         for id in ["review_time_days_median", "review_time_days_avg"]:
             data_all[id] = []
 
-        for item in items:
-            # First, extract the data for the item
-            data_item = {"changed_on":[],"revtime":[]}
-            for i in range(0,len(data[id_field])):
-                if data[id_field][i] == item:
-                    data_item["changed_on"].append(data["changed_on"][i])
-                    data_item["revtime"].append(data["revtime"][i])
-
-            med_avg_list = medianAndAvgByPeriod(self.filters.period,
-                                                data_item['changed_on'], data_item['revtime'])
+        for i in range(0, len(items)):
+            groups = slice(item_starts[i], item_starts[i+1])
             metrics_list = {}
-            if (med_avg_list != None):
-                metrics_list['review_time_days_median'] = med_avg_list['median']
-                metrics_list['review_time_days_avg'] = med_avg_list['avg']
-                metrics_list['month'] = med_avg_list['month']
-            else:
-                metrics_list['review_time_days_median'] = []
-                metrics_list['review_time_days_avg'] = []
-                metrics_list['month'] = []
+            metrics_list['review_time_days_median'] = stats["median"][groups].tolist()
+            metrics_list['review_time_days_avg'] = stats["mean"][groups].tolist()
+            metrics_list['month'] = stats["keys"][1][groups].tolist()
 
             metrics_list = completePeriodIds(metrics_list, self.filters.period,
                                              self.filters.startdate, self.filters.enddate)
@@ -1598,23 +1590,18 @@ class TimeToReview(Metrics):
     def get_ts(self):
         q = self._get_sql()
         if q is None: return {}
-        review_list = self.db.ExecuteQuery(q)
-        checkListArray(review_list)
+        review_list = self.db.ExecuteQueryArrays(q)
 
         if self.filters.type_analysis and self.filters.type_analysis[1] is None:
             # Support for GROUP BY queries
             return self._get_ts_all(review_list)
 
+        months = get_month_ids(review_list['changed_on'])
+        stats = get_grouped_stats([months], review_list['revtime'])
         metrics_list = {}
-        med_avg_list = medianAndAvgByPeriod(self.filters.period, review_list['changed_on'], review_list['revtime'])
-        if (med_avg_list != None):
-            metrics_list['review_time_days_median'] = med_avg_list['median']
-            metrics_list['review_time_days_avg'] = med_avg_list['avg']
-            metrics_list['month'] = med_avg_list['month']
-        else:
-            metrics_list['review_time_days_median'] = []
-            metrics_list['review_time_days_avg'] = []
-            metrics_list['month'] = []
+        metrics_list['review_time_days_median'] = stats["median"].tolist()
+        metrics_list['review_time_days_avg'] = stats["mean"].tolist()
+        metrics_list['month'] = stats["keys"][0].tolist()
 
         metrics_list = completePeriodIds(metrics_list, self.filters.period,
                           self.filters.startdate, self.filters.enddate)
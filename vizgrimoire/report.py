@@ -19,7 +19,7 @@
 ##   Alvaro del Castillo <acs@bitergia.com>
 
 
-from vizgrimoire.GrimoireSQL import SetDBChannel
+from vizgrimoire.GrimoireSQL import SetDBChannel, ResetDBChannel
 from vizgrimoire.GrimoireUtils import read_main_conf
 import logging, time, sys
 import vizgrimoire.SCM as SCM
@@ -51,6 +51,7 @@ class Report(object):
     _on_studies = []
     _automator = None
     _automator_file = None
+    _filter_jobs = 1 # worker processes for filter items reports
 
     @staticmethod
     def init(automator_file, metrics_path = None):
@@ -58,6 +59,11 @@ class Report(object):
         Report._automator = read_main_conf(automator_file)
         Report._init_filters()
         Report._init_data_sources()
+        Report._init_query_cache()
+        Report._init_connection_pool()
+        Report._init_rollups()
+        Report._init_indexes()
+        Report._init_json_writer()
         if metrics_path is not None:
             Report._init_metrics(metrics_path)
             studies_path = metrics_path.replace("metrics","analysis")
@@ -97,6 +103,56 @@ class Report(object):
             if ds.get_name()+'_global_filter' in Report.get_config()['r']:
                 ds.set_global_filter(ds, Report.get_config()['r'][ds.get_name()+'_global_filter'])
 
+    @staticmethod
+    def _init_query_cache():
+        """ Persistent cache for queries results, if configured """
+        from vizgrimoire.metrics.query_cache import QueryCache
+        if 'query_cache' not in Report._automator['r']: return
+        cache_file = Report._automator['r']['query_cache']
+        max_size = None
+        if 'query_cache_size' in Report._automator['r']:
+            # Size configured in MB
+            max_size = int(Report._automator['r']['query_cache_size']) * 1024 * 1024
+        DSQuery.set_query_cache(QueryCache(cache_file, max_size))
+        logging.info("Using query cache " + cache_file)
+
+    @staticmethod
+    def _init_connection_pool():
+        """ Max number of connections per database, if configured """
+        from vizgrimoire.metrics import connection_pool
+        if 'db_pool_size' not in Report._automator['r']: return
+        connection_pool.set_max_size(int(Report._automator['r']['db_pool_size']))
+
+    @staticmethod
+    def _init_rollups():
+        """ Use the daily activity rollups, if configured """
+        if 'rollups' not in Report._automator['r']: return
+        if Report._automator['r']['rollups'].lower() in ['true', 'yes', '1']:
+            DSQuery.set_use_rollups(True)
+            logging.info("Using daily activity rollups")
+
+    @staticmethod
+    def _init_indexes():
+        """ Create the missing indexes of the data sources, if configured """
+        if 'create_indexes' not in Report._automator['r']: return
+        if Report._automator['r']['create_indexes'].lower() in ['true', 'yes', '1']:
+            DSQuery.set_create_indexes(True)
+
+    @staticmethod
+    def _init_json_writer():
+        """ Compressed copies, shared time axis, manifest and bundles of JSON
+            files, if configured """
+        from vizgrimoire import json_writer
+        enabled = ['true', 'yes', '1']
+        if Report._automator['r'].get('json_gzip', '').lower() in enabled:
+            json_writer.set_gzip(True)
+        if Report._automator['r'].get('json_shared_axis', '').lower() in enabled:
+            json_writer.set_shared_axis(True)
+        if Report._automator['r'].get('json_manifest', '').lower() in enabled:
+            json_writer.set_manifest(True)
+        if Report._automator['r'].get('json_bundles', '').lower() in enabled:
+            json_writer.set_bundles(True)
+
     @staticmethod
     def get_default_filter():
         npeople = Metrics.default_npeople
@@ -161,6 +217,14 @@ class Report(object):
             metrics_mod = [f for f in listdir(mdir)
                            if isfile(join(mdir,f)) and f.endswith("_metrics.py")]
 
+        # One query builder per class and database shared by all metrics.
+        # Builders connect to the database when they execute the first query.
+        builders = {}
+        def get_builder(builder, db):
+            if (builder, db) not in builders:
+                builders[(builder, db)] = builder(dbuser, dbpass, db, db_identities, db_projects)
+            return builders[(builder, db)]
+
         for metric_mod in metrics_mod:
             mod_name = metric_mod.split(".py")[0]
             mod = __import__(metrics_pkg+"."+mod_name)
@@ -177,7 +241,7 @@ class Report(object):
                 metric_filters = Report.get_default_filter()
                 if (ds.get_global_filter(ds) is not None):
                     metric_filters.global_filter = ds.get_global_filter(ds)
-                metrics = metrics_class(builder(dbuser, dbpass, db, db_identities, db_projects), metric_filters)
+                metrics = metrics_class(get_builder(builder, db), metric_filters)
                 ds.add_metrics(metrics, ds)
                 if ds == ITS.ITS:
                     db_its1_name = ITS_1.ITS_1.get_db_name()
@@ -185,7 +249,7 @@ class Report(object):
                         db_its1 = Report._automator['generic'][db_its1_name]
                         metric_filters = Report.get_default_filter()
                         metric_filters.set_closed_condition(ITS_1.ITS_1._get_closed_condition())
-                        metrics = metrics_class(builder(dbuser, dbpass, db_its1, db_identities, db_projects), metric_filters)
+                        metrics = metrics_class(get_builder(builder, db_its1), metric_filters)
                         ITS_1.ITS_1.add_metrics(metrics, ITS_1.ITS_1)
 
                 # Specific filters
@@ -268,6 +332,19 @@ class Report(object):
         dbpassword = Report._automator['generic']['db_password']
         SetDBChannel (database=db, user=dbuser, password=dbpassword)
 
+    @staticmethod
+    def reconnect():
+        """Open new database connections for all metrics.
+
+        Used in worker processes: the connections inherited from the parent
+        process can not be shared with it.
+        """
+        DSQuery.reset_connections()
+        ResetDBChannel()
+        for ds in Report._all_data_sources:
+            for metrics in ds.get_metrics_set(ds):
+                if metrics.db is not None: metrics.db.reconnect()
+
     @staticmethod
     def get_data_sources():
 
@@ -317,6 +394,14 @@ class Report(object):
                 break
         return found
 
+    @staticmethod
+    def get_filter_jobs():
+        return Report._filter_jobs
+
+    @staticmethod
+    def set_filter_jobs(jobs):
+        Report._filter_jobs = jobs
+
     @staticmethod
     def get_items():
         return Report._items